@@ -1,73 +1,559 @@
 # app/agent/core.py
+import os
 import json
+import time
+import base64
+import asyncio
+import hashlib
+import inspect
+import contextlib
+import contextvars
 import logging
-from openai import OpenAI
-from app.services.memory import get_short_term_memory, update_short_term_memory, log_significant_action
+from app.services.memory import get_short_term_memory, get_session_summary, update_short_term_memory, log_significant_action, SESSION_MEMORY_MAX_MESSAGES
+from app.services.memory import get_session_candidates, set_session_candidates, SESSION_CANDIDATES_MAX, SESSION_CANDIDATE_LOOKUPS
 from app.services.database import db_connector
+from app.services.cache import search_result_cache
+from app.services.singleflight import search_single_flight
+from app.services.serialization import dumps, to_records
+from app.services.metrics import span, observe_search_query, LLM_TOKENS
+from app.services.admission import admission, AdmissionRejected
+from app.services.search_index import search_index, SEARCH_INDEX_MAX_CANDIDATES
+from app.services.facets import facet_index, live_count_cache, summarize_counts, summarize_groups, tally_rows, LIVE_FACET_COLUMNS, FACET_INDEX_TAIL_MAX_ROWS
+from app.agent.prompt import build_prompt_messages, system_prompt_tokens
+from app.agent.decision_cache import DecisionCache
 
-# Initialize clients and logger
-client = OpenAI()
 logger = logging.getLogger(__name__)
 
+# The OpenAI client (and the openai package, which is slow to import) is created on
+# first use or by the startup warmup, not at import time.
+_llm_client = None
 
-# --- THE FINAL, DYNAMIC QUERY BUILDER TOOL ---
-def build_and_run_search_query(filters: list = None, columns_to_select: list = None):
+
+def get_llm_client():
+    global _llm_client
+    if _llm_client is None:
+        from openai import AsyncOpenAI
+        _llm_client = AsyncOpenAI()
+    return _llm_client
+
+
+async def close_llm_client():
+    global _llm_client
+    if _llm_client is not None:
+        await _llm_client.close()
+        _llm_client = None
+
+
+# --- SEARCH VALIDATION HELPERS ---
+# Define a default set of columns for the initial view if none are specified
+DEFAULT_COLUMNS = [
+    "person_full_name", "job_title", "organization_name", 
+    "person_location_country", "organization_email", "person_email"
+]
+
+# Security Layer 1: Whitelist of all columns the AI is allowed to select or filter on.
+ALLOWED_COLUMNS = [
+    "ProfileId", "person_full_name", "job_title", "job_title_role", "organization_name",
+    "organization_industries", "person_location_city", "person_location_state", "person_location_country",
+    "organization_email", "person_email", "person_mobile", "person_phone", "person_linkedin_url",
+    "person_twitter_url", "person_github_url", "person_skills", 
+    "organization_email_status", "person_linkedin_connections" 
+]
+
+ALLOWED_OPERATORS = ["LIKE", "=", "IS NOT NULL", "IS NULL", ">", "<"]
+
+# The first page of a search also reports the total match count and facet breakdowns.
+SEARCH_COUNTS_ENABLED = os.getenv("SEARCH_COUNTS_ENABLED", "1") == "1"
+# Counts the facet index can't answer (or all counts, without the index) need a GROUP BY over
+# every matching row and a second DB slot per search, so the live fallback is opt-in.
+SEARCH_LIVE_COUNTS_ENABLED = os.getenv("SEARCH_LIVE_COUNTS_ENABLED", "0") == "1"
+
+# Results are paged with a keyset on (person_full_name, ProfileId) rather than OFFSET.
+SEARCH_PAGE_SIZE = int(os.getenv("SEARCH_PAGE_SIZE", 10))
+SEARCH_MAX_PAGE_SIZE = int(os.getenv("SEARCH_MAX_PAGE_SIZE", 100))
+SEEK_COLUMNS = ["person_full_name", "ProfileId"]
+
+
+def _normalize_filter_value(operator: str, value):
     """
-    Builds and executes a safe query from a dynamic list of filters and can select custom columns.
-    This is the heart of the agent's data access, providing both flexibility and security.
+    Canonical form of a filter value for cache keys and de-duplication only; the
+    value bound into the SQL is the one the AI sent. LIKE values are trimmed,
+    lower-cased and single-spaced (substring matches are case-insensitive, like the
+    trigram index); =, < and > compare exactly, so their values are kept as given.
+    """
+    if operator in ["IS NOT NULL", "IS NULL"] or value is None:
+        return None
+    if operator == "LIKE":
+        return " ".join(str(value).split()).lower()
+    return str(value)
+
+
+def _filter_key(validated_filter) -> tuple:
+    """(column, operator, canonical value) identifying a validated filter."""
+    column, operator, value = validated_filter
+    return column, operator, _normalize_filter_value(operator, value)
+
+
+def _filter_keys(validated_filters: list) -> list:
+    return [_filter_key(f) for f in validated_filters]
+
+
+def _validate_search(filters: list = None, columns_to_select: list = None):
+    """
+    Applies both security layers to the AI's arguments.
+    Returns (safe_columns, validated_filters) where validated_filters is a list of
+    (column, operator, value) tuples, sorted and de-duplicated on their canonical form
+    (see `_normalize_filter_value`) but carrying the values as sent.
     """
-    # Define a default set of columns for the initial view if none are specified
-    if not columns_to_select:
-        columns_to_select = [
-            "person_full_name", "job_title", "organization_name", 
-            "person_location_country", "organization_email", "person_email"
-        ]
-    
-    # Security Layer 1: Whitelist of all columns the AI is allowed to select or filter on.
-    allowed_columns = [
-        "ProfileId", "person_full_name", "job_title", "job_title_role", "organization_name",
-        "organization_industries", "person_location_city", "person_location_state", "person_location_country",
-        "organization_email", "person_email", "person_mobile", "person_phone", "person_linkedin_url",
-        "person_twitter_url", "person_github_url", "person_skills", 
-        "organization_email_status", "person_linkedin_connections" 
-    ]
-    
     # Filter the requested columns against the allowlist to ensure safety
-    safe_columns = [col for col in columns_to_select if col in allowed_columns]
+    safe_columns = [col for col in (columns_to_select or DEFAULT_COLUMNS) if col in ALLOWED_COLUMNS]
     if not safe_columns: # Fallback if AI provides no valid columns
         safe_columns = ["person_full_name", "job_title", "organization_name"]
 
-    select_clause = ", ".join(f"[{col}]" for col in safe_columns) # Add brackets for safety
-    query = f"SELECT TOP 10 {select_clause} FROM dbo.ProfileData"
-    
+    validated_filters = {}
+    for f in filters or []:
+        # Validate the filter object received from the AI
+        if not isinstance(f, dict) or not all(k in f for k in ["column", "operator", "value"]):
+            logger.warning(f"Skipping malformed filter from AI: {f}")
+            continue
+
+        column, operator = f["column"], str(f["operator"]).upper()
+
+        # Security Layer 2: Validate the column and operator against allowlists
+        if column not in ALLOWED_COLUMNS or operator not in ALLOWED_OPERATORS:
+            logger.warning(f"Skipping filter with disallowed column or operator: {f}")
+            continue
+
+        value = None if operator in ["IS NOT NULL", "IS NULL"] else f["value"]
+        validated_filters.setdefault(_filter_key((column, operator, value)), (column, operator, value))
+
+    # Sorting makes equivalent filter lists produce the same SQL text and cache key.
+    ordered = sorted(validated_filters.items(), key=lambda item: (item[0][0], item[0][1], item[0][2] or ""))
+    return safe_columns, [validated for _, validated in ordered]
+
+
+def _build_where_clause(validated_filters: list):
+    """Turns validated filters into a parameterized WHERE clause (without the keyword)."""
     conditions, params = [], []
-    allowed_operators = ["LIKE", "=", "IS NOT NULL", "IS NULL", ">", "<"]
+    for column, operator, value in validated_filters:
+        if operator in ["IS NOT NULL", "IS NULL"]:
+            conditions.append(f"[{column}] {operator}")
+        else:
+            conditions.append(f"[{column}] {operator} ?")
+            params.append(value if operator != "LIKE" else f"%{value}%")
+    return " AND ".join(conditions), params
 
-    if filters:
-        for f in filters:
-            # Validate the filter object received from the AI
-            if not isinstance(f, dict) or not all(k in f for k in ["column", "operator", "value"]):
-                logger.warning(f"Skipping malformed filter from AI: {f}")
-                continue
 
-            column, operator, value = f["column"], f["operator"].upper(), f["value"]
+def _search_cache_key(safe_columns: list, validated_filters: list, page_size: int, after: list = None) -> str:
+    """
+    Cache key for a search page. Filters are already sorted and normalized; the column
+    order is kept because it determines the shape of the returned rows.
+    """
+    canonical = json.dumps(
+        {"columns": safe_columns, "filters": _filter_keys(validated_filters), "page_size": page_size, "after": after},
+        separators=(",", ":"), default=str
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
 
-            # Security Layer 2: Validate the column and operator against allowlists
-            if column not in allowed_columns or operator not in allowed_operators:
-                logger.warning(f"Skipping filter with disallowed column or operator: {f}")
-                continue
 
-            if operator in ["IS NOT NULL", "IS NULL"]:
-                conditions.append(f"[{column}] {operator}")
-            else:
-                conditions.append(f"[{column}] {operator} ?")
-                params.append(value if operator != "LIKE" else f"%{value}%")
+def _clamp_page_size(page_size) -> int:
+    try:
+        page_size = int(page_size) if page_size else SEARCH_PAGE_SIZE
+    except (TypeError, ValueError):
+        page_size = SEARCH_PAGE_SIZE
+    return max(1, min(page_size, SEARCH_MAX_PAGE_SIZE))
+
+
+def _encode_page_token(safe_columns: list, validated_filters: list, page_size: int, after: list) -> str:
+    """Packs everything needed to fetch the next page into an opaque, URL-safe token."""
+    payload = {"v": 1, "c": safe_columns, "f": validated_filters, "n": page_size, "a": after}
+    raw = json.dumps(payload, separators=(",", ":"), default=str).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+INVALID_PAGE_TOKEN_MESSAGE = "The continuation token is invalid or has expired."
+
+
+def _decode_page_token(token: str):
+    """
+    Unpacks a continuation token into (filters, columns, page_size, after).
+    Filters come back as plain filter dicts so they pass through the normal
+    allowlist validation again; a tampered token can only change bound parameters.
+    """
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        filters = [{"column": c, "operator": o, "value": v} for c, o, v in payload["f"]]
+        after = payload["a"]
+        if payload.get("v") != 1 or not isinstance(after, list) or len(after) != 2:
+            raise ValueError("unsupported token")
+        return filters, payload["c"], payload["n"], after
+    except Exception as e:
+        raise ValueError(f"Invalid continuation token: {e}")
+
+
+def _build_seek_clause(after: list):
+    """
+    Keyset predicate for rows after (person_full_name, ProfileId) in ascending order.
+    SQL Server sorts NULL names first, so a NULL anchor continues through the NULLs.
+    """
+    last_name, last_id = after
+    if last_name is None:
+        return "(([person_full_name] IS NULL AND [ProfileId] > ?) OR [person_full_name] IS NOT NULL)", [last_id]
+    return "([person_full_name] > ? OR ([person_full_name] = ? AND [ProfileId] > ?))", [last_name, last_name, last_id]
+
+
+def _filter_shape(validated_filters: list, indexed: bool, paged: bool) -> str:
+    """A low-cardinality label for a search: its filtered columns and operators, not their values."""
+    shape = ",".join(sorted({f"{col}:{op}" for col, op, _ in validated_filters})) or "unfiltered"
+    if indexed:
+        shape += "|index"
+    if paged:
+        shape += "|page"
+    return shape
+
+
+async def invalidate_search_cache():
+    """Invalidation hook for when dbo.ProfileData is reloaded."""
+    if search_result_cache is not None:
+        await search_result_cache.invalidate()
+    live_count_cache.clear()
+
+
+# Set by the batch runner to a TTLCache shared by every job of a batch, so identical generated
+# searches across jobs run once regardless of the search cache's settings.
+search_memo = contextvars.ContextVar("search_memo", default=None)
+
+
+# --- THE FINAL, DYNAMIC QUERY BUILDER TOOL ---
+async def build_and_run_search_query(filters: list = None, columns_to_select: list = None, page_size: int = None, continuation_token: str = None, session_id: str = None):
+    """
+    Builds and executes a safe query from a dynamic list of filters and can select custom columns.
+    This is the heart of the agent's data access, providing both flexibility and security.
+
+    Returns {"columns": [...], "rows": [[...], ...], "next_page_token": str or None}
+    in columnar form (one value list per row). Passing a previous
+    `next_page_token` as `continuation_token` fetches the following page of the same
+    search with an index seek, so page N costs the same as page 1. The first page also
+    carries "total_count" and "facets" (see `count_matches`) when they could be computed.
+    Results are served from the search cache when the same canonical page ran recently,
+    and concurrent identical searches share one database execution.
+    With a `session_id`, a search that narrows the session's previous one only looks
+    at that search's matches (see `_session_refinement`).
+    """
+    after = None
+    if continuation_token:
+        try:
+            filters, columns_to_select, page_size, after = _decode_page_token(continuation_token)
+        except ValueError as e:
+            logger.warning(str(e))
+            return {"error": INVALID_PAGE_TOKEN_MESSAGE}
+
+    safe_columns, validated_filters = _validate_search(filters, columns_to_select)
+    page_size = _clamp_page_size(page_size)
+
+    candidate_ids, remember = None, False
+    if session_id and validated_filters:
+        candidate_ids, remember = await _session_refinement(session_id, validated_filters)
+
+    cache_key = _search_cache_key(safe_columns, validated_filters, page_size, after)
+    memo = search_memo.get()
+    results = memo.get(cache_key) if memo is not None else None
+    if results is None and search_result_cache is not None:
+        results = await search_result_cache.get(cache_key)
+        if results is not None:
+            logger.info(f"Search cache hit for key {cache_key[:12]}.")
+
+    if results is None and search_single_flight is not None:
+        results = await search_single_flight.do(cache_key, lambda: _execute_search(safe_columns, validated_filters, page_size, after, cache_key, candidate_ids))
+    elif results is None:
+        results = await _execute_search(safe_columns, validated_filters, page_size, after, cache_key, candidate_ids)
+    if memo is not None and "error" not in results:
+        memo.set(cache_key, results)
+
+    # A new first page small enough to remember becomes the session's candidate set.
+    if remember and after is None and "error" not in results and (results.get("total_count") or 0) <= SESSION_CANDIDATES_MAX:
+        _remember_candidates_later(session_id, validated_filters, candidate_ids, results.get("match_ids"))
+    return {key: value for key, value in results.items() if key != "match_ids"}
+
+
+async def _session_refinement(session_id: str, validated_filters: list):
+    """
+    (candidate_ids, remember) for a session's search. `candidate_ids` are the stored
+    matches of the session's previous search when the new filters include all of its
+    filters (a strict narrowing can only match a subset), else None. `remember` is
+    False when the stored set is already for exactly these filters.
+    """
+    try:
+        entry = await get_session_candidates(session_id)
+    except Exception as e:
+        logger.warning(f"Could not read session candidates for {session_id}: {e}")
+        return None, False
+    if entry is None:
+        SESSION_CANDIDATE_LOOKUPS.inc(outcome="missing")
+        return None, True
+    previous = {_filter_key(f) for f in entry["filters"]}
+    if not previous <= set(_filter_keys(validated_filters)):
+        SESSION_CANDIDATE_LOOKUPS.inc(outcome="unrelated")
+        return None, True
+    SESSION_CANDIDATE_LOOKUPS.inc(outcome="hit")
+    return entry["ids"], len(previous) < len(validated_filters)
+
+
+_background_tasks = set()
+
+
+def _remember_candidates_later(session_id: str, validated_filters: list, candidate_ids: list = None, match_ids: list = None):
+    """Stores the search's full match set after the response has gone out."""
+    task = asyncio.create_task(_remember_candidates(session_id, validated_filters, candidate_ids, match_ids))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+async def _remember_candidates(session_id: str, validated_filters: list, candidate_ids: list = None, match_ids: list = None):
+    """
+    Stores the search's matching ProfileIds for the session. `match_ids` is the full
+    match set when the first page already held every match; otherwise up to
+    SESSION_CANDIDATES_MAX + 1 ids are fetched (a primary-key lookup when the search
+    already narrowed a stored set). A truncated set can't stand in for the full match
+    set, so it is not stored.
+    """
+    try:
+        if match_ids is None and candidate_ids is not None and not candidate_ids:
+            match_ids = []  # Narrowing an empty set matches nothing
+        if match_ids is not None:
+            await set_session_candidates(session_id, validated_filters, list(match_ids))
+            SESSION_CANDIDATE_LOOKUPS.inc(outcome="stored")
+            return
+        query = f"SELECT TOP {SESSION_CANDIDATES_MAX + 1} [ProfileId] FROM dbo.ProfileData"
+        where_clause, params = _build_where_clause(validated_filters)
+        if candidate_ids is not None:
+            where_clause, params = _restrict_to_ids(where_clause, params, candidate_ids)
+        if where_clause:
+            query += " WHERE " + where_clause
+        async with admission.stage("db"):
+            result = await db_connector.execute_query_async(query + ";", tuple(params), columnar=True)
+        if "error" in result:
+            logger.warning(f"Could not collect session candidates: {result['error']}")
+            return
+        ids = [row[0] for row in result["rows"]]
+        if len(ids) > SESSION_CANDIDATES_MAX:
+            SESSION_CANDIDATE_LOOKUPS.inc(outcome="truncated")
+            return
+        await set_session_candidates(session_id, validated_filters, ids)
+        SESSION_CANDIDATE_LOOKUPS.inc(outcome="stored")
+    except AdmissionRejected:
+        SESSION_CANDIDATE_LOOKUPS.inc(outcome="skipped")  # The DB stage is saturated; a later search stores them
+    except Exception as e:
+        logger.warning(f"Could not store session candidates for {session_id}: {e}")
+
+
+def _restrict_to_ids(where_clause: str, params: list, ids, above_id: int = None) -> tuple:
+    """
+    Adds a `[ProfileId] IN (...)` condition to a WHERE clause (without the keyword).
+    With `above_id`, ProfileIds above it are let through as well: rows an index
+    snapshot taken up to that id can't know about yet.
+    """
+    ids = sorted(ids)
+    conditions = [f"[ProfileId] IN ({', '.join('?' for _ in ids)})"] if ids else []
+    if above_id is not None:
+        conditions.append("[ProfileId] > ?")
+        ids.append(above_id)
+    id_clause = conditions[0] if len(conditions) == 1 else f"({' OR '.join(conditions)})"
+    return (f"{where_clause} AND {id_clause}" if where_clause else id_clause), params + ids
+
+
+async def count_matches(validated_filters: list, candidate_ids: list = None):
+    """
+    Total match count and facet breakdowns for validated filters:
+    {"total_count", "facets": {column: [{"value", "count"}, ...]}, "source"}.
+
+    Served from the facet index when it can evaluate every filter (as of its last
+    refresh), otherwise, with SEARCH_LIVE_COUNTS_ENABLED, from one live GROUP BY query
+    whose result is cached briefly. `candidate_ids`, a known superset of the matches,
+    turns the live count into a primary-key lookup. Returns None when no count is
+    available or counting fails for any reason; counts never fail a search.
+    """
+    try:
+        return await _count_matches(validated_filters, candidate_ids)
+    except AdmissionRejected:
+        logger.info("Skipping the match count: the DB stage is at capacity.")
+    except Exception as e:
+        logger.warning(f"Match count failed: {e}", exc_info=True)
+    return None
+
+
+async def _count_matches(validated_filters: list, candidate_ids: list = None):
+    if candidate_ids is not None and not candidate_ids:
+        return summarize_groups([])  # Narrowing an empty set matches nothing
+
+    if facet_index is not None:
+        tallied = await asyncio.to_thread(facet_index.tally, validated_filters, search_index)
+        if tallied is not None:
+            total, counts, complete_up_to = tallied
+            tail = await _fetch_facet_tail(validated_filters, complete_up_to)
+            if tail is not None:
+                total += tally_rows(counts, facet_index.columns, tail)
+                return summarize_counts(total, counts, "cache")
+    if not SEARCH_LIVE_COUNTS_ENABLED:
+        return None
+
+    count_key = json.dumps(_filter_keys(validated_filters), default=str)
+    summary = live_count_cache.get(count_key)
+    if summary is not None:
+        return summary
+
+    # One pass over the single-valued facets (a bounded number of groups); the rollup per
+    # facet and the total happen here. The industry breakdown needs the facet index.
+    group_clause = ", ".join(f"[{col}]" for col in LIVE_FACET_COLUMNS)
+    query = f"SELECT {group_clause}, COUNT(*) FROM dbo.ProfileData"
+    where_clause, params = _build_where_clause(validated_filters)
+    if candidate_ids is not None:
+        where_clause, params = _restrict_to_ids(where_clause, params, candidate_ids)
+    if where_clause:
+        query += " WHERE " + where_clause
+    query += f" GROUP BY {group_clause};"
+    async with admission.stage("db"):
+        with span("db_count"):
+            result = await db_connector.execute_query_async(query, tuple(params), columnar=True)
+    if "error" in result:
+        logger.warning(f"Live match count failed: {result['error']}")
+        return None
+    summary = summarize_groups(result["rows"])
+    live_count_cache.set(count_key, summary)
+    return summary
+
+
+async def _fetch_facet_tail(validated_filters: list, complete_up_to: int):
+    """
+    Facet cells of the matching rows inserted since the facet index's snapshot (a short
+    primary-key range), or None when there are more than FACET_INDEX_TAIL_MAX_ROWS of
+    them or the query fails.
+    """
+    select_clause = ", ".join(f"[{col}]" for col in facet_index.columns)
+    query = f"SELECT TOP {FACET_INDEX_TAIL_MAX_ROWS + 1} {select_clause} FROM dbo.ProfileData"
+    where_clause, params = _build_where_clause(validated_filters)
+    where_clause = f"{where_clause} AND [ProfileId] > ?" if where_clause else "[ProfileId] > ?"
+    query += f" WHERE {where_clause};"
+    async with admission.stage("db"):
+        with span("db_count"):
+            result = await db_connector.execute_query_async(query, tuple(params + [complete_up_to]), columnar=True)
+    if "error" in result:
+        logger.warning(f"Counting rows newer than the facet index failed: {result['error']}")
+        return None
+    if len(result["rows"]) > FACET_INDEX_TAIL_MAX_ROWS:
+        logger.info(f"More than {FACET_INDEX_TAIL_MAX_ROWS} matching rows are newer than the facet index; not using it.")
+        return None
+    return result["rows"]
+
+
+async def _execute_search(safe_columns: list, validated_filters: list, page_size: int, after: list, cache_key: str, candidate_ids: list = None):
+    """Runs one validated search page against the database and caches the result."""
+    if SEARCH_COUNTS_ENABLED and after is None:
+        # Counted alongside the first page; later pages of the same search don't repeat it.
+        page, counts = await asyncio.gather(
+            _execute_search_page(safe_columns, validated_filters, page_size, after, candidate_ids),
+            count_matches(validated_filters, candidate_ids),
+        )
+        if "error" not in page and counts is not None:
+            page["total_count"], page["facets"] = counts["total_count"], counts["facets"]
+    else:
+        page = await _execute_search_page(safe_columns, validated_filters, page_size, after, candidate_ids)
+    if "error" not in page and search_result_cache is not None:
+        await search_result_cache.set(cache_key, page)
+    return page
+
+
+async def _execute_search_page(safe_columns: list, validated_filters: list, page_size: int, after: list, candidate_ids: list = None):
+    """
+    Runs the query for one page of a validated search. `candidate_ids`, a known
+    superset of the matches, confines the query to those primary keys. A first page
+    holding every match also carries their ProfileIds as "match_ids", for the session's
+    candidate set; `build_and_run_search_query` drops them from the tool result.
+    """
+    # The seek columns are always fetched so the next token can be built, then dropped if not requested.
+    query_columns = safe_columns + [col for col in SEEK_COLUMNS if col not in safe_columns]
+    select_clause = ", ".join(f"[{col}]" for col in query_columns) # Add brackets for safety
+    query = f"SELECT TOP {page_size + 1} {select_clause} FROM dbo.ProfileData"
     
-    if conditions:
-        query += " WHERE " + " AND ".join(conditions)
+    where_clause, params = _build_where_clause(validated_filters)
+    indexed = False
+
+    # When the session's candidates or the trigram index narrow the search, turn the scan into a
+    # primary-key lookup. The filters stay in place, so the ids only have to be a superset of the matches.
+    # Rows inserted since the index's last refresh aren't in its postings; they are let through by id.
+    restrict_ids = set(candidate_ids) if candidate_ids is not None else None
+    above_id = None
+    if search_index is not None:
+        # Read before the lookup: every ProfileId up to it is already in the postings the lookup sees.
+        snapshot_id = search_index.last_profile_id
+        # Off the loop: a lookup holds the index lock and can take tens of milliseconds on a large table.
+        max_candidates = SEARCH_INDEX_MAX_CANDIDATES if restrict_ids is None else None
+        index_ids = await asyncio.to_thread(search_index.resolve, validated_filters, max_candidates)
+        if index_ids is not None and (restrict_ids is not None or len(index_ids) <= SEARCH_INDEX_MAX_CANDIDATES):
+            restrict_ids = index_ids if restrict_ids is None else restrict_ids & index_ids
+            above_id = snapshot_id
+    if restrict_ids is not None:
+        if not restrict_ids and above_id is None:
+            return {"columns": safe_columns, "rows": [], "next_page_token": None, "match_ids": []}
+        where_clause, params = _restrict_to_ids(where_clause, params, restrict_ids, above_id)
+        indexed = True
 
-    query += " ORDER BY person_full_name ASC;"
-    return db_connector.execute_query(query, tuple(params))
+    if after is not None:
+        seek_clause, seek_params = _build_seek_clause(after)
+        where_clause = f"{where_clause} AND {seek_clause}" if where_clause else seek_clause
+        params += seek_params
+    if where_clause:
+        query += " WHERE " + where_clause
+
+    query += " ORDER BY person_full_name ASC, ProfileId ASC;"
+    async with admission.stage("db"):
+        started = time.perf_counter()
+        with span("db"):
+            result = await db_connector.execute_query_async(query, tuple(params), columnar=True)
+    if "error" in result:
+        return result  # Database error; never cached so it is retried next time.
+    rows = result["rows"]
+    observe_search_query(_filter_shape(validated_filters, indexed, after is not None), time.perf_counter() - started, len(rows), query)
+
+    # One extra row was fetched to learn whether another page exists.
+    next_page_token = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        name_index, id_index = query_columns.index("person_full_name"), query_columns.index("ProfileId")
+        after = [rows[-1][name_index], rows[-1][id_index]]
+        next_page_token = _encode_page_token(safe_columns, validated_filters, page_size, after)
+
+    page = {"columns": safe_columns, "rows": rows, "next_page_token": next_page_token}
+    if next_page_token is None and after is None:
+        id_index = query_columns.index("ProfileId")
+        page["match_ids"] = [row[id_index] for row in rows]
+
+    # Seek columns that were not requested sit at the end of each row; slice them off.
+    if len(query_columns) > len(safe_columns):
+        page["rows"] = [row[:len(safe_columns)] for row in rows]
+    return page
+
+
+# --- BULK EXPORT QUERY ---
+EXPORT_MAX_ROWS = int(os.getenv("EXPORT_MAX_ROWS", 100000))
+
+
+def build_export_query(filters: list = None, columns_to_select: list = None, max_rows: int = None):
+    """
+    Builds the same safe, validated query as the search tool but for a bulk export:
+    no paging, capped at EXPORT_MAX_ROWS. Returns (query, params, columns).
+    """
+    safe_columns, validated_filters = _validate_search(filters, columns_to_select)
+    max_rows = max(1, min(int(max_rows or EXPORT_MAX_ROWS), EXPORT_MAX_ROWS))
+
+    select_clause = ", ".join(f"[{col}]" for col in safe_columns) # Add brackets for safety
+    query = f"SELECT TOP {max_rows} {select_clause} FROM dbo.ProfileData"
+    where_clause, params = _build_where_clause(validated_filters)
+    if where_clause:
+        query += " WHERE " + where_clause
+    query += " ORDER BY person_full_name ASC, ProfileId ASC;"
+    return query, tuple(params), safe_columns
 
 
 # --- FINAL TOOL SCHEMA ---
@@ -90,6 +576,10 @@ dynamic_query_schema = {
                     "type": "array",
                     "description": "List of exact column names to show in the result.",
                     "items": {"type": "string"}
+                },
+                "page_size": {
+                    "type": "integer",
+                    "description": f"Number of contacts to return (default {SEARCH_PAGE_SIZE}, maximum {SEARCH_MAX_PAGE_SIZE})."
                 }
             }
         }
@@ -98,119 +588,330 @@ dynamic_query_schema = {
 
 available_tools = {"run_dynamic_query": build_and_run_search_query}
 
-db_schema_ddl = """
-CREATE TABLE [dbo].[ProfileData](
-	[ProfileId] [bigint] IDENTITY(1,1) NOT NULL,
-	[created_on] [datetime] NULL,
-	[job_title] [varchar](255) NULL,
-	[job_title_role] [varchar](255) NULL,
-	[organization_name] [varchar](255) NULL,
-	[organization_email] [varchar](255) NULL,
-	[organization_email_status] [varchar](50) NULL,
-	[organization_industries] [varchar](1000) NULL,
-	[organization_linkedin_url] [varchar](255) NULL,
-	[organization_size] [varchar](255) NULL,
-	[person_email] [varchar](500) NULL,
-	[person_full_name] [varchar](255) NULL,
-	[person_github_url] [varchar](255) NULL,
-	[person_linkedin_url] [varchar](255) NULL,
-    [person_linkedin_connections] [int] NULL,
-	[person_location_city] [varchar](255) NULL,
-	[person_location_country] [varchar](255) NULL,
-	[person_location_state] [varchar](255) NULL,
-	[person_mobile] [varchar](255) NULL,
-	[person_phone] [varchar](255) NULL,
-	[person_skills] [nvarchar](1000) NULL,
-	[person_twitter_url] [varchar](255) NULL
-);
-""" # NOTE: This is a curated, shorter version for prompt efficiency. You can use your full DDL.
-
-
-# --- THE MAIN AGENT INTERACTION FUNCTION ---
-async def run_agent_interaction(message: str, session_id: str, user_id: str) -> dict:
-    history = get_short_term_memory(session_id)
-    
-    system_prompt = f"""
-    You are Leadnova Assistant, an expert data analyst. Your job is to translate user requests into parameters for the `run_dynamic_query` tool. You operate in two modes: Broad Search and Narrow Refinement.
-    never told user you are data analyst work as a data analyst but tell to find lead
-
-    **MODE 1: BROAD SEARCH (for initial industry requests)**
-    When the user first asks for a broad industry category, your most important task is to perform **semantic expansion**. Convert their broad request into a list of specific, related sub-industries to provide a comprehensive initial result.
-
-    *Example of Broad Search:*
-    *User:* "give me data for businesses in the 'Health & Wellness' industry in the usa"
-    *Assistant's Action (Tool Call):*
-    ```json
-    {{
-      "filters": [
-        {{ "column": "person_location_country", "operator": "LIKE", "value": "united states" }}
-      ],
-      "organization_industries": [
-        "hospital & health care", "mental health care", "pharmaceuticals", "health, wellness and fitness", "medical devices"
-      ]
-    }}
-    ```
-
-    **MODE 2: NARROW REFINEMENT (for follow-up requests)**
-    After providing an initial list, any follow-up from the user should be treated **literally**. You MUST retain all previous filters and add the new, literal filter or specify new columns.
-
-    *Example of Narrow Refinement:*
-    *History:* The user just received a list of software engineers at Google.
-    *User:* "great, now show me their phone number and linkedin profile"
-    *Assistant's Action (Tool Call):*
-    ```json
-    {{
-      "filters": [
-        {{"column": "job_title", "operator": "LIKE", "value": "software engineer"}},
-        {{"column": "organization_name", "operator": "LIKE", "value": "Google"}}
-      ],
-      "columns_to_select": [ "person_full_name", "job_title", "person_mobile", "person_linkedin_url" ]
-    }}
-    ```
-
-    **CRITICAL RULES:**
-    - Always analyze the full conversation history to determine your mode and retain context.
-    - NEVER show your thought process or the JSON tool call to the user.
-    - If the user's request is too vague, ask a clarifying question.
-
-    **Database Schema for finding column names:**
-    ```sql
-    {db_schema_ddl}
-    ```
+
+
+# --- AGENT LOOP BUDGETS ---
+# One user message may take several model/tool round trips, bounded by steps, wall time and tokens.
+# One step by default: a search turn is answered from its tool results without a second model call.
+AGENT_MAX_TOOL_STEPS = max(1, int(os.getenv("AGENT_MAX_TOOL_STEPS", 1)))
+AGENT_TURN_TIME_BUDGET_SECONDS = float(os.getenv("AGENT_TURN_TIME_BUDGET_SECONDS", 45))
+AGENT_TURN_TOKEN_BUDGET = int(os.getenv("AGENT_TURN_TOKEN_BUDGET", 30000))
+
+
+# --- TOOL DECISION CACHE ---
+async def _embed(text: str) -> list:
+    response = await get_llm_client().embeddings.create(model=os.getenv("DECISION_CACHE_EMBEDDING_MODEL", "text-embedding-3-small"), input=text)
+    return response.data[0].embedding
+
+# Repeated opening questions reuse the model's earlier tool arguments and skip the LLM call.
+# DECISION_CACHE_ENABLED=0 is the kill switch; a similarity threshold (e.g. 0.95) enables the embedding tier.
+decision_cache = DecisionCache(
+    max_entries=int(os.getenv("DECISION_CACHE_MAX_ENTRIES", 1024)),
+    ttl=float(os.getenv("DECISION_CACHE_TTL_SECONDS", 3600)),
+    enabled=os.getenv("DECISION_CACHE_ENABLED", "1") == "1",
+    embed=_embed,
+    similarity_threshold=float(os.getenv("DECISION_CACHE_SIMILARITY_THRESHOLD", 0)) or None,
+)
+
+
+# --- LLM CALL HELPER ---
+async def _llm_events(messages: list, stream: bool):
     """
-    
-    messages = [{"role": "system", "content": system_prompt}] + history + [{"role": "user", "content": message}]
+    Calls the model and yields ("token", text) for each streamed text fragment,
+    followed by a single ("message", {"content", "tool_calls", "usage"}) once complete.
+    """
+    if not stream:
+        response = await get_llm_client().chat.completions.create(model="gpt-4o", messages=messages, tools=[dynamic_query_schema], tool_choice="auto")
+        response_message = response.choices[0].message
+        tool_calls = [
+            {"id": tc.id, "name": tc.function.name, "arguments": tc.function.arguments}
+            for tc in response_message.tool_calls or []
+        ]
+        usage = response.usage.model_dump() if response.usage else None
+        yield "message", {"content": response_message.content, "tool_calls": tool_calls, "usage": usage}
+        return
+
+    response = await get_llm_client().chat.completions.create(
+        model="gpt-4o", messages=messages, tools=[dynamic_query_schema], tool_choice="auto",
+        stream=True, stream_options={"include_usage": True}
+    )
+    content_parts, tool_calls, usage = [], {}, None
+    async for chunk in response:
+        if chunk.usage:
+            usage = chunk.usage.model_dump()  # Sent in a final chunk with no choices
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta
+        if delta.content:
+            content_parts.append(delta.content)
+            yield "token", delta.content
+        # Tool calls arrive as fragments keyed by index; stitch name and arguments together.
+        for tc in delta.tool_calls or []:
+            entry = tool_calls.setdefault(tc.index, {"id": None, "name": "", "arguments": ""})
+            if tc.id:
+                entry["id"] = tc.id
+            if tc.function and tc.function.name:
+                entry["name"] += tc.function.name
+            if tc.function and tc.function.arguments:
+                entry["arguments"] += tc.function.arguments
+
+    content = "".join(content_parts) or None
+    yield "message", {"content": content, "tool_calls": [tool_calls[i] for i in sorted(tool_calls)], "usage": usage}
+
+
+async def _until_deadline(events, deadline: float):
+    """
+    Re-yields an async generator's items, raising TimeoutError once `deadline` (a
+    time.monotonic() value) passes. Only the wait for each item is bounded, so the
+    consumer's own work between items never trips the timeout.
+    """
+    async with contextlib.aclosing(events):
+        while True:
+            try:
+                item = await asyncio.wait_for(anext(events), max(0.0, deadline - time.monotonic()))
+            except StopAsyncIteration:
+                return
+            yield item
+
+
+# --- TOOL EXECUTION HELPERS ---
+async def _execute_tool_call(tool_call: dict, message: str, session_id: str, user_id: str) -> dict:
+    """Runs one tool call requested by the model. Returns {"call", "name", "arguments", "output"}."""
+    function_name = tool_call["name"]
+    result = {"call": tool_call, "name": function_name, "arguments": None, "output": None}
+    function_to_call = available_tools.get(function_name)
+    if not function_to_call:
+        result["output"] = {"error": "Internal error: AI tried an unknown tool."}
+        return result
+    try:
+        result["arguments"] = json.loads(tool_call["arguments"] or "{}")
+    except json.JSONDecodeError:
+        result["output"] = {"error": "Internal error: AI sent malformed tool arguments."}
+        return result
+    if not isinstance(result["arguments"], dict):
+        result["output"] = {"error": "Internal error: AI sent malformed tool arguments."}
+        return result
+
+    # The model sometimes invents arguments (e.g. a bare column name); pass only the ones the tool takes.
+    parameters = inspect.signature(function_to_call).parameters
+    ignored = [name for name in result["arguments"] if name not in parameters or name == "session_id"]
+    if ignored:
+        logger.warning(f"Ignoring unknown arguments to {function_name}: {ignored}")
+    kwargs = {name: value for name, value in result["arguments"].items() if name not in ignored}
+
+    await log_significant_action(user_id=user_id, session_id=session_id, action_type=f"attempt_{function_name}", user_query=message, generated_sql=str(result["arguments"]))
+    try:
+        with span("tool"):
+            result["output"] = await function_to_call(**kwargs, session_id=session_id)
+    except AdmissionRejected:
+        raise
+    except Exception as e:
+        # One failing call must not take down the other calls of the same step.
+        logger.error(f"Tool call {function_name} failed: {e}", exc_info=True)
+        result["output"] = {"error": f"Internal error: the {function_name} tool failed."}
+    return result
+
+
+def _tool_result_for_model(output) -> str:
+    """A compact summary of a tool result for the model's next step (not the full rows)."""
+    if isinstance(output, dict) and "error" in output:
+        return dumps({"error": output["error"]})
+    rows = output.get("rows") or []
+    summary = {
+        "row_count": len(rows),
+        "has_more": bool(output.get("next_page_token")),
+        "sample": to_records(output["columns"], rows[:3]),
+    }
+    if output.get("total_count") is not None:
+        summary["total_count"] = output["total_count"]
+        summary["facets"] = {col: values[:3] for col, values in output["facets"].items()}
+    return dumps(summary)
+
+
+def _merge_search_outputs(outputs: list):
+    """
+    Merges the results of several searches into one column list and row list.
+    Columns keep their first-seen order; rows are de-duplicated on ProfileId when
+    it was selected, otherwise on the full row.
+    """
+    columns = []
+    for output in outputs:
+        columns += [col for col in output["columns"] if col not in columns]
+    rows, seen = [], set()
+    for output in outputs:
+        positions = [output["columns"].index(col) if col in output["columns"] else None for col in columns]
+        for row in output["rows"]:
+            merged = [row[i] if i is not None else None for i in positions]
+            key = merged[columns.index("ProfileId")] if "ProfileId" in columns else tuple(merged)
+            if key in seen:
+                continue
+            seen.add(key)
+            rows.append(merged)
+    return columns, rows
+
+
+# --- THE MAIN AGENT INTERACTION FUNCTIONS ---
+async def stream_agent_interaction(message: str, session_id: str, user_id: str, stream: bool = True, continuation_token: str = None, result_format: str = "records"):
+    """
+    Runs one agent turn and yields progress events as {"event": str, "data": ...} dicts:
+    "token" (text fragments), "tool_call" (tool progress), "rows" (query results)
+    and finally "done" carrying the complete response object.
+
+    Every tool call in a model response runs concurrently and their results are merged.
+    With AGENT_MAX_TOOL_STEPS above 1 the results go back to the model, which may follow
+    up with more tool calls or answer in text (used as the response's summary), up to that
+    many model calls per turn. Every model and tool step is bounded by the turn's time
+    budget; the loop also stops once the token budget is spent.
+    With a `continuation_token` the LLM is skipped and the next page of that search is returned.
+    `result_format="columnar"` returns data as {"columns": [...], "rows": [[...], ...]}
+    instead of a list of row dicts.
+    """
+    if continuation_token:
+        # A bad token is the caller's mistake, not a failed search; answer it before any other work.
+        try:
+            _decode_page_token(continuation_token)
+        except ValueError as e:
+            logger.warning(str(e))
+            yield {"event": "done", "data": {"type": "error_response", "content": INVALID_PAGE_TOKEN_MESSAGE}}
+            return
+
+    with span("memory_read"):
+        history, summary = await asyncio.gather(
+            get_short_term_memory(session_id, k=SESSION_MEMORY_MAX_MESSAGES),
+            get_session_summary(session_id),
+        )
+    messages, prompt_tokens = build_prompt_messages(message, history, summary)
+    logger.info(f"Prompt assembled for session {session_id}: ~{prompt_tokens} tokens ({system_prompt_tokens()} in the static prefix).")
     
     try:
-        response = client.chat.completions.create(model="gpt-4o", messages=messages, tools=[dynamic_query_schema], tool_choice="auto")
-        response_message = response.choices[0].message
-        
+        deadline = time.monotonic() + AGENT_TURN_TIME_BUDGET_SECONDS
+        tokens_used = 0
+        tool_results = []
+        response_message = None
+        reply_text = None  # The model's own text, when its last step answered without tool calls
+
+        for step in range(AGENT_MAX_TOOL_STEPS):
+            cached_calls = None
+            if step == 0 and not continuation_token:
+                cached_calls = await decision_cache.lookup(history, message, summary)
+
+            if continuation_token:
+                # Paging through an earlier search needs no new decision from the model.
+                response_message = {"content": None, "usage": None, "tool_calls": [
+                    {"id": None, "name": "run_dynamic_query", "arguments": json.dumps({"continuation_token": continuation_token})}
+                ]}
+            elif cached_calls:
+                logger.info("Decision cache hit; skipping the LLM call.")
+                response_message = {"content": None, "usage": None, "tool_calls": [
+                    {"id": f"cached_{i}", "name": call["name"], "arguments": call["arguments"]} for i, call in enumerate(cached_calls)
+                ]}
+            else:
+                try:
+                    async with admission.stage("llm"):
+                        with span("llm"):
+                            async for kind, payload in _until_deadline(_llm_events(messages, stream), deadline):
+                                if kind == "token":
+                                    yield {"event": "token", "data": payload}
+                                else:
+                                    response_message = payload
+                except TimeoutError:
+                    if not tool_results:
+                        raise
+                    logger.warning(f"Follow-up LLM step {step + 1} ran past the turn's time budget; answering from earlier results.")
+                    break
+                usage = response_message["usage"]
+                if usage:
+                    tokens_used += usage.get("total_tokens") or 0
+                    cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens")
+                    LLM_TOKENS.inc(usage.get("prompt_tokens") or 0, kind="prompt")
+                    LLM_TOKENS.inc(cached or 0, kind="cached")
+                    LLM_TOKENS.inc(usage.get("completion_tokens") or 0, kind="completion")
+                    logger.info(f"LLM step {step + 1}: {usage.get('prompt_tokens')} prompt tokens ({cached or 0} cached), {usage.get('completion_tokens')} completion tokens.")
+
+            if not response_message["tool_calls"]:
+                reply_text = response_message["content"]
+                break
+
+            for tool_call in response_message["tool_calls"]:
+                yield {"event": "tool_call", "data": {"id": tool_call["id"], "name": tool_call["name"], "status": "started"}}
+            try:
+                async with asyncio.timeout(max(0.0, deadline - time.monotonic())):
+                    step_results = await asyncio.gather(*(
+                        _execute_tool_call(tool_call, message, session_id, user_id) for tool_call in response_message["tool_calls"]
+                    ))
+            except TimeoutError:
+                if not tool_results:
+                    raise
+                logger.warning(f"Tool step {step + 1} ran past the turn's time budget; answering from earlier results.")
+                break
+            for result in step_results:
+                yield {"event": "tool_call", "data": {"id": result["call"]["id"], "name": result["name"], "status": "completed", "arguments": result["arguments"]}}
+            tool_results += step_results
+
+            # Remember a fresh opening decision once its tools ran cleanly.
+            if step == 0 and not continuation_token and not cached_calls and all(
+                isinstance(r["output"], dict) and "error" not in r["output"] for r in step_results
+            ):
+                await decision_cache.store(history, message, response_message["tool_calls"], summary)
+
+            if continuation_token or cached_calls:
+                break
+            if step + 1 >= AGENT_MAX_TOOL_STEPS or time.monotonic() >= deadline or tokens_used >= AGENT_TURN_TOKEN_BUDGET:
+                logger.info(f"Ending tool loop after step {step + 1} ({tokens_used} tokens used).")
+                break
+
+            # Hand the results back to the model so it can follow up within the same turn.
+            messages.append({"role": "assistant", "content": response_message["content"], "tool_calls": [
+                {"id": r["call"]["id"], "type": "function", "function": {"name": r["name"], "arguments": r["call"]["arguments"]}}
+                for r in step_results
+            ]})
+            messages += [
+                {"role": "tool", "tool_call_id": r["call"]["id"], "content": _tool_result_for_model(r["output"])}
+                for r in step_results
+            ]
+
         final_response_obj = {}
+        if tool_results:
+            outputs = [r["output"] for r in tool_results if isinstance(r["output"], dict) and "error" not in r["output"]]
+            errors = [r["output"]["error"] for r in tool_results if isinstance(r["output"], dict) and "error" in r["output"]]
+            columns, rows = _merge_search_outputs(outputs) if outputs else ([], [])
 
-        if response_message.tool_calls:
-            tool_call = response_message.tool_calls[0]
-            function_name = tool_call.function.name
-            function_to_call = available_tools.get(function_name)
-            
-            if function_to_call:
-                function_args = json.loads(tool_call.function.arguments)
-                log_significant_action(user_id=user_id, session_id=session_id, action_type=f"attempt_{function_name}", user_query=message, generated_sql=str(function_args))
-                tool_output = function_to_call(**function_args)
-
-                if isinstance(tool_output, dict) and 'error' in tool_output:
-                    final_response_obj = {"type": "error_response", "content": f"Database error: {tool_output['error']}"}
-                elif not tool_output:
-                    final_response_obj = {"type": "text_response", "content": "I couldn't find any contacts matching that refined search. Please try removing a filter or using different keywords."}
+            if rows:
+                if result_format == "columnar":
+                    data = {"columns": columns, "rows": rows}
                 else:
-                    summary_text = f"I've updated the list and found {len(tool_output)} contacts. Here are the details:"
-                    final_response_obj = {"type": "data_response", "content": {"summary": summary_text, "data": tool_output}}
-
-                output_summary = f"Found {len(tool_output)} rows." if isinstance(tool_output, list) else str(tool_output)
-                log_significant_action(user_id=user_id, session_id=session_id, action_type=f"success_{function_name}", user_query=message, generated_sql=str(function_args), tool_output_summary=output_summary, agent_response=json.dumps(final_response_obj))
+                    data = to_records(columns, rows)
+                yield {"event": "rows", "data": data}
+                # A page token and match counts only make sense when the turn ran a single search.
+                single = outputs[0] if len(outputs) == 1 else {}
+                next_page_token = single.get("next_page_token")
+                total_count = single.get("total_count")
+                if reply_text:
+                    summary_text = reply_text
+                elif total_count is not None and total_count > len(rows):
+                    summary_text = f"I've updated the list: {total_count:,} contacts match. Here are the first {len(rows)}:"
+                else:
+                    summary_text = f"I've updated the list and found {len(rows)} contacts. Here are the details:"
+                final_response_obj = {"type": "data_response", "content": {
+                    "summary": summary_text, "data": data, "next_page_token": next_page_token,
+                    "total_count": total_count, "facets": single.get("facets"),
+                }}
+            elif errors and not outputs:
+                if errors[0].startswith("Internal error"):
+                    final_response_obj = {"type": "error_response", "content": errors[0]}
+                else:
+                    final_response_obj = {"type": "error_response", "content": f"Database error: {errors[0]}"}
             else:
-                final_response_obj = {"type": "error_response", "content": "Internal error: AI tried an unknown tool."}
+                final_response_obj = {"type": "text_response", "content": reply_text or "I couldn't find any contacts matching that refined search. Please try removing a filter or using different keywords."}
+
+            for r in tool_results:
+                if r["arguments"] is None:
+                    continue
+                output = r["output"]
+                output_summary = f"Found {len(output['rows'])} rows." if isinstance(output, dict) and "rows" in output else str(output)
+                await log_significant_action(user_id=user_id, session_id=session_id, action_type=f"success_{r['name']}", user_query=message, generated_sql=str(r["arguments"]), tool_output_summary=output_summary, agent_response=dumps(final_response_obj))
         else:
-            full_agent_response = response_message.content or "I'm not sure how to respond to that."
+            full_agent_response = reply_text or "I'm not sure how to respond to that."
             final_response_obj = {"type": "text_response", "content": full_agent_response}
         
         response_for_history = ""
@@ -221,10 +922,25 @@ async def run_agent_interaction(message: str, session_id: str, user_id: str) ->
             response_for_history = final_response_obj.get("content", "An unspecified error occurred.")
         
         if response_for_history:
-             update_short_term_memory(session_id, message, response_for_history)
+            with span("memory_write"):
+                await update_short_term_memory(session_id, message, response_for_history)
         
-        return final_response_obj
+        yield {"event": "done", "data": final_response_obj}
 
+    except AdmissionRejected:
+        raise  # Over capacity; the endpoint answers 503 with Retry-After
+    except TimeoutError:
+        logger.warning(f"Agent turn for session {session_id} ran past its {AGENT_TURN_TIME_BUDGET_SECONDS}s time budget.")
+        yield {"event": "done", "data": {"type": "error_response", "content": "I'm sorry, that request took too long. Please try again."}}
     except Exception as e:
         logger.error(f"An error occurred in agent interaction: {e}", exc_info=True)
-        return {"type": "error_response", "content": "I'm sorry, an unexpected error occurred."}
\ No newline at end of file
+        yield {"event": "done", "data": {"type": "error_response", "content": "I'm sorry, an unexpected error occurred."}}
+
+
+async def run_agent_interaction(message: str, session_id: str, user_id: str, continuation_token: str = None, result_format: str = "records") -> dict:
+    """Runs one agent turn without streaming and returns the complete response object."""
+    final_response_obj = {"type": "error_response", "content": "I'm sorry, an unexpected error occurred."}
+    async for event in stream_agent_interaction(message, session_id, user_id, stream=False, continuation_token=continuation_token, result_format=result_format):
+        if event["event"] == "done":
+            final_response_obj = event["data"]
+    return final_response_obj
@@ -0,0 +1,121 @@
+# app/agent/decision_cache.py
+import re
+import json
+import math
+import hashlib
+import logging
+from app.services.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_message(message: str) -> str:
+    """Lower-cases, collapses whitespace and strips quotes and trailing punctuation."""
+    text = " ".join(str(message).lower().split())
+    return re.sub(r"[\s\"'.!?]+$", "", text.strip("\"' "))
+
+
+def _history_fingerprint(history: list, summary: str = None) -> str:
+    """Empty for a fresh session, otherwise a hash of everything the model would see."""
+    if not history and not summary:
+        return ""
+    raw = json.dumps({"history": history, "summary": summary}, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _cosine(a: list, b: list) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+class DecisionCache:
+    """
+    Remembers the tool calls the model chose for a (history, user message) pair so an
+    identical request can skip the LLM call and go straight to the tools.
+
+    Exact matches use a normalized form of the message. When `embed` is given and
+    `similarity_threshold` is set, a miss falls back to the most similar cached message
+    with the same history whose embedding cosine similarity reaches the threshold.
+    """
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600, enabled: bool = True, embed=None, similarity_threshold: float = None):
+        self.enabled = enabled
+        self.embed = embed
+        self.similarity_threshold = similarity_threshold
+        self._entries = TTLCache(max_entries=max_entries, ttl=ttl)
+        self._stats = {"exact_hits": 0, "similar_hits": 0, "misses": 0, "stores": 0, "embedding_errors": 0}
+
+    @property
+    def _similarity_enabled(self) -> bool:
+        return self.embed is not None and bool(self.similarity_threshold)
+
+    @staticmethod
+    def key(history: list, message: str, summary: str = None) -> str:
+        raw = f"{_history_fingerprint(history, summary)}|{normalize_message(message)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    async def lookup(self, history: list, message: str, summary: str = None):
+        """Returns the cached tool calls ([{"name", "arguments"}]) for this request, or None."""
+        if not self.enabled:
+            return None
+        entry = self._entries.get(self.key(history, message, summary))
+        if entry is not None:
+            entry["hits"] += 1
+            self._stats["exact_hits"] += 1
+            return entry["tool_calls"]
+
+        if self._similarity_enabled:
+            entry = await self._lookup_similar(history, message, summary)
+            if entry is not None:
+                entry["hits"] += 1
+                self._stats["similar_hits"] += 1
+                return entry["tool_calls"]
+
+        self._stats["misses"] += 1
+        return None
+
+    async def _lookup_similar(self, history: list, message: str, summary: str = None):
+        fingerprint = _history_fingerprint(history, summary)
+        candidates = [e for _, e in self._entries.items() if e["history"] == fingerprint and e["embedding"]]
+        if not candidates:
+            return None
+        try:
+            vector = await self.embed(normalize_message(message))
+        except Exception as e:
+            self._stats["embedding_errors"] += 1
+            logger.warning(f"Decision cache embedding failed: {e}")
+            return None
+        best = max(candidates, key=lambda e: _cosine(vector, e["embedding"]))
+        score = _cosine(vector, best["embedding"])
+        if score >= self.similarity_threshold:
+            logger.info(f"Decision cache similarity hit ({score:.3f}) for '{best['message']}'.")
+            return best
+        return None
+
+    async def store(self, history: list, message: str, tool_calls: list, summary: str = None):
+        """Caches the model's tool calls, keeping only their names and arguments."""
+        if not self.enabled or not tool_calls:
+            return
+        embedding = None
+        if self._similarity_enabled:
+            try:
+                embedding = await self.embed(normalize_message(message))
+            except Exception as e:
+                self._stats["embedding_errors"] += 1
+                logger.warning(f"Decision cache embedding failed: {e}")
+        self._entries.set(self.key(history, message, summary), {
+            "message": normalize_message(message),
+            "history": _history_fingerprint(history, summary),
+            "tool_calls": [{"name": tc["name"], "arguments": tc["arguments"]} for tc in tool_calls],
+            "embedding": embedding,
+            "hits": 0,
+        })
+        self._stats["stores"] += 1
+
+    def stats(self, top: int = 10) -> dict:
+        snapshot = dict(self._stats)
+        snapshot["enabled"] = self.enabled
+        snapshot["entries"] = len(self._entries)
+        entries = sorted((e for _, e in self._entries.items()), key=lambda e: e["hits"], reverse=True)
+        snapshot["top_entries"] = [{"message": e["message"], "hits": e["hits"]} for e in entries[:top]]
+        return snapshot
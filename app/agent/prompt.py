@@ -0,0 +1,210 @@
+# app/agent/prompt.py
+import os
+import json
+import logging
+import threading
+from app.services.memory import summarize_turns
+
+try:
+    import tiktoken
+except ImportError: # Optional; token counts fall back to a characters/4 estimate
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+PROMPT_HISTORY_TOKEN_BUDGET = int(os.getenv("PROMPT_HISTORY_TOKEN_BUDGET", 2000))
+PROMPT_SUMMARY_MAX_TOKENS = int(os.getenv("PROMPT_SUMMARY_MAX_TOKENS", 300))
+
+
+db_schema_ddl = """
+CREATE TABLE [dbo].[ProfileData](
+	[ProfileId] [bigint] IDENTITY(1,1) NOT NULL,
+	[created_on] [datetime] NULL,
+	[job_title] [varchar](255) NULL,
+	[job_title_role] [varchar](255) NULL,
+	[organization_name] [varchar](255) NULL,
+	[organization_email] [varchar](255) NULL,
+	[organization_email_status] [varchar](50) NULL,
+	[organization_industries] [varchar](1000) NULL,
+	[organization_linkedin_url] [varchar](255) NULL,
+	[organization_size] [varchar](255) NULL,
+	[person_email] [varchar](500) NULL,
+	[person_full_name] [varchar](255) NULL,
+	[person_github_url] [varchar](255) NULL,
+	[person_linkedin_url] [varchar](255) NULL,
+    [person_linkedin_connections] [int] NULL,
+	[person_location_city] [varchar](255) NULL,
+	[person_location_country] [varchar](255) NULL,
+	[person_location_state] [varchar](255) NULL,
+	[person_mobile] [varchar](255) NULL,
+	[person_phone] [varchar](255) NULL,
+	[person_skills] [nvarchar](1000) NULL,
+	[person_twitter_url] [varchar](255) NULL
+);
+""" # NOTE: This is a curated, shorter version for prompt efficiency. You can use your full DDL.
+
+
+# --- STATIC PROMPT PREFIX ---
+# Built once at import. Keeping the system prompt (and the tool schema) byte-identical
+# across requests lets the provider's prompt cache reuse the prefix.
+SYSTEM_PROMPT = f"""
+    You are Leadnova Assistant, an expert data analyst. Your job is to translate user requests into parameters for the `run_dynamic_query` tool. You operate in two modes: Broad Search and Narrow Refinement.
+    never told user you are data analyst work as a data analyst but tell to find lead
+
+    **MODE 1: BROAD SEARCH (for initial industry requests)**
+    When the user first asks for a broad industry category, your most important task is to perform **semantic expansion**. Convert their broad request into a list of specific, related sub-industries to provide a comprehensive initial result.
+
+    *Example of Broad Search:*
+    *User:* "give me data for businesses in the 'Health & Wellness' industry in the usa"
+    *Assistant's Action (Tool Call):*
+    ```json
+    {{
+      "filters": [
+        {{ "column": "person_location_country", "operator": "LIKE", "value": "united states" }}
+      ],
+      "organization_industries": [
+        "hospital & health care", "mental health care", "pharmaceuticals", "health, wellness and fitness", "medical devices"
+      ]
+    }}
+    ```
+
+    **MODE 2: NARROW REFINEMENT (for follow-up requests)**
+    After providing an initial list, any follow-up from the user should be treated **literally**. You MUST retain all previous filters and add the new, literal filter or specify new columns.
+
+    *Example of Narrow Refinement:*
+    *History:* The user just received a list of software engineers at Google.
+    *User:* "great, now show me their phone number and linkedin profile"
+    *Assistant's Action (Tool Call):*
+    ```json
+    {{
+      "filters": [
+        {{"column": "job_title", "operator": "LIKE", "value": "software engineer"}},
+        {{"column": "organization_name", "operator": "LIKE", "value": "Google"}}
+      ],
+      "columns_to_select": [ "person_full_name", "job_title", "person_mobile", "person_linkedin_url" ]
+    }}
+    ```
+
+    **CRITICAL RULES:**
+    - Always analyze the full conversation history to determine your mode and retain context.
+    - NEVER show your thought process or the JSON tool call to the user.
+    - If the user's request is too vague, ask a clarifying question.
+
+    **Database Schema for finding column names:**
+    ```sql
+    {db_schema_ddl}
+    ```
+    """
+
+
+# --- TOKEN ACCOUNTING ---
+# The encoding may be downloaded on first load, so it is loaded lazily: during the
+# app's startup warmup, or by the first token count.
+_encoding = None
+_encoding_loaded = False
+_encoding_lock = threading.Lock()
+
+
+def load_encoding(blocking: bool = True):
+    """
+    Loads gpt-4o's tokenizer once. Returns None when token counts are estimated instead.
+    With `blocking=False` it never waits for a load in progress (the startup warmup
+    may be downloading the encoding); callers on the event loop estimate meanwhile.
+    """
+    global _encoding, _encoding_loaded
+    if _encoding_loaded:
+        return _encoding
+    if not _encoding_lock.acquire(blocking=blocking):
+        return None
+    try:
+        if not _encoding_loaded:
+            if tiktoken is not None:
+                try:
+                    _encoding = tiktoken.get_encoding("o200k_base")
+                except Exception as e:
+                    logger.warning(f"Could not load the tiktoken encoding, estimating token counts instead: {e}")
+            _encoding_loaded = True
+    finally:
+        _encoding_lock.release()
+    return _encoding
+
+# Fixed per-message overhead of the chat format (role, separators).
+_MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    encoding = load_encoding(blocking=False)
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return len(text) // 4 + 1
+
+
+def count_message_tokens(message: dict) -> int:
+    content = message.get("content")
+    if not isinstance(content, str):
+        content = json.dumps(content) if content is not None else ""
+    return count_tokens(content) + _MESSAGE_OVERHEAD_TOKENS
+
+
+_system_prompt_tokens = None
+
+
+def system_prompt_tokens() -> int:
+    """Token count of the static system prompt, computed once the tokenizer is loaded (estimated until then)."""
+    global _system_prompt_tokens
+    if _system_prompt_tokens is not None:
+        return _system_prompt_tokens
+    tokens = count_message_tokens({"role": "system", "content": SYSTEM_PROMPT})
+    if _encoding_loaded:
+        _system_prompt_tokens = tokens
+    return tokens
+
+
+def clip_to_tokens(text: str, max_tokens: int) -> str:
+    """Keeps the end of `text` (the most recent part) within `max_tokens`."""
+    if count_tokens(text) <= max_tokens:
+        return text
+    encoding = load_encoding(blocking=False)
+    if encoding is not None:
+        return encoding.decode(encoding.encode(text)[-max_tokens:])
+    return text[-max_tokens * 4:]
+
+
+# --- PROMPT ASSEMBLY ---
+def build_prompt_messages(message: str, history: list, summary: str = None):
+    """
+    Assembles the messages for a model call:
+    the static system prompt, then a summary of older turns (if any), then as many of
+    the most recent history messages as fit in PROMPT_HISTORY_TOKEN_BUDGET, then the
+    user's message. History that does not fit is condensed into the summary message.
+
+    Returns (messages, prompt_tokens), where prompt_tokens is the local estimate of
+    the prompt size (excluding the tool schema).
+    """
+    budget = PROMPT_HISTORY_TOKEN_BUDGET
+    kept = []
+    for item in reversed(history):
+        cost = count_message_tokens(item)
+        if cost > budget:
+            break
+        kept.append(item)
+        budget -= cost
+    kept.reverse()
+    # Start the kept history on a user turn rather than a dangling assistant reply.
+    while kept and kept[0].get("role") != "user":
+        kept.pop(0)
+    dropped = history[:len(history) - len(kept)]
+
+    summary_parts = [part for part in [summary, summarize_turns(dropped) if dropped else None] if part]
+    messages = [{"role": "system", "content": SYSTEM_PROMPT}]
+    if summary_parts:
+        summary_text = clip_to_tokens("\n".join(summary_parts), PROMPT_SUMMARY_MAX_TOKENS)
+        # A separate message after the static prefix, so the prefix itself never changes.
+        messages.append({"role": "system", "content": f"Summary of earlier conversation:\n{summary_text}"})
+    messages += kept
+    messages.append({"role": "user", "content": message})
+
+    prompt_tokens = sum(count_message_tokens(m) for m in messages)
+    return messages, prompt_tokens
@@ -0,0 +1,88 @@
+# app/batch.py
+"""
+Batch mode: runs a file of (user, message) lead requests through the agent with
+bounded concurrency and streams one NDJSON result per job to the output file.
+
+The output file doubles as the checkpoint: rerunning the same command skips every
+job already recorded there, so an interrupted run resumes where it stopped.
+
+Usage: python -m app.batch jobs.ndjson --output results.ndjson [--concurrency 8]
+                           [--retry-failed] [--restart] [--max-jobs N] [--no-dedupe]
+
+Input lines look like {"id": "q1", "user_id": "ops", "message": "CTOs at fintech companies in Germany"};
+"id" defaults to the line number and "user_id" to "batch". A .csv input needs a
+header row with user_id (or user), message and optionally id.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import itertools
+import logging
+
+
+async def run_batch(args) -> dict:
+    # Imported here so the app's environment-driven settings are read when the batch starts.
+    from app.main import services
+    from app.services.batch import BatchRunner, NdjsonWriter, read_jobs, completed_job_ids
+    logger = logging.getLogger("app.batch")
+
+    if args.restart and os.path.exists(args.output):
+        os.remove(args.output)
+    done_ids = completed_job_ids(args.output, include_failed=not args.retry_failed)
+    if done_ids:
+        logger.info(f"Resuming: {len(done_ids)} jobs already in {args.output}.")
+
+    runner = BatchRunner(concurrency=args.concurrency, max_retries=args.max_retries, dedupe_messages=not args.no_dedupe)
+    records = read_jobs(args.jobs)
+    if args.max_jobs:
+        pending = (record for record in records if str(_record_id(record)) not in done_ids)
+        records = itertools.islice(pending, args.max_jobs)
+
+    started = time.perf_counter()
+    writer = NdjsonWriter(args.output)
+    await services.start()
+    try:
+        written = 0
+        async for result in runner.run(records, done_ids):
+            writer.write(result)
+            written += 1
+            if written % args.progress_every == 0:
+                logger.info(f"{written} jobs written ({runner.stats['failed']} failed) in {time.perf_counter() - started:.1f}s.")
+    finally:
+        writer.close()
+        await services.stop()
+
+    summary = runner.summary()
+    summary["elapsed_seconds"] = round(time.perf_counter() - started, 3)
+    return summary
+
+
+def _record_id(record):
+    """The id a job record will get, without validating it (for --max-jobs)."""
+    position, raw, _ = record
+    return (raw.get("id") if isinstance(raw, dict) else None) or position
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("jobs", help="NDJSON (or .csv) file of jobs")
+    parser.add_argument("--output", "-o", required=True, help="NDJSON results file; also the resume checkpoint")
+    parser.add_argument("--concurrency", "-c", type=int, default=None, help="Jobs in flight (default BATCH_CONCURRENCY)")
+    parser.add_argument("--max-retries", type=int, default=None, help="Retries for jobs rejected by admission control")
+    parser.add_argument("--retry-failed", action="store_true", help="Rerun jobs whose recorded result is an error")
+    parser.add_argument("--restart", action="store_true", help="Discard the existing results file and start over")
+    parser.add_argument("--max-jobs", type=int, default=0, help="Stop after this many new jobs (0 = all)")
+    parser.add_argument("--no-dedupe", action="store_true", help="Run repeated messages separately")
+    parser.add_argument("--progress-every", type=int, default=50)
+    args = parser.parse_args()
+
+    summary = asyncio.run(run_batch(args))
+    print(json.dumps(summary, indent=2))
+    sys.exit(1 if summary["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,40 +1,161 @@
-import logging
-import logging.config
+import os
 import sys
+import json
+import time
+import queue
+import atexit
+import random
+import logging
+import logging.handlers
+import threading
+
+# Request coroutines only put records on a queue; one listener thread formats them
+# and does the console and file I/O.
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text") # "text" or "json" (one JSON object per line)
+LOG_FILE = os.getenv("LOG_FILE", "agent_activity.log") # Empty disables the file handler
+LOG_FILE_MAX_BYTES = int(os.getenv("LOG_FILE_MAX_BYTES", 10485760)) # 10 MB
+LOG_FILE_BACKUP_COUNT = int(os.getenv("LOG_FILE_BACKUP_COUNT", 5))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000)) # Records beyond this are dropped, never waited on
+# Per-query INFO logs (SQL text and parameters) are sampled and rate limited; warnings always pass.
+LOG_QUERY_LOGGERS = [name for name in os.getenv("LOG_QUERY_LOGGERS", "app.services.database").split(",") if name]
+LOG_QUERY_SAMPLE_RATE = float(os.getenv("LOG_QUERY_SAMPLE_RATE", 1.0))
+LOG_QUERY_MAX_PER_SECOND = float(os.getenv("LOG_QUERY_MAX_PER_SECOND", 0)) # 0 = unlimited
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+_stats = {"dropped": 0, "sampled_out": 0, "rate_limited": 0}
+_listener = None
+
+
+class JsonLineFormatter(logging.Formatter):
+    """Formats each record as a single JSON object."""
+    def format(self, record):
+        entry = {
+            "ts": self.formatTime(record, DATE_FORMAT),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "thread": record.threadName,
+        }
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Enqueues without blocking; when the queue is full the record is counted and dropped."""
+    def prepare(self, record):
+        # The listener runs in this process, so the record is queued as-is and all
+        # formatting (timestamps, tracebacks, JSON) happens on the listener thread.
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _stats["dropped"] += 1
+
+
+class DrainingQueueListener(logging.handlers.QueueListener):
+    """Waits for room for its stop sentinel, so stopping always flushes a full queue."""
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+
+class QueryLogFilter(logging.Filter):
+    """
+    Keeps a `sample_rate` fraction of records below WARNING and, when `max_per_second`
+    is set, at most that many per second (token bucket). Warnings and errors always pass.
+    """
+    def __init__(self, sample_rate: float = 1.0, max_per_second: float = 0):
+        super().__init__()
+        self.sample_rate = sample_rate
+        self.max_per_second = max_per_second
+        self._tokens = max_per_second
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            _stats["sampled_out"] += 1
+            return False
+        if self.max_per_second > 0:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.max_per_second, self._tokens + (now - self._last) * self.max_per_second)
+                self._last = now
+                if self._tokens < 1:
+                    _stats["rate_limited"] += 1
+                    return False
+                self._tokens -= 1
+        return True
+
+
+def build_handlers(json_lines: bool = None, filename: str = None, stream=None) -> list:
+    """The console and (optional) rotating file handlers the listener thread writes to."""
+    json_lines = (LOG_FORMAT == "json") if json_lines is None else json_lines
+    filename = LOG_FILE if filename is None else filename
+    formatter = JsonLineFormatter() if json_lines else logging.Formatter(TEXT_FORMAT, DATE_FORMAT)
+
+    console = logging.StreamHandler(stream or sys.stdout)
+    console.setFormatter(formatter)
+    handlers = [console]
+    if filename:
+        file_handler = logging.handlers.RotatingFileHandler(filename, maxBytes=LOG_FILE_MAX_BYTES, backupCount=LOG_FILE_BACKUP_COUNT, encoding="utf8")
+        file_handler.setFormatter(formatter)
+        handlers.append(file_handler)
+    return handlers
+
+
+def setup_logging(level: str = None, handlers: list = None, query_sample_rate: float = None, query_max_per_second: float = None):
+    """
+    Routes the root logger through a bounded queue to a single listener thread.
+    Safe to call again (e.g. from a benchmark); the previous listener is stopped first.
+    Returns the QueueListener.
+    """
+    global _listener
+    stop_logging()
+
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    _listener = DrainingQueueListener(log_queue, *(handlers or build_handlers()), respect_handler_level=True)
+    _listener.start()
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(DroppingQueueHandler(log_queue))
+    root.setLevel(level or LOG_LEVEL)
+
+    query_filter = QueryLogFilter(
+        LOG_QUERY_SAMPLE_RATE if query_sample_rate is None else query_sample_rate,
+        LOG_QUERY_MAX_PER_SECOND if query_max_per_second is None else query_max_per_second,
+    )
+    for name in LOG_QUERY_LOGGERS:
+        query_logger = logging.getLogger(name)
+        for existing in [f for f in query_logger.filters if isinstance(f, QueryLogFilter)]:
+            query_logger.removeFilter(existing)
+        query_logger.addFilter(query_filter)
+
+    logging.getLogger(__name__).info(f"Logging configured: level={root.level}, format={LOG_FORMAT}, file={LOG_FILE or 'none'}.")
+    return _listener
+
+
+def stop_logging():
+    """Flushes queued records and stops the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def logging_stats() -> dict:
+    snapshot = dict(_stats)
+    snapshot["queued"] = _listener.queue.qsize() if _listener is not None else 0
+    return snapshot
+
 
-# This dictionary configures the entire logging system.
-LOGGING_CONFIG = {
-    "version": 1,
-    "disable_existing_loggers": False,
-    "formatters": {
-        "default": {
-            "format": "%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-            "datefmt": "%Y-%m-%d %H:%M:%S",
-        },
-    },
-    "handlers": {
-        "console": {
-            "class": "logging.StreamHandler",
-            "formatter": "default",
-            "stream": "ext://sys.stdout",
-        },
-        "file": {
-            "class": "logging.handlers.RotatingFileHandler",
-            "formatter": "default",
-            "filename": "agent_activity.log", # Log file in the root project directory
-            "maxBytes": 10485760,  # 10 MB
-            "backupCount": 5,
-            "encoding": "utf8",
-        },
-    },
-    "root": {
-        "level": "INFO", # The minimum level of logs to capture
-        "handlers": ["console", "file"], # Send logs to BOTH console and file
-    },
-}
-
-def setup_logging():
-    """Applies the logging configuration."""
-    logging.config.dictConfig(LOGGING_CONFIG)
-    logger = logging.getLogger(__name__)
-    logger.info("Logging configured successfully from logging_config.py.")
\ No newline at end of file
+atexit.register(stop_logging)
@@ -1,55 +1,102 @@
 # app/main.py
 
+import time
+_IMPORT_STARTED = time.perf_counter() # For the import-to-ready measurement logged at startup
+
+import os
 import uuid
-from fastapi import FastAPI, Header
-from fastapi.responses import JSONResponse # Import JSONResponse
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Header, HTTPException, Request
+from fastapi.responses import StreamingResponse, PlainTextResponse
 from pydantic import BaseModel
-from typing import Optional
+from typing import Optional, List
 from fastapi.middleware.cors import CORSMiddleware
-import logging 
-import logging.config 
-
-from app.agent.core import run_agent_interaction
-
-LOGGING_CONFIG = {
-    "version": 1,
-    "disable_existing_loggers": False,
-    "formatters": {
-        "default": {
-            "format": "%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-            "datefmt": "%Y-%m-%d %H:%M:%S",
-        },
-    },
-    "handlers": {
-        "console": {
-            "class": "logging.StreamHandler",
-            "formatter": "default",
-            "stream": "ext://sys.stdout",
-        },
-        "file": {
-            "class": "logging.handlers.RotatingFileHandler",
-            "formatter": "default",
-            "filename": "agent_activity.log", # The name of your log file
-            "maxBytes": 10485760,  # 10 MB
-            "backupCount": 5,
-            "encoding": "utf8",
-        },
-    },
-    "root": {
-        "level": "INFO", # The minimum level of logs to capture
-        "handlers": ["console", "file"], # Send logs to both console and file
-    },
-}
-
-# Apply the logging configuration
-logging.config.dictConfig(LOGGING_CONFIG)
+import logging
+
+from app.agent.core import run_agent_interaction, stream_agent_interaction, build_export_query, decision_cache, get_llm_client, close_llm_client
+from app.agent.prompt import load_encoding
+from app.services.memory import activity_log_writer, log_significant_action, session_store, redis_client, redis_pool
+from app.services.container import ServiceContainer
+from app.services.database import db_connector
+from app.services.cache import search_result_cache
+from app.services.singleflight import search_single_flight
+from app.services.admission import admission, AdmissionRejected
+from app.logging_config import setup_logging, logging_stats
+from app.services.metrics import registry, request_timings, span, server_timing_header, SERVER_TIMING_ENABLED
+from app.services.export import stream_export, EXPORT_FORMATS
+from app.services.batch import BatchRunner
+from app.services.serialization import FastJSONResponse, dumps
+from app.services.search_index import search_index, search_index_service
+from app.services.facets import facet_index, facet_index_service, live_count_cache
+
+# Apply the logging configuration: records are queued and written by a single listener thread
+setup_logging()
 logger = logging.getLogger(__name__) # Get a logger for this file
 
 logger.info("Logging configured successfully. Logs will be written to console and file.")
 
+# --- SERVICE CONTAINER ---
+# Dependencies are connected in the lifespan (in parallel), never at import time, so a
+# worker starts quickly and a slow or missing dependency shows up on /health/ready
+# instead of stalling startup.
+async def _warm_redis():
+    connections = int(os.getenv("REDIS_WARMUP_CONNECTIONS", 2))
+    await asyncio.gather(*(redis_client.ping() for _ in range(max(1, connections))))
+
+async def _check_redis():
+    return await session_store.ping() # Also ends a fallback period once Redis is back
+
+async def _check_llm_client():
+    return get_llm_client() is not None
+
+async def _check_tokenizer():
+    return load_encoding(blocking=False) is not None # Down means token counts are estimated (or the encoding is still loading)
+
+async def _check_activity_log():
+    return activity_log_writer.running
+
+async def _check_search_index():
+    return search_index.ready
+
+async def _check_facet_index():
+    return facet_index.ready
+
+async def _close_database():
+    await asyncio.to_thread(db_connector.close)
+
+services = ServiceContainer(
+    warmup_timeout=float(os.getenv("STARTUP_WARMUP_TIMEOUT_SECONDS", 10)),
+    check_timeout=float(os.getenv("READINESS_CHECK_TIMEOUT_SECONDS", 2)),
+)
+services.register("database", check=db_connector.ping_async, warmup=db_connector.warmup, close=_close_database)
+services.register("redis", check=_check_redis, warmup=_warm_redis, close=redis_pool.disconnect, required=False) # Sessions fall back to memory
+# The OpenAI client and tokenizer are slow to load and not needed to serve health checks or
+# paging, so they warm up after startup; an OpenAI outage should not take workers out of rotation.
+services.register("llm", check=_check_llm_client, warmup=lambda: asyncio.to_thread(get_llm_client), close=close_llm_client, required=False, background=True)
+services.register("tokenizer", check=_check_tokenizer, warmup=lambda: asyncio.to_thread(load_encoding), required=False, background=True)
+# Registered after the database so they are stopped (and flushed) before it closes.
+services.register("activity_log", check=_check_activity_log, warmup=activity_log_writer.start, close=activity_log_writer.stop, required=False)
+if search_index_service is not None:
+    # Builds in the background; searches scan until it is ready.
+    services.register("search_index", check=_check_search_index, warmup=search_index_service.start, close=search_index_service.stop, required=False)
+if facet_index_service is not None:
+    # Match counts use live COUNT queries until it is ready.
+    services.register("facet_index", check=_check_facet_index, warmup=facet_index_service.start, close=facet_index_service.stop, required=False)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await services.start()
+    logger.info(f"Ready {(time.perf_counter() - _IMPORT_STARTED) * 1000:.0f} ms after app.main started importing.")
+    yield
+    await services.stop()
+
 app = FastAPI(
     title="Leadnova Assistant API",
-    description="Backend service for the AI Marketing Agent with Memory."
+    description="Backend service for the AI Marketing Agent with Memory.",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse
 )
 
 # CORS Middleware (should already be here)
@@ -63,31 +110,218 @@ app.add_middleware(
     expose_headers=["X-Session-ID"]
 )
 
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected_handler(request: Request, exc: AdmissionRejected):
+    """Over capacity: 429 (per-user rate limit) or 503 (stage queue full or wait expired), with Retry-After."""
+    return FastJSONResponse(
+        {"type": "error_response", "content": exc.message},
+        status_code=exc.status_code,
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+def _rate_limit_key(http_request: Request, x_user_id: Optional[str]) -> str:
+    """Per-user rate limit bucket: the X-User-ID, else the client address, so anonymous clients don't share one bucket."""
+    if x_user_id:
+        return f"user:{x_user_id}"
+    return f"client:{http_request.client.host if http_request.client else 'unknown'}"
+
+class AdmittedStreamingResponse(StreamingResponse):
+    """
+    A streamed response that gives back its admission slot (a turn or an export)
+    however the response ends, including
+    a client that disconnects before the body generator ever starts (whose `finally`
+    then never runs).
+    """
+    def __init__(self, content, leave, **kwargs):
+        super().__init__(content, **kwargs)
+        self.leave = leave
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.leave()
+
 class ChatRequest(BaseModel):
     message: str
+    continuation_token: Optional[str] = None # next_page_token from a previous data_response
+    result_format: str = "records" # "records" (list of row dicts) or "columnar" ({"columns", "rows"})
 
 # --- MODIFIED ENDPOINT ---
 @app.post("/chat") # Renamed from /chat/stream
 async def chat_endpoint(
     request: ChatRequest,
+    http_request: Request,
     x_session_id: Optional[str] = Header(None, alias="X-Session-ID"),
-    x_user_id: Optional[str] = Header("default-user", alias="X-User-ID")
+    x_user_id: Optional[str] = Header(None, alias="X-User-ID")
 ):
     """
     The API endpoint that now returns a structured JSON response from the agent.
     """
     session_id = x_session_id or str(uuid.uuid4())
+    rate_limit_key, x_user_id = _rate_limit_key(http_request, x_user_id), x_user_id or "default-user"
 
     # The agent interaction now returns a complete dictionary.
     # No more async for loop needed here.
-    response_data = await run_agent_interaction(request.message, session_id, x_user_id)
+    with request_timings() as timings:
+        async with admission.admit(rate_limit_key):
+            with span("total"):
+                response_data = await run_agent_interaction(request.message, session_id, x_user_id, request.continuation_token, request.result_format)
     
-    # Create a JSON response and add the session ID to the headers
-    response = JSONResponse(content=response_data)
+    # Create a JSON response (orjson-encoded when available) and add the session ID to the headers
+    response = FastJSONResponse(content=response_data)
     response.headers["X-Session-ID"] = session_id
     response.headers["Access-Control-Expose-Headers"] = "X-Session-ID" # Ensure frontend can read it
+    if SERVER_TIMING_ENABLED:
+        response.headers["Server-Timing"] = server_timing_header(timings)
     return response
 
+@app.post("/chat/stream")
+async def chat_stream_endpoint(
+    request: ChatRequest,
+    http_request: Request,
+    x_session_id: Optional[str] = Header(None, alias="X-Session-ID"),
+    x_user_id: Optional[str] = Header(None, alias="X-User-ID")
+):
+    """
+    Streams the agent's turn as server-sent events: "token" for text fragments,
+    "tool_call" for tool progress, "rows" for query results and a final "done"
+    event carrying the same object the /chat endpoint would return.
+    """
+    session_id = x_session_id or str(uuid.uuid4())
+    rate_limit_key, x_user_id = _rate_limit_key(http_request, x_user_id), x_user_id or "default-user"
+    # Admitted before the response starts so an over-capacity request still gets a 429/503.
+    leave = await admission.enter(rate_limit_key)
+
+    async def event_source():
+        try:
+            async for event in stream_agent_interaction(request.message, session_id, x_user_id, continuation_token=request.continuation_token, result_format=request.result_format):
+                yield f"event: {event['event']}\ndata: {dumps(event['data'])}\n\n"
+        except AdmissionRejected as e:
+            # The status line is already sent; report it like any other failed turn.
+            yield f"event: done\ndata: {dumps({'type': 'error_response', 'content': e.message, 'retry_after': e.retry_after})}\n\n"
+        finally:
+            leave()
+
+    headers = {
+        "X-Session-ID": session_id,
+        "Access-Control-Expose-Headers": "X-Session-ID",
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no", # Stop reverse proxies from buffering the stream
+    }
+    try:
+        return AdmittedStreamingResponse(event_source(), leave, media_type="text/event-stream", headers=headers)
+    except Exception:
+        leave()
+        raise
+
+class ExportRequest(BaseModel):
+    filters: List[dict] = [] # Same filter objects the run_dynamic_query tool accepts
+    columns_to_select: Optional[List[str]] = None
+    format: str = "ndjson" # "ndjson" or "csv"
+    max_rows: Optional[int] = None
+
+@app.post("/export")
+async def export_endpoint(
+    request: ExportRequest,
+    x_session_id: Optional[str] = Header(None, alias="X-Session-ID"),
+    x_user_id: Optional[str] = Header("default-user", alias="X-User-ID")
+):
+    """
+    Streams a lead list as NDJSON or CSV. Filters and columns go through the same
+    allowlist validation as the agent's search tool. At most EXPORT_MAX_CONCURRENCY
+    exports stream at once; beyond that (and a short queue) the answer is a 503.
+    """
+    if request.format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported export format '{request.format}'.")
+
+    session_id = x_session_id or str(uuid.uuid4())
+    query, params, columns = build_export_query(request.filters, request.columns_to_select, request.max_rows)
+    # Taken before the response starts so an over-capacity export still gets a 503,
+    # and before the audit row so rejected exports are not logged as having happened.
+    leave = await admission.hold("export")
+    try:
+        await log_significant_action(user_id=x_user_id, session_id=session_id, action_type="export", user_query=json.dumps(request.model_dump()), generated_sql=query)
+    except BaseException:
+        leave()
+        raise
+
+    headers = {
+        "X-Session-ID": session_id,
+        "Content-Disposition": f'attachment; filename="leads.{request.format}"',
+    }
+    return AdmittedStreamingResponse(stream_export(query, params, columns, request.format), leave, media_type=EXPORT_FORMATS[request.format], headers=headers)
+
+class BatchJob(BaseModel):
+    message: str
+    id: Optional[str] = None
+    user_id: Optional[str] = None # Defaults to the caller's X-User-ID
+
+class BatchRequest(BaseModel):
+    jobs: List[BatchJob]
+    concurrency: Optional[int] = None # Capped at BATCH_MAX_CONCURRENCY
+
+@app.post("/batch")
+async def batch_endpoint(
+    request: BatchRequest,
+    http_request: Request,
+    x_user_id: Optional[str] = Header(None, alias="X-User-ID")
+):
+    """
+    Runs many lead requests through the agent concurrently and streams one NDJSON
+    result per job as it finishes (in completion order, keyed by "job_id"). To resume
+    an interrupted batch, resubmit only the jobs whose ids are missing from the output.
+    The batch is admitted like a single turn; its jobs share the LLM and DB stage limits.
+    """
+    rate_limit_key, x_user_id = _rate_limit_key(http_request, x_user_id), x_user_id or "default-user"
+    runner = BatchRunner(concurrency=request.concurrency)
+    records = [
+        (position, {**job.model_dump(exclude_none=True), "user_id": job.user_id or x_user_id}, None)
+        for position, job in enumerate(request.jobs, start=1)
+    ]
+    leave = await admission.enter(rate_limit_key)
+
+    async def results():
+        try:
+            async for result in runner.run(records):
+                yield dumps(result) + "\n"
+        finally:
+            leave()
+            logger.info(f"Batch {runner.batch_id} finished: {runner.summary()}")
+
+    return AdmittedStreamingResponse(results(), leave, media_type=EXPORT_FORMATS["ndjson"], headers={"X-Batch-ID": runner.batch_id})
+
+# Component counters, read from their stats() at scrape time.
+registry.stats_gauge("db_pool", "Database connection pool counters.", db_connector.pool_stats)
+registry.stats_gauge("activity_log_writer", "Write-behind activity log counters.", activity_log_writer.stats)
+registry.stats_gauge("session_store", "Session store fallback counters.", session_store.stats)
+registry.stats_gauge("logging", "Log records dropped, sampled out, rate limited or queued.", logging_stats)
+registry.stats_gauge("decision_cache", "LLM tool-call decision cache counters.", lambda: decision_cache.stats(top=0))
+registry.stats_gauge("admission", "Admission control: active, queued and rejected per stage, and per-user rate limiting.", admission.stats)
+if search_result_cache is not None:
+    registry.stats_gauge("search_cache", "Search result cache counters.", search_result_cache.stats)
+registry.stats_gauge("live_count_cache", "Cached live match counts and facets.", live_count_cache.stats)
+if facet_index is not None:
+    registry.stats_gauge("facet_index", "Facet index documents, refreshes and summaries.", facet_index.snapshot_stats)
+if search_single_flight is not None:
+    registry.stats_gauge("search_single_flight", "Search coalescing counters.", search_single_flight.stats)
+
+@app.get("/health/live")
+async def liveness_endpoint():
+    """Liveness: the process is up and serving requests."""
+    return services.liveness()
+
+@app.get("/health/ready")
+async def readiness_endpoint():
+    """Readiness: every required dependency answers. Returns 503 with per-dependency state otherwise."""
+    ready, report = await services.readiness()
+    return FastJSONResponse({"status": "ready" if ready else "not_ready", "dependencies": report}, status_code=200 if ready else 503)
+
+@app.get("/metrics")
+def metrics_endpoint():
+    """Prometheus scrape endpoint: stage latencies, search query histograms, token counts and component counters."""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/")
 def read_root():
     return {"status": "Leadnova Assistant API is running"}
\ No newline at end of file
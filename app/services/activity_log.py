@@ -0,0 +1,123 @@
+# app/services/activity_log.py
+
+import time
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Queued after the last real row to tell the flusher to finish up.
+_STOP = object()
+
+
+class ActivityLogWriter:
+    """
+    Write-behind writer for audit rows. Callers enqueue a parameter tuple and return
+    immediately; a background task drains the queue and inserts rows with one
+    `executemany` per batch, flushing when `batch_size` rows are waiting or
+    `flush_interval` seconds have passed since the first row of the batch.
+
+    When the queue is full, `enqueue` waits up to `enqueue_timeout` seconds for space
+    (backpressure) and then drops the row, counting it in the stats.
+    """
+    def __init__(
+        self,
+        connector,
+        insert_sql: str,
+        max_queue: int = 10000,
+        batch_size: int = 100,
+        flush_interval: float = 1.0,
+        enqueue_timeout: float = 0.05,
+    ):
+        self.connector = connector
+        self.insert_sql = insert_sql
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+
+        self._queue = None
+        self._task = None
+        self._closing = False
+        self._stats = {"enqueued": 0, "flushed": 0, "dropped": 0, "failed": 0, "batches": 0}
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self):
+        """Starts the background flusher on the running event loop."""
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._closing = False
+        self._task = asyncio.create_task(self._run(), name="activity-log-writer")
+        logger.info(f"Activity log writer started (batch_size={self.batch_size}, flush_interval={self.flush_interval}s).")
+
+    async def stop(self):
+        """Stops the flusher after writing every row that is still queued."""
+        if not self.running:
+            return
+        self._closing = True
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None
+        logger.info(f"Activity log writer stopped. Stats: {self.stats()}")
+
+    async def enqueue(self, row: tuple) -> bool:
+        """Queues a row for insertion. Returns False if it had to be dropped."""
+        if self._closing:
+            self._stats["dropped"] += 1
+            return False
+        try:
+            self._queue.put_nowait(row)
+        except asyncio.QueueFull:
+            try:
+                await asyncio.wait_for(self._queue.put(row), timeout=self.enqueue_timeout)
+            except asyncio.TimeoutError:
+                self._stats["dropped"] += 1
+                logger.warning("Activity log queue is full; dropping audit row.")
+                return False
+        self._stats["enqueued"] += 1
+        return True
+
+    def stats(self) -> dict:
+        snapshot = dict(self._stats)
+        snapshot["queued"] = self._queue.qsize() if self._queue is not None else 0
+        return snapshot
+
+    async def _run(self):
+        while True:
+            row = await self._queue.get()
+            if row is _STOP:
+                return
+            batch, stopping = [row], False
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    row = await asyncio.wait_for(self._queue.get(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    break
+                if row is _STOP:
+                    stopping = True
+                    break
+                batch.append(row)
+            try:
+                await self._flush(batch)
+            except Exception as e:
+                self._stats["failed"] += len(batch)
+                logger.error(f"Unexpected error while flushing activity log rows: {e}", exc_info=True)
+            if stopping:
+                return
+
+    async def _flush(self, batch: list):
+        result = await self.connector.execute_many_async(self.insert_sql, batch)
+        self._stats["batches"] += 1
+        if isinstance(result, dict) and "error" in result:
+            self._stats["failed"] += len(batch)
+            logger.error(f"Failed to flush {len(batch)} activity log rows: {result['error']}")
+        else:
+            self._stats["flushed"] += len(batch)
@@ -0,0 +1,211 @@
+# app/services/admission.py
+
+import os
+import math
+import time
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from app.services.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+REJECTIONS = registry.counter("admission_rejections_total", "Requests rejected by admission control.", ("stage", "reason"))
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is over capacity. Maps to an HTTP status with a Retry-After header."""
+    def __init__(self, status_code: int, retry_after: float, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = max(1, math.ceil(retry_after))
+        self.message = message
+
+
+class StageLimiter:
+    """
+    Caps how many callers run a stage at once. Up to `max_queue` further callers wait
+    in FIFO order for at most `max_wait` seconds; beyond that they are rejected
+    immediately (503) rather than piling up. `limit=0` disables the cap.
+    """
+    def __init__(self, name: str, limit: int, max_queue: int = 100, max_wait: float = 5, retry_after: float = 2):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.retry_after = retry_after
+        self._active = 0
+        self._waiters = deque()
+        self._stats = {"admitted": 0, "queued": 0, "rejected_queue_full": 0, "rejected_timeout": 0}
+
+    def _reject(self, reason: str, message: str):
+        self._stats[f"rejected_{reason}"] += 1
+        REJECTIONS.inc(stage=self.name, reason=reason)
+        raise AdmissionRejected(503, self.retry_after, message)
+
+    async def acquire(self):
+        if self.limit <= 0:
+            return
+        if self._active < self.limit and not self._waiters:
+            self._active += 1
+            self._stats["admitted"] += 1
+            return
+        if len(self._waiters) >= self.max_queue:
+            self._reject("queue_full", f"The service is busy ({self.name} queue is full). Please retry shortly.")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._stats["queued"] += 1
+        try:
+            await asyncio.wait_for(waiter, self.max_wait)
+        except asyncio.TimeoutError:
+            self._reject("timeout", f"The service is busy (waited {self.max_wait}s for {self.name} capacity). Please retry shortly.")
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()  # The slot was handed over just as the caller went away
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+        self._stats["admitted"] += 1
+
+    def release(self):
+        if self.limit <= 0:
+            return
+        # Hand the slot straight to the next live waiter, so a new arrival can't jump the queue.
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self._active -= 1
+
+    @asynccontextmanager
+    async def slot(self):
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> dict:
+        snapshot = dict(self._stats)
+        snapshot.update(limit=self.limit, active=self._active, waiting=len(self._waiters))
+        return snapshot
+
+
+class UserRateLimiter:
+    """
+    Per-user token buckets: `rate_per_minute` sustained with bursts of up to `burst`.
+    Buckets for the least recently seen users are evicted beyond `max_users`.
+    `rate_per_minute=0` disables the limit.
+    """
+    def __init__(self, rate_per_minute: float, burst: int, max_users: int = 100000):
+        self.rate = rate_per_minute / 60
+        self.burst = max(1, burst)
+        self.max_users = max_users
+        self._buckets = OrderedDict()  # user -> (tokens, updated_at)
+        self._stats = {"allowed": 0, "rate_limited": 0}
+
+    def check(self, user_id: str) -> float:
+        """Takes a token for `user_id`. Returns 0 if allowed, else the seconds until a token is available."""
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.pop(user_id, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated_at) * self.rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+            self._stats["allowed"] += 1
+        else:
+            wait = (1 - tokens) / self.rate
+            self._stats["rate_limited"] += 1
+        self._buckets[user_id] = (tokens, now)
+        while len(self._buckets) > self.max_users:
+            self._buckets.popitem(last=False)
+        return wait
+
+    def stats(self) -> dict:
+        snapshot = dict(self._stats)
+        snapshot["users"] = len(self._buckets)
+        return snapshot
+
+
+class AdmissionController:
+    """
+    Admission control for agent turns: a per-user rate limit and a cap on concurrent
+    turns at the door, plus separate caps on the LLM and DB stages inside a turn,
+    so a slow OpenAI doesn't starve searches of database capacity and vice versa.
+    Bulk exports, which hold a pooled connection for as long as they stream, have
+    their own "export" stage.
+    """
+    def __init__(self, stages: dict, user_limiter: UserRateLimiter):
+        self.stages = stages
+        self.user_limiter = user_limiter
+
+    async def enter(self, rate_limit_key: str):
+        """
+        Admits one turn for the caller identified by `rate_limit_key` (a user id or client
+        address) or raises AdmissionRejected (429 or 503). Returns the callable that ends
+        the turn; it is idempotent, so every exit path of a streamed response may call it.
+        """
+        wait = self.user_limiter.check(rate_limit_key or "anonymous")
+        if wait > 0:
+            REJECTIONS.inc(stage="user", reason="rate_limited")
+            raise AdmissionRejected(429, wait, "Too many requests. Please slow down and retry shortly.")
+        return await self.hold("turn")
+
+    async def hold(self, name: str):
+        """
+        Takes one slot of a stage for longer than a `with` block, e.g. a streamed
+        response. Returns the idempotent callable that gives it back.
+        """
+        limiter = self.stages[name]
+        await limiter.acquire()
+        released = False
+
+        def leave():
+            nonlocal released
+            if not released:
+                released = True
+                limiter.release()
+        return leave
+
+    @asynccontextmanager
+    async def admit(self, rate_limit_key: str):
+        leave = await self.enter(rate_limit_key)
+        try:
+            yield
+        finally:
+            leave()
+
+    def stage(self, name: str):
+        """Context manager holding one slot of the "llm" or "db" stage."""
+        return self.stages[name].slot()
+
+    def stats(self) -> dict:
+        snapshot = {f"user_{key}": value for key, value in self.user_limiter.stats().items()}
+        for name, limiter in self.stages.items():
+            snapshot.update({f"{name}_{key}": value for key, value in limiter.stats().items()})
+        return snapshot
+
+
+# Shared controller. A limit of 0 disables that cap; the DB stage defaults to the pool size.
+# Exports stream for as long as the client reads, so they get a small slice of the pool of their own.
+_queue_size = int(os.getenv("ADMISSION_QUEUE_SIZE", 100))
+_queue_timeout = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_SECONDS", 5))
+_retry_after = float(os.getenv("ADMISSION_RETRY_AFTER_SECONDS", 2))
+admission = AdmissionController(
+    stages={
+        "turn": StageLimiter("turn", int(os.getenv("ADMISSION_MAX_TURNS", 200)), _queue_size, _queue_timeout, _retry_after),
+        "llm": StageLimiter("llm", int(os.getenv("ADMISSION_LLM_CONCURRENCY", 32)), _queue_size, _queue_timeout, _retry_after),
+        "db": StageLimiter("db", int(os.getenv("ADMISSION_DB_CONCURRENCY", os.getenv("DB_POOL_SIZE", 10))), _queue_size, _queue_timeout, _retry_after),
+        "export": StageLimiter("export", int(os.getenv("EXPORT_MAX_CONCURRENCY", 2)), _queue_size, _queue_timeout, _retry_after),
+    },
+    user_limiter=UserRateLimiter(
+        rate_per_minute=float(os.getenv("USER_RATE_LIMIT_PER_MINUTE", 60)),
+        burst=int(os.getenv("USER_RATE_LIMIT_BURST", 10)),
+    ),
+)
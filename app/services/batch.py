@@ -0,0 +1,244 @@
+# app/services/batch.py
+
+import os
+import csv
+import json
+import time
+import uuid
+import asyncio
+import logging
+from app.agent.core import run_agent_interaction, search_memo
+from app.services.admission import AdmissionRejected
+from app.services.cache import TTLCache
+from app.services.serialization import dumps_bytes
+
+logger = logging.getLogger(__name__)
+
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", 8))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", 32))
+BATCH_MAX_RETRIES = int(os.getenv("BATCH_MAX_RETRIES", 3))
+BATCH_SEARCH_MEMO_MAX_ENTRIES = int(os.getenv("BATCH_SEARCH_MEMO_MAX_ENTRIES", 10000))
+
+
+def normalize_job(raw, position: int) -> dict:
+    """
+    A job from one input record: {"id", "user_id", "message", "session_id"}. Accepts
+    "user" for "user_id". Without an "id" the 1-based position in the input is used,
+    which stays stable across resumed runs of the same file.
+    """
+    if not isinstance(raw, dict):
+        raise ValueError("a job must be an object with a 'message'")
+    message = raw.get("message")
+    if not isinstance(message, str) or not message.strip():
+        raise ValueError("a job needs a non-empty 'message'")
+    return {
+        "id": str(raw.get("id") or position),
+        "user_id": str(raw.get("user_id") or raw.get("user") or "batch"),
+        "message": message,
+        "session_id": raw.get("session_id"),
+    }
+
+
+def read_jobs(path: str):
+    """
+    Yields (position, raw job or None, error or None) from an NDJSON file (one object
+    per line) or, for a .csv path, a CSV file with a header row naming user_id/user,
+    message and optionally id. Blank lines are skipped but still count as positions.
+    """
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.lower().endswith(".csv"):
+            for position, row in enumerate(csv.DictReader(f), start=1):
+                yield position, row, None
+            return
+        for position, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield position, json.loads(line), None
+            except json.JSONDecodeError as e:
+                yield position, None, f"invalid JSON: {e}"
+
+
+def completed_job_ids(output_path: str, include_failed: bool = True) -> set:
+    """
+    Job ids already written to an NDJSON results file; the results file is the
+    checkpoint. With `include_failed=False` failed jobs are left out so they run again
+    (their new record is appended; the last record for a job id wins). A torn last
+    line (the process died mid-write) is cut off so the resumed run appends cleanly.
+    """
+    if not os.path.exists(output_path):
+        return set()
+    done, valid_bytes = set(), 0
+    with open(output_path, "rb") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+                if include_failed or record.get("status") == "ok":
+                    done.add(str(record["job_id"]))
+            except (ValueError, KeyError, TypeError, AttributeError):
+                break
+            valid_bytes += len(line)
+    if valid_bytes < os.path.getsize(output_path):
+        logger.warning(f"Truncating a partial record at the end of {output_path}.")
+        with open(output_path, "r+b") as f:
+            f.truncate(valid_bytes)
+    return done
+
+
+class NdjsonWriter:
+    """Appends one JSON object per line, flushed per record and fsynced every `sync_every` records."""
+    def __init__(self, path: str, sync_every: int = 50):
+        self._file = open(path, "ab")
+        self.sync_every = sync_every
+        self._unsynced = 0
+
+    def write(self, record: dict):
+        self._file.write(dumps_bytes(record) + b"\n")
+        self._file.flush()
+        self._unsynced += 1
+        if self._unsynced >= self.sync_every:
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+
+    def close(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+
+
+class BatchRunner:
+    """
+    Runs (user, message) jobs through `run_agent_interaction` with at most
+    `concurrency` in flight, yielding one result record per job as it finishes.
+
+    Jobs share the app's connection pool, LLM client and caches. On top of those,
+    a user's repeated messages (compared case- and whitespace-insensitively) run once
+    and the duplicates reuse the first job's response, and identical generated
+    searches across the batch's jobs run once through a batch-scoped memo. Jobs that
+    continue a session are never deduplicated, since their answer depends on the
+    conversation so far. A job rejected by admission control is retried after its
+    Retry-After, up to `max_retries` times; any other failure is recorded in its
+    result and the batch carries on.
+    """
+    def __init__(self, concurrency: int = None, max_retries: int = None, dedupe_messages: bool = True, interact=None):
+        self.concurrency = max(1, min(concurrency or BATCH_CONCURRENCY, BATCH_MAX_CONCURRENCY))
+        self.max_retries = BATCH_MAX_RETRIES if max_retries is None else max_retries
+        self.dedupe_messages = dedupe_messages
+        self.interact = interact or run_agent_interaction
+        self.batch_id = uuid.uuid4().hex[:12]
+        self.search_memo = TTLCache(max_entries=BATCH_SEARCH_MEMO_MAX_ENTRIES, ttl=86400)
+        self._responses = {}  # (user id, normalized message) -> task producing (job id, response)
+        self.stats = {"jobs": 0, "succeeded": 0, "failed": 0, "skipped": 0, "deduplicated": 0, "retries": 0}
+
+    async def run(self, records, done_ids: set = frozenset()):
+        """
+        `records` is an iterable of (position, raw job or None, error or None), as from
+        `read_jobs`. Jobs whose id is in `done_ids` are skipped. Yields result records:
+        {"job_id", "user_id", "message", "status", "response", "error", "elapsed_ms", "deduplicated_from"}.
+        """
+        jobs = asyncio.Queue(maxsize=self.concurrency * 2)
+        results = asyncio.Queue()
+        feeder = asyncio.create_task(self._feed(records, done_ids, jobs, results))
+        workers = [asyncio.create_task(self._work(jobs, results)) for _ in range(self.concurrency)]
+        try:
+            running = len(workers) + 1
+            while running:
+                result = await results.get()
+                if result is None:
+                    running -= 1
+                else:
+                    yield result
+            await feeder  # Surfaces an error reading the input
+        finally:
+            for task in [feeder] + workers:
+                task.cancel()
+            await asyncio.gather(feeder, *workers, return_exceptions=True)
+
+    async def _feed(self, records, done_ids: set, jobs: asyncio.Queue, results: asyncio.Queue):
+        try:
+            for position, raw, error in records:
+                self.stats["jobs"] += 1
+                job = None
+                if error is None:
+                    try:
+                        job = normalize_job(raw, position)
+                    except ValueError as e:
+                        error = str(e)
+                if job is None:
+                    job_id = str(raw.get("id") or position) if isinstance(raw, dict) else str(position)
+                    if job_id in done_ids:
+                        self.stats["skipped"] += 1
+                        continue
+                    self.stats["failed"] += 1
+                    await results.put(self._record({"id": job_id, "user_id": None, "message": None}, None, error, 0.0))
+                elif job["id"] in done_ids:
+                    self.stats["skipped"] += 1
+                else:
+                    await jobs.put(job)
+        finally:
+            for _ in range(self.concurrency):
+                await jobs.put(None)
+            await results.put(None)
+
+    async def _work(self, jobs: asyncio.Queue, results: asyncio.Queue):
+        # Set in the worker's own context; every task it starts inherits the memo.
+        search_memo.set(self.search_memo)
+        try:
+            while True:
+                job = await jobs.get()
+                if job is None:
+                    return
+                await results.put(await self._run_job(job))
+        finally:
+            await results.put(None)
+
+    async def _run_job(self, job: dict) -> dict:
+        started = time.perf_counter()
+        key = (job["user_id"], " ".join(job["message"].split()).lower())
+        dedupe = self.dedupe_messages and not job["session_id"]
+        deduplicated_from = None
+        try:
+            task = self._responses.get(key) if dedupe else None
+            if task is None:
+                task = asyncio.create_task(self._interact(job))
+                if dedupe:
+                    self._responses[key] = task
+            first_id, response = await asyncio.shield(task)
+            if first_id != job["id"]:
+                deduplicated_from = first_id
+                self.stats["deduplicated"] += 1
+            error = response.get("content") if response.get("type") == "error_response" else None
+        except Exception as e:
+            logger.error(f"Batch job {job['id']} failed: {e}", exc_info=not isinstance(e, AdmissionRejected))
+            response, error = None, str(e)
+        self.stats["failed" if error else "succeeded"] += 1
+        return self._record(job, response, error, time.perf_counter() - started, deduplicated_from)
+
+    async def _interact(self, job: dict):
+        """(job id, response) for the first job with this message."""
+        session_id = job["session_id"] or f"batch-{self.batch_id}-{job['id']}"
+        for attempt in range(self.max_retries + 1):
+            try:
+                return job["id"], await self.interact(job["message"], session_id, job["user_id"])
+            except AdmissionRejected as e:
+                if attempt >= self.max_retries:
+                    raise
+                self.stats["retries"] += 1
+                await asyncio.sleep(e.retry_after)
+
+    def _record(self, job: dict, response, error, elapsed: float, deduplicated_from: str = None) -> dict:
+        return {
+            "job_id": job["id"],
+            "user_id": job["user_id"],
+            "message": job["message"],
+            "status": "error" if error else "ok",
+            "response": response,
+            "error": error,
+            "elapsed_ms": round(elapsed * 1000, 1),
+            "deduplicated_from": deduplicated_from,
+        }
+
+    def summary(self) -> dict:
+        snapshot = dict(self.stats)
+        snapshot["search_memo"] = self.search_memo.stats()
+        return snapshot
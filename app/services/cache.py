@@ -0,0 +1,153 @@
+# app/services/cache.py
+
+import os
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+import redis.asyncio as aioredis
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """
+    A size-bounded, thread-safe LRU cache whose entries expire after a TTL.
+    """
+    def __init__(self, max_entries: int = 1024, ttl: float = 300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return default
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self._stats["expirations"] += 1
+                self._stats["misses"] += 1
+                return default
+            self._data.move_to_end(key)
+            self._stats["hits"] += 1
+            return value
+
+    def set(self, key, value, ttl: float = None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def items(self) -> list:
+        """Snapshot of unexpired (key, value) pairs, without touching LRU order or stats."""
+        now = time.monotonic()
+        with self._lock:
+            return [(key, value) for key, (expires_at, value) in self._data.items() if expires_at >= now]
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot["entries"] = len(self._data)
+        return snapshot
+
+
+class QueryResultCache:
+    """
+    Two-tier cache for search results: an in-process TTL/LRU tier in front of an
+    optional Redis tier shared by every worker. Redis failures are logged and
+    counted but never fail the query; the cache simply behaves as a miss.
+    """
+    def __init__(self, max_entries: int = 1024, ttl: float = 300, redis_url: str = None, namespace: str = "search_cache"):
+        self.ttl = ttl
+        self.namespace = namespace
+        self.local = TTLCache(max_entries=max_entries, ttl=ttl)
+        self.shared = aioredis.from_url(redis_url, decode_responses=True) if redis_url else None
+        self._stats = {"local_hits": 0, "shared_hits": 0, "misses": 0, "stores": 0, "invalidations": 0, "shared_errors": 0}
+
+    def _shared_key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    async def get(self, key: str):
+        value = self.local.get(key)
+        if value is not None:
+            self._stats["local_hits"] += 1
+            return value
+
+        if self.shared is not None:
+            try:
+                raw = await self.shared.get(self._shared_key(key))
+            except Exception as e:
+                self._stats["shared_errors"] += 1
+                logger.warning(f"Shared search cache read failed: {e}")
+                raw = None
+            if raw is not None:
+                value = json.loads(raw)
+                self.local.set(key, value)
+                self._stats["shared_hits"] += 1
+                return value
+
+        self._stats["misses"] += 1
+        return None
+
+    async def set(self, key: str, value):
+        self.local.set(key, value)
+        self._stats["stores"] += 1
+        if self.shared is not None:
+            try:
+                await self.shared.set(self._shared_key(key), json.dumps(value, default=str), ex=int(self.ttl))
+            except Exception as e:
+                self._stats["shared_errors"] += 1
+                logger.warning(f"Shared search cache write failed: {e}")
+
+    async def invalidate(self):
+        """
+        Drops every cached result. Call this after ProfileData is reloaded.
+        The shared tier is cleared for all workers; other workers' local tiers
+        age out within one TTL.
+        """
+        self.local.clear()
+        self._stats["invalidations"] += 1
+        if self.shared is not None:
+            try:
+                async for shared_key in self.shared.scan_iter(match=f"{self.namespace}:*", count=500):
+                    await self.shared.delete(shared_key)
+            except Exception as e:
+                self._stats["shared_errors"] += 1
+                logger.warning(f"Shared search cache invalidation failed: {e}")
+        logger.info("Search result cache invalidated.")
+
+    def stats(self) -> dict:
+        snapshot = dict(self._stats)
+        snapshot["local"] = self.local.stats()
+        return snapshot
+
+
+# Shared instance used by the search tool. SEARCH_CACHE_ENABLED=0 disables it entirely.
+search_result_cache = None
+if os.getenv("SEARCH_CACHE_ENABLED", "1") == "1":
+    search_result_cache = QueryResultCache(
+        max_entries=int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", 1024)),
+        ttl=float(os.getenv("SEARCH_CACHE_TTL_SECONDS", 300)),
+        redis_url=os.getenv("SEARCH_CACHE_REDIS_URL") or None,
+    )
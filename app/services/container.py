@@ -0,0 +1,121 @@
+# app/services/container.py
+
+import time
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class _Dependency:
+    def __init__(self, name: str, check, warmup=None, close=None, required: bool = True, background: bool = False):
+        self.name = name
+        self.check = check
+        self.warmup = warmup
+        self.close = close
+        self.required = required
+        self.background = background
+        self.state = {"status": "pending", "required": required}
+
+
+class ServiceContainer:
+    """
+    Starts, probes and stops the app's external dependencies.
+
+    Nothing is connected at import time. `start()` runs every dependency's warmup
+    concurrently, each bounded by `warmup_timeout`; a slow or failing dependency is
+    recorded as failed instead of blocking startup, and the readiness probe keeps
+    re-checking it. Background dependencies (optional ones that are slow to warm,
+    like importing a client library) warm up after startup returns and report
+    "warming" until done. `stop()` closes dependencies in reverse registration order.
+
+    `check`, `warmup` and `close` are zero-argument async callables; `check` raises
+    (or returns False) when the dependency is unusable.
+    """
+    def __init__(self, warmup_timeout: float = 10, check_timeout: float = 2):
+        self.warmup_timeout = warmup_timeout
+        self.check_timeout = check_timeout
+        self._dependencies = []
+        self._background_tasks = []
+        self.started_at = None
+        self.ready_after = None
+
+    def register(self, name: str, check, warmup=None, close=None, required: bool = True, background: bool = False):
+        if background and required:
+            raise ValueError("A required dependency cannot warm up in the background.")
+        self._dependencies.append(_Dependency(name, check, warmup, close, required, background))
+
+    async def _warm(self, dependency: _Dependency):
+        started = time.perf_counter()
+        try:
+            if dependency.warmup is not None:
+                await asyncio.wait_for(dependency.warmup(), self.warmup_timeout)
+            dependency.state.update(status="ready", error=None)
+        except asyncio.TimeoutError:
+            dependency.state.update(status="failed", error=f"warmup timed out after {self.warmup_timeout}s")
+        except Exception as e:
+            dependency.state.update(status="failed", error=str(e))
+        dependency.state["warmup_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        if dependency.state["status"] == "failed":
+            log = logger.error if dependency.required else logger.warning
+            log(f"Dependency '{dependency.name}' failed to start: {dependency.state['error']}")
+
+    async def start(self):
+        """Warms up every dependency in parallel. Never raises."""
+        started = time.perf_counter()
+        self.started_at = time.monotonic()
+        for dependency in self._dependencies:
+            if dependency.background:
+                dependency.state["status"] = "warming"
+                self._background_tasks.append(asyncio.create_task(self._warm(dependency)))
+        await asyncio.gather(*(self._warm(d) for d in self._dependencies if not d.background))
+        self.ready_after = time.perf_counter() - started
+        summary = ", ".join(f"{d.name}={d.state['status']} ({d.state.get('warmup_ms', '-')} ms)" for d in self._dependencies)
+        logger.info(f"Services started in {self.ready_after * 1000:.0f} ms: {summary}")
+
+    async def _probe(self, dependency: _Dependency) -> dict:
+        if dependency.state["status"] == "warming":
+            return {"status": "warming", "error": None, "required": dependency.required, "latency_ms": 0.0, "warmup": "warming"}
+        started = time.perf_counter()
+        try:
+            ok = await asyncio.wait_for(dependency.check(), self.check_timeout)
+            result = {"status": "up" if ok is not False else "down", "error": None}
+        except asyncio.TimeoutError:
+            result = {"status": "down", "error": f"check timed out after {self.check_timeout}s"}
+        except Exception as e:
+            result = {"status": "down", "error": str(e)}
+        result["required"] = dependency.required
+        result["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        result["warmup"] = dependency.state.get("status")
+        return result
+
+    async def readiness(self):
+        """Probes every dependency concurrently. Returns (ready, {name: report})."""
+        results = await asyncio.gather(*(self._probe(dependency) for dependency in self._dependencies))
+        report = {dependency.name: result for dependency, result in zip(self._dependencies, results)}
+        ready = self.started_at is not None and all(r["status"] == "up" for r in report.values() if r["required"])
+        return ready, report
+
+    def liveness(self) -> dict:
+        return {
+            "status": "alive",
+            "started": self.started_at is not None,
+            "uptime_seconds": round(time.monotonic() - self.started_at, 1) if self.started_at is not None else 0.0,
+            "startup_ms": round(self.ready_after * 1000, 1) if self.ready_after is not None else None,
+        }
+
+    async def stop(self):
+        """Closes dependencies in reverse order; a failing close doesn't stop the others."""
+        for task in self._background_tasks:
+            task.cancel()
+        await asyncio.gather(*self._background_tasks, return_exceptions=True)
+        self._background_tasks = []
+        for dependency in reversed(self._dependencies):
+            if dependency.close is None:
+                continue
+            try:
+                await dependency.close()
+            except Exception as e:
+                logger.error(f"Error while closing '{dependency.name}': {e}")
+            dependency.state["status"] = "stopped"
+        self.started_at = None
@@ -1,9 +1,21 @@
 # app/services/database.py
 
 import os
-import pyodbc
+import asyncio
 import logging
+import importlib
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from app.services.db_pool import ConnectionPool
+
+try:
+    import pyodbc
+except ImportError: # Only needed for SQL Server; a DB_CONNECT_FACTORY stand-in works without it
+    pyodbc = None
+
+# Driver errors get a SQLSTATE-specific log line; anything else is reported as unexpected.
+DRIVER_ERRORS = (pyodbc.Error,) if pyodbc is not None else ()
 
 # Initialize logging
 logger = logging.getLogger(__name__)
@@ -16,10 +28,13 @@ load_dotenv()
 class DatabaseConnector:
     """
     Handles connections to the SQL Server database using trusted connections.
+    Connections are borrowed from a bounded pool instead of being opened per query.
     """
-    def __init__(self):
+    def __init__(self, connect=None):
         """
         Initializes the connector with settings from environment variables.
+        `connect` optionally replaces the pyodbc connection factory (e.g. with
+        `sqlite3.connect` or a fake driver) so the connector can run without SQL Server.
         """
         self.server = os.getenv("DB_SERVER")
         self.database = os.getenv("DB_NAME")
@@ -28,7 +43,33 @@ class DatabaseConnector:
         self.connection_string = self._build_connection_string()
         logger.info(f"DatabaseConnector initialized for server '{self.server}' and database '{self.database}'.")
 
-        self._check_driver()
+        # Nothing connects here: the driver is checked and connections opened by warmup()
+        # during app startup, or on first use.
+        self._uses_pyodbc = connect is None
+        if connect is None:
+            connect = self._connect_pyodbc
+        self._connect = connect
+
+        pool_size = int(os.getenv("DB_POOL_SIZE", 10))
+        self.pool = ConnectionPool(
+            connect,
+            size=pool_size,
+            max_age=float(os.getenv("DB_POOL_MAX_AGE_SECONDS", 1800)),
+            max_idle=float(os.getenv("DB_POOL_MAX_IDLE_SECONDS", 300)),
+            checkout_timeout=float(os.getenv("DB_POOL_TIMEOUT_SECONDS", 30)),
+            health_check_after=float(os.getenv("DB_POOL_HEALTH_CHECK_AFTER_SECONDS", 30)),
+        )
+        # Dedicated threads for running blocking driver calls off the event loop.
+        # Sized to the pool so a thread never sits waiting for a connection.
+        self._executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("DB_EXECUTOR_THREADS", pool_size)),
+            thread_name_prefix="db-query",
+        )
+        # Readiness probes get their own thread and connection, so a database that stops
+        # answering cannot tie up query threads or pool slots while probes keep arriving.
+        self.ping_timeout = float(os.getenv("READINESS_CHECK_TIMEOUT_SECONDS", 2))
+        self._ping_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-ping")
+        self._ping_future = None
 
     def _build_connection_string(self):
         """Builds the connection string from environment variables."""
@@ -40,6 +81,12 @@ class DatabaseConnector:
             f"TrustServerCertificate=yes;"
         )
 
+    def _connect_pyodbc(self):
+        if pyodbc is None:
+            raise EnvironmentError("pyodbc is not installed; install it or set DB_CONNECT_FACTORY.")
+        # autocommit=True ensures that INSERT/UPDATE statements are saved immediately.
+        return pyodbc.connect(self.connection_string, autocommit=True, timeout=30)
+
     def _check_driver(self):
         """Checks if the required ODBC driver is available on the system."""
         available_drivers = pyodbc.drivers()
@@ -48,10 +95,154 @@ class DatabaseConnector:
             logger.error(f"Available drivers: {available_drivers}")
             raise EnvironmentError(f"Required ODBC Driver '{self.driver}' not found.")
 
-    def execute_query(self, query: str, params: tuple = None):
+    async def warmup(self, connections: int = None):
+        """
+        Checks the ODBC driver and opens `connections` pooled connections in parallel
+        (DB_POOL_WARMUP_CONNECTIONS by default). Raises if the database is unreachable.
+        """
+        connections = int(os.getenv("DB_POOL_WARMUP_CONNECTIONS", 2)) if connections is None else connections
+        loop = asyncio.get_running_loop()
+        if self._uses_pyodbc:
+            if pyodbc is None:
+                raise EnvironmentError("pyodbc is not installed; install it or set DB_CONNECT_FACTORY.")
+            await loop.run_in_executor(self._executor, self._check_driver)
+        await asyncio.gather(*(
+            loop.run_in_executor(self._executor, self.pool.prefill, connections) for _ in range(max(1, connections))
+        ))
+        logger.info(f"Database pool warmed up with {self.pool.stats()['open']} connections.")
+
+    def _connect_for_ping(self):
+        if not self._uses_pyodbc:
+            return self._connect()
+        if pyodbc is None:
+            raise EnvironmentError("pyodbc is not installed; install it or set DB_CONNECT_FACTORY.")
+        # pyodbc takes whole seconds; the default 30s login timeout would outlive many probes.
+        timeout = max(1, int(self.ping_timeout))
+        conn = pyodbc.connect(self.connection_string, autocommit=True, timeout=timeout)
+        conn.timeout = timeout # Query timeout
+        return conn
+
+    def ping(self):
+        """Runs the pool's health-check query on a fresh, unpooled connection; raises on failure."""
+        conn = self._connect_for_ping()
+        try:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(self.pool.health_check_query)
+                cursor.fetchall()
+            finally:
+                cursor.close()
+        finally:
+            conn.close()
+        return True
+
+    async def ping_async(self):
+        """
+        Runs `ping` on the connector's ping thread. Probes that arrive while one is still
+        running wait for its result instead of queueing another connection attempt.
+        """
+        if self._ping_future is None or self._ping_future.done():
+            loop = asyncio.get_running_loop()
+            self._ping_future = loop.run_in_executor(self._ping_executor, self.ping)
+            # Callers that time out stop waiting; mark a late failure as retrieved.
+            self._ping_future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        return await asyncio.shield(self._ping_future)
+
+    def pool_stats(self) -> dict:
+        """Returns checkout, wait and creation counters for the connection pool."""
+        return self.pool.stats()
+
+    def close(self):
+        """Stops the query threads and closes all pooled connections."""
+        self._ping_executor.shutdown(wait=False) # A ping stuck connecting is not worth waiting for
+        self._executor.shutdown(wait=True)
+        self.pool.close()
+
+    async def execute_query_async(self, query: str, params: tuple = None, columnar: bool = False):
+        """
+        Awaitable version of `execute_query` for use on the async request path.
+        The query runs on the connector's dedicated thread pool so the event loop
+        keeps serving other requests while the database works.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(self.execute_query, query, params, columnar))
+
+    def execute_many(self, query: str, rows: list):
+        """
+        Executes one parameterized statement for many rows in a single round trip
+        (using pyodbc's fast_executemany when available). Returns the row count,
+        or an error dict like `execute_query`.
+        """
+        logger.info(f"Executing batched statement for {len(rows)} rows: {query}")
+        try:
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                try:
+                    if hasattr(cursor, "fast_executemany"):
+                        cursor.fast_executemany = True
+                    cursor.executemany(query, rows)
+                finally:
+                    cursor.close()
+            return len(rows)
+        except DRIVER_ERRORS as ex:
+            sqlstate = ex.args[0]
+            logger.error(f"Batched statement failed. SQLSTATE: {sqlstate}", exc_info=True)
+            return {"error": f"Database query failed. The server said: {ex}"}
+        except Exception as e:
+            logger.error(f"An unexpected error occurred during batched execution: {e}", exc_info=True)
+            return {"error": f"An unexpected system error occurred: {e}"}
+
+    async def execute_many_async(self, query: str, rows: list):
+        """Awaitable version of `execute_many`, run on the connector's query threads."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(self.execute_many, query, rows))
+
+    def iter_query(self, query: str, params: tuple = None, chunk_size: int = 1000):
         """
-        Connects, executes a query securely, and returns results.
-        This single method handles connection, execution, and closing.
+        Executes a SELECT and yields (columns, rows) chunks of at most `chunk_size`
+        raw rows via `cursor.fetchmany`, so large results never sit in memory at once.
+        The pooled connection is held until the generator is exhausted or closed.
+        """
+        logger.info(f"Streaming query in chunks of {chunk_size}: {query}")
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                if params:
+                    cursor.execute(query, params)
+                else:
+                    cursor.execute(query)
+                columns = [column[0] for column in cursor.description]
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    yield columns, rows
+            finally:
+                cursor.close()
+
+    async def iter_query_async(self, query: str, params: tuple = None, chunk_size: int = 1000):
+        """
+        Async version of `iter_query`. Each chunk is fetched on the connector's query
+        threads; the connection is returned to the pool even if the consumer stops early.
+        """
+        loop = asyncio.get_running_loop()
+        chunks = self.iter_query(query, params, chunk_size)
+        done = object()
+        try:
+            while True:
+                chunk = await loop.run_in_executor(self._executor, next, chunks, done)
+                if chunk is done:
+                    break
+                yield chunk
+        finally:
+            await loop.run_in_executor(self._executor, chunks.close)
+
+    def execute_query(self, query: str, params: tuple = None, columnar: bool = False):
+        """
+        Borrows a pooled connection, executes a query securely, and returns results.
+        By default results are a list of row dicts. With `columnar=True` a SELECT returns
+        {"columns": [...], "rows": [[...], ...]}, which avoids repeating every column
+        name per row and skips building a dict for each one.
         """
         # --- FIX #1: ENHANCED LOGGING ---
         # We now log both the query and the parameters for better debugging.
@@ -63,31 +254,37 @@ class DatabaseConnector:
 
         results = []
         try:
-            # --- FIX #2: ENABLE AUTOCOMMIT ---
-            # autocommit=True ensures that INSERT/UPDATE statements are saved immediately.
-            with pyodbc.connect(self.connection_string, autocommit=True, timeout=30) as conn:
-            # --- END FIX #2 ---
+            with self.pool.connection() as conn:
                 cursor = conn.cursor()
-                if params:
-                    cursor.execute(query, params)
-                else:
-                    cursor.execute(query)
+                try:
+                    if params:
+                        cursor.execute(query, params)
+                    else:
+                        cursor.execute(query)
 
-                # If the query is a SELECT statement, fetch results
-                if cursor.description:
-                    columns = [column[0] for column in cursor.description]
-                    for row in cursor.fetchall():
-                        results.append(dict(zip(columns, row)))
-                
-                # For INSERT/UPDATE/DELETE, rowcount will be > 0. For SELECT, it's often -1.
-                if cursor.rowcount != -1:
-                    logger.info(f"Query executed successfully, {cursor.rowcount} rows affected.")
-                else:
-                    logger.info(f"Query executed successfully, {len(results)} rows returned.")
+                    # If the query is a SELECT statement, fetch results
+                    columns = None
+                    if cursor.description:
+                        columns = [column[0] for column in cursor.description]
+                        if columnar:
+                            results = [list(row) for row in cursor.fetchall()]
+                        else:
+                            for row in cursor.fetchall():
+                                results.append(dict(zip(columns, row)))
+                    
+                    # For INSERT/UPDATE/DELETE, rowcount will be > 0. For SELECT, it's often -1.
+                    if cursor.rowcount != -1:
+                        logger.info(f"Query executed successfully, {cursor.rowcount} rows affected.")
+                    else:
+                        logger.info(f"Query executed successfully, {len(results)} rows returned.")
+                finally:
+                    cursor.close()
                 
+                if columnar and columns is not None:
+                    return {"columns": columns, "rows": results}
                 return results
 
-        except pyodbc.Error as ex:
+        except DRIVER_ERRORS as ex:
             sqlstate = ex.args[0]
             logger.error(f"Database query failed. SQLSTATE: {sqlstate}", exc_info=True)
             return {"error": f"Database query failed. The server said: {ex}"}
@@ -95,5 +292,19 @@ class DatabaseConnector:
             logger.error(f"An unexpected error occurred during query execution: {e}", exc_info=True)
             return {"error": f"An unexpected system error occurred: {e}"}
 
+def _connect_factory_from_env():
+    """
+    DB_CONNECT_FACTORY="package.module:function" runs the app against another DB-API
+    driver instead of SQL Server (e.g. "benchmarks.standins:sqlite_connect_from_env").
+    The function is called once and must return a zero-argument connect callable.
+    """
+    target = os.getenv("DB_CONNECT_FACTORY")
+    if not target:
+        return None
+    module_name, _, attr = target.partition(":")
+    factory = getattr(importlib.import_module(module_name), attr)
+    logger.info(f"Using connection factory '{target}' instead of SQL Server.")
+    return factory()
+
 # Create a single, shared instance of the connector for the application to use.
-db_connector = DatabaseConnector()
\ No newline at end of file
+db_connector = DatabaseConnector(connect=_connect_factory_from_env())
\ No newline at end of file
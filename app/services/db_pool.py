@@ -0,0 +1,234 @@
+# app/services/db_pool.py
+
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no connection becomes available within the checkout timeout."""
+
+
+class _PooledConnection:
+    """Wraps a raw DB-API connection with the bookkeeping the pool needs."""
+    __slots__ = ("raw", "created_at", "last_used_at")
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.created_at = time.monotonic()
+        self.last_used_at = self.created_at
+
+
+class ConnectionPool:
+    """
+    A bounded, thread-safe pool of DB-API connections.
+
+    Connections are created lazily by the `connect` factory (e.g. a `pyodbc.connect`
+    partial, or `sqlite3.connect` for local testing), reused LIFO, and recycled when
+    they exceed `max_age` or sit idle longer than `max_idle` seconds. Connections
+    that have been idle for more than `health_check_after` seconds are pinged with
+    `health_check_query` before being handed out.
+    """
+    def __init__(
+        self,
+        connect,
+        size: int = 5,
+        max_age: float = 1800,
+        max_idle: float = 300,
+        checkout_timeout: float = 30,
+        health_check_after: float = 30,
+        health_check_query: str = "SELECT 1",
+    ):
+        if size < 1:
+            raise ValueError("Pool size must be at least 1.")
+        self._connect = connect
+        self.size = size
+        self.max_age = max_age
+        self.max_idle = max_idle
+        self.checkout_timeout = checkout_timeout
+        self.health_check_after = health_check_after
+        self.health_check_query = health_check_query
+
+        self._idle = deque()
+        self._open_count = 0
+        self._closed = False
+        self._cond = threading.Condition(threading.Lock())
+        self._stats = {
+            "checkouts": 0,
+            "waits": 0,
+            "timeouts": 0,
+            "creations": 0,
+            "recycled": 0,
+            "health_check_failures": 0,
+            "discarded": 0,
+        }
+
+    # --- Public API ---
+    @contextmanager
+    def connection(self):
+        """
+        Checks out a connection for the duration of the `with` block.
+        If the block raises, the connection is discarded rather than returned,
+        since its state (open transaction, broken link) can no longer be trusted.
+        """
+        pooled = self._acquire()
+        discard = False
+        try:
+            yield pooled.raw
+        except Exception:
+            discard = True
+            raise
+        finally:
+            self._release(pooled, discard=discard)
+
+    def prefill(self, count: int) -> int:
+        """
+        Opens connections until `count` are open (bounded by the pool size) so the
+        first requests don't pay for connection setup. Several threads may prefill
+        at once to open connections in parallel. Returns how many this call opened.
+        """
+        opened = 0
+        while True:
+            with self._cond:
+                if self._closed or self._open_count >= min(count, self.size):
+                    return opened
+                self._open_count += 1  # Reserve the slot before connecting
+            self._release(self._create())
+            opened += 1
+
+    def stats(self) -> dict:
+        """Returns a snapshot of the pool counters and current occupancy."""
+        with self._cond:
+            snapshot = dict(self._stats)
+            snapshot["size"] = self.size
+            snapshot["open"] = self._open_count
+            snapshot["idle"] = len(self._idle)
+            snapshot["in_use"] = self._open_count - len(self._idle)
+        return snapshot
+
+    def close(self):
+        """Closes all idle connections and refuses further checkouts."""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = list(self._idle), deque()
+            self._open_count -= len(idle)
+            self._cond.notify_all()
+        for pooled in idle:
+            self._close_raw(pooled)
+        logger.info("Connection pool closed.")
+
+    # --- Checkout / Return ---
+    def _acquire(self) -> _PooledConnection:
+        deadline = time.monotonic() + self.checkout_timeout
+        waited = False
+        while True:
+            expired = []
+            with self._cond:
+                if self._closed:
+                    raise PoolTimeoutError("Connection pool is closed.")
+                pooled, create = self._take_or_reserve(expired)
+                if pooled is None and not create and not expired:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats["timeouts"] += 1
+                        raise PoolTimeoutError(
+                            f"Timed out after {self.checkout_timeout}s waiting for a database connection."
+                        )
+                    if not waited:
+                        self._stats["waits"] += 1
+                        waited = True
+                    self._cond.wait(remaining)
+                    continue
+
+            # Closing, connection setup and health checks happen outside the lock.
+            for stale in expired:
+                self._close_raw(stale)
+            if pooled is None and not create:
+                continue
+            if create:
+                pooled = self._create()
+            elif not self._is_healthy(pooled):
+                self._drop(pooled, "health_check_failures")
+                continue
+
+            with self._cond:
+                self._stats["checkouts"] += 1
+            return pooled
+
+    def _take_or_reserve(self, expired: list):
+        """
+        Must be called with the lock held. Returns (pooled, should_create) and
+        moves any connections past their age/idle limits into `expired`.
+        """
+        now = time.monotonic()
+        while self._idle:
+            pooled = self._idle.pop()  # LIFO keeps the warmest connections in use
+            if self._is_expired(pooled, now):
+                self._open_count -= 1
+                self._stats["recycled"] += 1
+                expired.append(pooled)
+                continue
+            return pooled, False
+        if self._open_count < self.size:
+            self._open_count += 1  # Reserve the slot before connecting
+            return None, True
+        return None, False
+
+    def _release(self, pooled: _PooledConnection, discard: bool = False):
+        if discard:
+            self._drop(pooled, "discarded")
+            return
+        if self._closed or self._is_expired(pooled, time.monotonic()):
+            self._drop(pooled, "recycled")
+            return
+        pooled.last_used_at = time.monotonic()
+        with self._cond:
+            self._idle.append(pooled)
+            self._cond.notify()
+
+    # --- Connection Lifecycle ---
+    def _create(self) -> _PooledConnection:
+        try:
+            raw = self._connect()
+        except BaseException:
+            with self._cond:
+                self._open_count -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._stats["creations"] += 1
+        return _PooledConnection(raw)
+
+    def _drop(self, pooled: _PooledConnection, reason: str):
+        self._close_raw(pooled)
+        with self._cond:
+            self._open_count -= 1
+            self._stats[reason] += 1
+            self._cond.notify()
+
+    def _is_expired(self, pooled: _PooledConnection, now: float) -> bool:
+        return (now - pooled.created_at) > self.max_age or (now - pooled.last_used_at) > self.max_idle
+
+    def _is_healthy(self, pooled: _PooledConnection) -> bool:
+        if time.monotonic() - pooled.last_used_at < self.health_check_after:
+            return True
+        try:
+            cursor = pooled.raw.cursor()
+            cursor.execute(self.health_check_query)
+            cursor.fetchall()
+            cursor.close()
+            return True
+        except Exception as e:
+            logger.warning(f"Pooled connection failed health check, replacing it: {e}")
+            return False
+
+    @staticmethod
+    def _close_raw(pooled: _PooledConnection):
+        try:
+            pooled.raw.close()
+        except Exception:
+            pass
@@ -0,0 +1,241 @@
+# app/services/facets.py
+
+import os
+import logging
+from collections import defaultdict
+from app.services.database import db_connector
+from app.services.cache import TTLCache
+from app.services.search_index import IncrementalProfileIndex, SearchIndexService
+
+logger = logging.getLogger(__name__)
+
+# Columns broken down in every search's facet summary. Industries hold a comma-separated
+# list; a profile counts once towards each of its industries.
+FACET_COLUMNS = ["person_location_country", "organization_industries", "organization_email_status"]
+MULTI_VALUED_COLUMNS = {"organization_industries"}
+# Live counts group only by the low-cardinality single-valued facets, so the GROUP BY returns a
+# few hundred rows at most; grouping by the free-form industry lists would return their cross product.
+LIVE_FACET_COLUMNS = [col for col in FACET_COLUMNS if col not in MULTI_VALUED_COLUMNS]
+FACET_TOP_N = int(os.getenv("FACET_TOP_N", 10))
+# Below this many matches the facets are tallied row by row instead of by posting intersections.
+FACET_SCAN_THRESHOLD = int(os.getenv("FACET_SCAN_THRESHOLD", 20000))
+# Matching rows newer than the index's snapshot are counted live, up to this many.
+FACET_INDEX_TAIL_MAX_ROWS = int(os.getenv("FACET_INDEX_TAIL_MAX_ROWS", 5000))
+
+
+def facet_values(column: str, raw) -> tuple:
+    """Normalized facet values of one cell: lower-cased and trimmed, split when multi-valued. NULL is (None,)."""
+    if raw is None or not str(raw).strip():
+        return (None,)
+    if column in MULTI_VALUED_COLUMNS:
+        values = tuple(dict.fromkeys(v.strip().lower() for v in str(raw).split(",") if v.strip()))
+        return values or (None,)
+    return (str(raw).strip().lower(),)
+
+
+def summarize_counts(total: int, counts: dict, source: str, top_n: int = None) -> dict:
+    """
+    The search-facing shape: total plus the top values of each facet in `counts`,
+    largest first. Facets that weren't counted are left out.
+    """
+    top_n = FACET_TOP_N if top_n is None else top_n
+    facets = {}
+    for column in [col for col in FACET_COLUMNS if col in counts]:
+        ranked = sorted(counts[column].items(), key=lambda item: (-item[1], item[0] is None, item[0] or ""))
+        facets[column] = [{"value": value, "count": count} for value, count in ranked[:top_n] if count]
+    return {"total_count": total, "facets": facets, "source": source}
+
+
+def tally_rows(counts: dict, columns: list, rows) -> int:
+    """Adds the facet values of raw rows (one cell per entry of `columns`) to `counts`. Returns the row count."""
+    tallied = 0
+    for row in rows:
+        for column, raw in zip(columns, row):
+            column_counts = counts.setdefault(column, {})
+            for value in facet_values(column, raw):
+                column_counts[value] = column_counts.get(value, 0) + 1
+        tallied += 1
+    return tallied
+
+
+def summarize_groups(rows: list, top_n: int = None) -> dict:
+    """
+    Rolls up the rows of a live `GROUP BY <LIVE_FACET_COLUMNS>` query (facet values
+    followed by a count) into the same summary the facet index produces.
+    """
+    total = 0
+    counts = {column: defaultdict(int) for column in LIVE_FACET_COLUMNS}
+    for row in rows:
+        group_count = row[len(LIVE_FACET_COLUMNS)]
+        total += group_count
+        for column, raw in zip(LIVE_FACET_COLUMNS, row):
+            for value in facet_values(column, raw):
+                counts[column][value] += group_count
+    return summarize_counts(total, counts, "live", top_n)
+
+
+class FacetIndex(IncrementalProfileIndex):
+    """
+    In-process facet counts over a snapshot of dbo.ProfileData.
+
+    Keeps each profile's facet values plus a posting set of ProfileIds per facet value,
+    so the table-wide breakdown is just the posting sizes and a filtered breakdown is a
+    set intersection per value. Filters it can evaluate itself (=, LIKE, IS [NOT] NULL
+    on facet columns) are resolved from the postings; LIKE filters on other columns are
+    resolved through the trigram index when one is given. Anything else (ranges,
+    unindexed columns) is left to a live COUNT.
+
+    Refreshed incrementally like the trigram index (see IncrementalProfileIndex). Rows
+    inserted since the last refresh aren't in the index; `tally` reports the ProfileId
+    it is complete up to, so the caller can count the newer rows live.
+    """
+    label = "Facet index"
+
+    def __init__(self, columns: list = None):
+        super().__init__(columns or FACET_COLUMNS)
+        self._values = {}  # ProfileId -> tuple of facet value tuples, in self.columns order
+        self._postings = {col: defaultdict(set) for col in self.columns}
+        self.stats = {"documents": 0, "refreshes": 0, "rows_indexed": 0, "summaries": 0, "unanswerable": 0, "last_refresh_seconds": 0.0}
+
+    # --- Indexing ---
+    def _add_locked(self, profile_id: int, values: dict):
+        old = self._values.get(profile_id)
+        if old is not None:
+            for col, old_values in zip(self.columns, old):
+                for value in old_values:
+                    posting = self._postings[col].get(value)
+                    if posting is not None:
+                        posting.discard(profile_id)
+                        if not posting:
+                            del self._postings[col][value]
+        else:
+            self.stats["documents"] += 1
+        new = tuple(facet_values(col, values.get(col)) for col in self.columns)
+        self._values[profile_id] = new
+        for col, new_values in zip(self.columns, new):
+            for value in new_values:
+                self._postings[col][value].add(profile_id)
+
+    # --- Lookups ---
+    def _matching_values(self, column: str, operator: str, value):
+        """Facet values of `column` satisfying one filter, or None when it can't be evaluated here."""
+        postings = self._postings[column]
+        if operator == "IS NULL":
+            return [None]
+        if operator == "IS NOT NULL":
+            return [v for v in postings if v is not None]
+        if value is None or any(ch in str(value) for ch in "%_["):
+            return None
+        needle = str(value).lower()
+        if operator == "=":
+            # Equality on a multi-valued column compares the whole list, which the postings don't keep.
+            return None if column in MULTI_VALUED_COLUMNS else [needle]
+        if operator == "LIKE":
+            # A needle spanning the ", " separator can't be matched against single values.
+            if column in MULTI_VALUED_COLUMNS and "," in needle:
+                return None
+            return [v for v in postings if v is not None and needle in v]
+        return None
+
+    def _resolve_locked(self, validated_filters: list, search_index=None):
+        """
+        (matched ProfileIds or None for "every profile", answered) for the filters.
+        `answered` is False when some filter can't be evaluated from the index.
+        """
+        ids = None
+        deferred = []
+        for column, operator, value in validated_filters:
+            if column not in self._postings:
+                deferred.append((column, operator, value))
+                continue
+            values = self._matching_values(column, operator, value)
+            if values is None:
+                return None, False
+            postings = self._postings[column]
+            matched = set().union(*(postings.get(v, ()) for v in values))
+            ids = matched if ids is None else ids & matched
+
+        if deferred:
+            if search_index is None or not all(search_index.indexable(*f) for f in deferred):
+                return None, False
+            matched = search_index.resolve(deferred)
+            if matched is None:
+                return None, False
+            ids = matched if ids is None else ids & matched
+        return ids, True
+
+    def summarize(self, validated_filters: list, search_index=None, top_n: int = None):
+        """
+        Match count and facet breakdown for the filters as of the last refresh, or None
+        when the index is not ready or can't evaluate every filter. Blocking on large
+        segments; run it off the event loop.
+        """
+        tallied = self.tally(validated_filters, search_index)
+        if tallied is None:
+            return None
+        total, counts, _ = tallied
+        return summarize_counts(total, counts, "cache", top_n)
+
+    def tally(self, validated_filters: list, search_index=None):
+        """
+        (total, {column: {value: count}}, complete_up_to) for the filters, or None when
+        the index is not ready or can't evaluate every filter. The counts cover exactly
+        the matching profiles with a ProfileId up to `complete_up_to`.
+        """
+        if not self.ready:
+            return None
+        with self._lock:
+            complete_up_to = self.last_profile_id
+            ids, answered = self._resolve_locked(validated_filters, search_index)
+            if not answered:
+                self.stats["unanswerable"] += 1
+                return None
+            deferred = any(column not in self._postings for column, _, _ in validated_filters)
+            if deferred and search_index.last_profile_id < complete_up_to:
+                # LIKE filters were resolved by a trigram index that is further behind; stop at its snapshot.
+                complete_up_to = search_index.last_profile_id
+                ids = {pid for pid in ids if pid <= complete_up_to}
+            self.stats["summaries"] += 1
+            counts = {}
+            if ids is None:
+                total = len(self._values)
+                for col in self.columns:
+                    counts[col] = {value: len(posting) for value, posting in self._postings[col].items()}
+            elif len(ids) <= FACET_SCAN_THRESHOLD:
+                total = len(ids)
+                for col in self.columns:
+                    counts[col] = defaultdict(int)
+                for pid in ids:
+                    for col, values in zip(self.columns, self._values.get(pid, ())):
+                        for value in values:
+                            counts[col][value] += 1
+            else:
+                # Large segments: one C-level intersection per facet value.
+                total = len(ids)
+                for col in self.columns:
+                    counts[col] = {value: len(posting & ids) for value, posting in self._postings[col].items()}
+        return total, counts, complete_up_to
+
+    def snapshot_stats(self) -> dict:
+        snapshot = dict(self.stats)
+        snapshot["values"] = sum(len(postings) for postings in self._postings.values())
+        return snapshot
+
+
+# Live COUNT results, so paging through or re-running a segment doesn't recount it.
+live_count_cache = TTLCache(
+    max_entries=int(os.getenv("FACET_LIVE_CACHE_MAX_ENTRIES", 1024)),
+    ttl=float(os.getenv("FACET_LIVE_CACHE_TTL_SECONDS", 300)),
+)
+
+# Optional subsystem: off unless FACET_INDEX_ENABLED=1. Started by the FastAPI lifespan in app/main.py.
+facet_index, facet_index_service = None, None
+if os.getenv("FACET_INDEX_ENABLED", "0") == "1":
+    facet_index = FacetIndex()
+    facet_index_service = SearchIndexService(
+        facet_index,
+        db_connector,
+        refresh_interval=float(os.getenv("FACET_INDEX_REFRESH_SECONDS", 300)),
+        chunk_size=int(os.getenv("FACET_INDEX_CHUNK_SIZE", 5000)),
+        name="facet-index-refresh",
+    )
@@ -1,52 +1,119 @@
 import os
-import redis
 import json
 import logging
+import redis.asyncio as aioredis
 from app.services.database import db_connector # Import our existing SQL connector
+from app.services.activity_log import ActivityLogWriter
+from app.services.session_store import FallbackSessionStore, InMemorySessionStore, RedisSessionStore
+from app.services.metrics import span, registry
 
 logger = logging.getLogger(__name__)
 
 # --- Redis Connection for Short-Term Memory ---
-try:
-    redis_client = redis.Redis(
-        host=os.getenv("REDIS_HOST", "localhost"),
-        port=int(os.getenv("REDIS_PORT", 6379)),
-        db=0,
-        decode_responses=True # Important: decodes responses from bytes to strings
-    )
-    redis_client.ping() # Check connection
-    logger.info("Successfully connected to Redis for short-term memory.")
-except redis.exceptions.ConnectionError as e:
-    logger.error(f"Could not connect to Redis: {e}. Short-term memory will not work.")
-    redis_client = None
+# An async connection pool; connections are opened on first use, not at import.
+redis_pool = aioredis.ConnectionPool(
+    host=os.getenv("REDIS_HOST", "localhost"),
+    port=int(os.getenv("REDIS_PORT", 6379)),
+    db=0,
+    decode_responses=True, # Important: decodes responses from bytes to strings
+    max_connections=int(os.getenv("REDIS_MAX_CONNECTIONS", 50)),
+    socket_timeout=float(os.getenv("REDIS_SOCKET_TIMEOUT_SECONDS", 2)),
+    socket_connect_timeout=float(os.getenv("REDIS_CONNECT_TIMEOUT_SECONDS", 2)),
+)
+redis_client = aioredis.Redis(connection_pool=redis_pool)
+
+# Falls back to an in-process store while Redis is down instead of forgetting the conversation.
+session_store = FallbackSessionStore(
+    RedisSessionStore(redis_client),
+    InMemorySessionStore(max_keys=int(os.getenv("SESSION_FALLBACK_MAX_KEYS", 10000))),
+    retry_after=float(os.getenv("REDIS_RETRY_AFTER_SECONDS", 30)),
+)
+
+SESSION_MEMORY_MAX_MESSAGES = int(os.getenv("SESSION_MEMORY_MAX_MESSAGES", 20))
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", 86400))
+SESSION_SUMMARY_MAX_CHARS = int(os.getenv("SESSION_SUMMARY_MAX_CHARS", 2000))
+# ProfileIds matched by a session's last search, so a narrower follow-up is a primary-key lookup.
+# Kept small: the ids become query parameters (SQL Server allows 2100 per statement).
+SESSION_CANDIDATES_MAX = int(os.getenv("SESSION_CANDIDATES_MAX", 1000))
+SESSION_CANDIDATES_TTL_SECONDS = int(os.getenv("SESSION_CANDIDATES_TTL_SECONDS", 900))
+
+SESSION_CANDIDATE_LOOKUPS = registry.counter("session_candidates_total", "Session candidate set lookups and stores, by outcome.", ("outcome",))
 
 # --- Short-Term Memory Functions ---
-def get_short_term_memory(session_id: str, k: int = 10) -> list:
+def summarize_turns(messages: list, max_chars: int = 200) -> str:
+    """Condenses messages into one line each, e.g. "User: ..." / "Assistant: ...", clipped."""
+    lines = []
+    for m in messages:
+        content = " ".join(str(m.get("content") or "").split())
+        if len(content) > max_chars:
+            content = content[:max_chars - 3] + "..."
+        lines.append(f"{'User' if m.get('role') == 'user' else 'Assistant'}: {content}")
+    return "\n".join(lines)
+
+async def get_short_term_memory(session_id: str, k: int = 10) -> list:
     """Gets the last k messages from the current conversation session."""
-    if not redis_client:
-        return []
-    
     memory_key = f"session_memory:{session_id}"
-    history = redis_client.lrange(memory_key, 0, -1) # Get all items
+    history = await session_store.tail(memory_key, k) # Only the tail is fetched
     # The history from Redis needs to be parsed from JSON strings
-    return [json.loads(item) for item in history][-k:] # Return the last k items
+    return [json.loads(item) for item in history]
 
-def update_short_term_memory(session_id: str, user_message: str, agent_response: str):
-    """Updates the conversation history in Redis."""
-    if not redis_client:
-        return
+async def get_session_summary(session_id: str):
+    """Gets the running summary of turns that have aged out of the short-term history."""
+    return await session_store.get(f"session_summary:{session_id}")
 
+async def update_short_term_memory(session_id: str, user_message: str, agent_response: str):
+    """
+    Appends the turn to the conversation history, trims the history to
+    SESSION_MEMORY_MAX_MESSAGES and refreshes its expiry in a single round trip.
+    Messages trimmed off the history are rolled into the session's running summary.
+    """
     memory_key = f"session_memory:{session_id}"
-    # Add user message
-    redis_client.rpush(memory_key, json.dumps({"role": "user", "content": user_message}))
-    # Add agent response
-    redis_client.rpush(memory_key, json.dumps({"role": "assistant", "content": agent_response}))
-    
-    # Set an expiration time for the session memory (e.g., 24 hours)
-    redis_client.expire(memory_key, 86400)
+    evicted = await session_store.append(
+        memory_key,
+        [
+            json.dumps({"role": "user", "content": user_message}),
+            json.dumps({"role": "assistant", "content": agent_response}),
+        ],
+        SESSION_MEMORY_MAX_MESSAGES,
+        SESSION_TTL_SECONDS,
+    )
+    if evicted:
+        summary_key = f"session_summary:{session_id}"
+        previous = await session_store.get(summary_key)
+        summary = "\n".join(part for part in [previous, summarize_turns([json.loads(item) for item in evicted])] if part)
+        # Keep the most recent part of the summary within its size limit.
+        await session_store.set(summary_key, summary[-SESSION_SUMMARY_MAX_CHARS:], SESSION_TTL_SECONDS)
+
+async def get_session_candidates(session_id: str):
+    """
+    The session's stored candidate set, {"filters": [[column, operator, value], ...], "ids": [...]},
+    or None. Only complete match sets are ever stored.
+    """
+    raw = await session_store.get(f"session_candidates:{session_id}")
+    return json.loads(raw) if raw else None
+
+async def set_session_candidates(session_id: str, validated_filters: list, ids: list):
+    """Replaces the session's candidate set with every ProfileId matching `validated_filters`."""
+    entry = json.dumps({"filters": validated_filters, "ids": ids}, default=str)
+    await session_store.set(f"session_candidates:{session_id}", entry, SESSION_CANDIDATES_TTL_SECONDS)
 
 # --- Long-Term Memory Functions ---
-def log_significant_action(
+ACTIVITY_LOG_INSERT_SQL = """
+INSERT INTO dbo.AgentActivityLog (UserID, SessionID, ActionType, UserQuery, GeneratedSQL, ToolOutputSummary, AgentResponse)
+VALUES (?, ?, ?, ?, ?, ?, ?);
+"""
+
+# Write-behind writer for audit rows. Started and flushed by the FastAPI lifespan in app/main.py.
+activity_log_writer = ActivityLogWriter(
+    db_connector,
+    ACTIVITY_LOG_INSERT_SQL,
+    max_queue=int(os.getenv("ACTIVITY_LOG_MAX_QUEUE", 10000)),
+    batch_size=int(os.getenv("ACTIVITY_LOG_BATCH_SIZE", 100)),
+    flush_interval=float(os.getenv("ACTIVITY_LOG_FLUSH_INTERVAL_SECONDS", 1.0)),
+    enqueue_timeout=float(os.getenv("ACTIVITY_LOG_ENQUEUE_TIMEOUT_SECONDS", 0.05)),
+)
+
+async def log_significant_action(
     user_id: str,
     session_id: str,
     action_type: str,
@@ -55,10 +122,10 @@ def log_significant_action(
     tool_output_summary: str = None,
     agent_response: str = None
 ):
-    """Logs a significant agent action to the SQL database for permanent memory."""
-    sql = """
-    INSERT INTO dbo.AgentActivityLog (UserID, SessionID, ActionType, UserQuery, GeneratedSQL, ToolOutputSummary, AgentResponse)
-    VALUES (?, ?, ?, ?, ?, ?, ?);
+    """
+    Logs a significant agent action to the SQL database for permanent memory.
+    When the write-behind writer is running the row is queued and inserted in a
+    later batch; otherwise it is inserted directly.
     """
     params = (
         user_id,
@@ -70,7 +137,11 @@ def log_significant_action(
         agent_response
     )
     try:
-        db_connector.execute_query(sql, params)
+        with span("activity_log"):
+            if activity_log_writer.running:
+                await activity_log_writer.enqueue(params)
+                return
+            await db_connector.execute_query_async(ACTIVITY_LOG_INSERT_SQL, params)
         logger.info(f"Logged significant action '{action_type}' for user '{user_id}'.")
     except Exception as e:
         logger.error(f"Failed to log significant action to SQL: {e}")
\ No newline at end of file
@@ -0,0 +1,197 @@
+# app/services/metrics.py
+
+import os
+import time
+import bisect
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+ROW_BUCKETS = (0, 1, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(pairs) -> str:
+    pairs = list(pairs)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class Counter:
+    """A monotonically increasing count, optionally split by labels."""
+    kind = "counter"
+
+    def __init__(self, name: str, description: str, labelnames: tuple = ()):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> list:
+        with self._lock:
+            values = dict(self._values)
+        return [f"{self.name}{_labels(zip(self.labelnames, key))} {value}" for key, value in sorted(values.items())]
+
+
+class Histogram:
+    """Bucketed observations (e.g. durations in seconds), optionally split by labels."""
+    kind = "histogram"
+
+    def __init__(self, name: str, description: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [per-bucket counts, sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self) -> list:
+        with self._lock:
+            snapshot = {key: (list(counts), total, count) for key, (counts, total, count) in self._series.items()}
+        lines = []
+        for key, (counts, total, count) in sorted(snapshot.items()):
+            pairs = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_labels(pairs + [('le', bound)])} {cumulative}")
+            lines.append(f"{self.name}_bucket{_labels(pairs + [('le', '+Inf')])} {count}")
+            lines.append(f"{self.name}_sum{_labels(pairs)} {total}")
+            lines.append(f"{self.name}_count{_labels(pairs)} {count}")
+        return lines
+
+
+class StatsGauge:
+    """
+    Exposes a component's existing `stats()` dict, read at scrape time.
+    Each numeric entry becomes one sample labelled with its key.
+    """
+    kind = "gauge"
+
+    def __init__(self, name: str, description: str, callback):
+        self.name = name
+        self.description = description
+        self.callback = callback
+
+    def samples(self) -> list:
+        stats = self.callback()
+        return [
+            f"{self.name}{_labels([('stat', key)])} {float(value)}"
+            for key, value in sorted(stats.items())
+            if isinstance(value, (int, float))
+        ]
+
+
+class MetricsRegistry:
+    """Holds the process's metrics and renders them in the Prometheus text format."""
+    def __init__(self):
+        self._metrics = {}
+
+    def _register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, description: str, labelnames: tuple = ()) -> Counter:
+        return self._register(Counter(name, description, labelnames))
+
+    def histogram(self, name: str, description: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, description, labelnames, buckets))
+
+    def stats_gauge(self, name: str, description: str, callback) -> StatsGauge:
+        return self._register(StatsGauge(name, description, callback))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            try:
+                samples = metric.samples()
+            except Exception as e:
+                logger.warning(f"Could not collect metric '{metric.name}': {e}")
+                continue
+            lines.append(f"# HELP {metric.name} {metric.description}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines += samples
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+STAGE_SECONDS = registry.histogram("agent_stage_duration_seconds", "Time spent in each stage of an agent turn.", ("stage",))
+SEARCH_QUERY_SECONDS = registry.histogram("search_query_duration_seconds", "Search SQL execution time by filter shape.", ("shape",))
+SEARCH_ROWS = registry.histogram("search_rows_returned", "Rows returned per search page by filter shape.", ("shape",), ROW_BUCKETS)
+SLOW_QUERIES = registry.counter("search_slow_queries_total", "Searches slower than SLOW_QUERY_THRESHOLD_MS.", ("shape",))
+LLM_TOKENS = registry.counter("llm_tokens_total", "LLM tokens used, by kind (prompt, cached, completion).", ("kind",))
+
+# Server-Timing exposes internal stage durations to clients, so it is opt-in.
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "0") == "1"
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", 500))
+
+slow_query_logger = logging.getLogger("app.slow_queries")
+
+# Per-request stage durations (ms), collected while `request_timings()` is active.
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+@contextmanager
+def request_timings():
+    """Collects the durations of every span in the current request into a dict."""
+    timings = {}
+    token = _request_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _request_timings.reset(token)
+
+
+@contextmanager
+def span(stage: str):
+    """
+    Times a stage of the request: observed in the stage histogram and added to the
+    request's timings. Repeated or concurrent spans of the same stage are summed.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + elapsed * 1000
+
+
+def server_timing_header(timings: dict) -> str:
+    return ", ".join(f"{stage};dur={ms:.1f}" for stage, ms in timings.items())
+
+
+def observe_search_query(shape: str, seconds: float, row_count: int, query: str):
+    """Records one search query's duration and row count; logs it when it is slow."""
+    SEARCH_QUERY_SECONDS.observe(seconds, shape=shape)
+    SEARCH_ROWS.observe(row_count, shape=shape)
+    if seconds * 1000 >= SLOW_QUERY_THRESHOLD_MS:
+        SLOW_QUERIES.inc(shape=shape)
+        slow_query_logger.warning(f"Slow search query ({seconds * 1000:.0f} ms, {row_count} rows, shape {shape}): {query}")
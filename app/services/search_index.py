@@ -0,0 +1,234 @@
+# app/services/search_index.py
+
+import os
+import time
+import asyncio
+import logging
+import threading
+from collections import defaultdict
+from app.services.database import db_connector
+
+logger = logging.getLogger(__name__)
+
+# Free-text columns the agent filters with LIKE '%value%' most often.
+INDEXED_COLUMNS = ["organization_industries", "job_title", "person_skills", "person_location_country"]
+
+
+def _trigrams(text: str) -> set:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class IncrementalProfileIndex:
+    """
+    Base for in-process indexes over a snapshot of dbo.ProfileData.
+
+    Subclasses implement `_add_locked(profile_id, values)` and keep a `stats` dict with
+    "documents", "refreshes", "rows_indexed" and "last_refresh_seconds". Each
+    refresh only reads rows with a ProfileId above the last one seen, or a created_on
+    newer than the last one seen, and feeds them to `_add_locked` under the lock.
+    """
+    label = "Profile index"
+
+    def __init__(self, columns: list):
+        self.columns = list(columns)
+        self._lock = threading.Lock()
+        self.last_profile_id = 0
+        self.last_created_on = None
+        self.ready = False
+
+    def add(self, profile_id: int, values: dict):
+        """Indexes (or re-indexes) one profile. `values` maps column name -> raw cell value."""
+        with self._lock:
+            self._add_locked(profile_id, values)
+
+    def _add_locked(self, profile_id: int, values: dict):
+        raise NotImplementedError
+
+    def refresh(self, connector, chunk_size: int = 5000) -> int:
+        """
+        Pulls new or re-created rows from dbo.ProfileData through `connector.iter_query`
+        and indexes them. Blocking; run it off the event loop. Returns rows indexed.
+        """
+        started = time.perf_counter()
+        select_clause = ", ".join(f"[{col}]" for col in ["ProfileId", "created_on"] + self.columns)
+        query = f"SELECT {select_clause} FROM dbo.ProfileData WHERE [ProfileId] > ?"
+        params = [self.last_profile_id]
+        if self.last_created_on is not None:
+            query += " OR [created_on] > ?"
+            params.append(self.last_created_on)
+        query += " ORDER BY [ProfileId] ASC;"
+
+        indexed = 0
+        for columns, rows in connector.iter_query(query, tuple(params), chunk_size):
+            # Take the lock per chunk so lookups can interleave with a long build. Rows come in
+            # ProfileId order, so after each chunk every ProfileId up to last_profile_id is indexed;
+            # callers rely on that to cover newer rows with a `[ProfileId] > last_profile_id` query.
+            with self._lock:
+                for row in rows:
+                    profile_id, created_on = row[0], row[1]
+                    self._add_locked(profile_id, dict(zip(self.columns, row[2:])))
+                    self.last_profile_id = max(self.last_profile_id, profile_id)
+                    if created_on is not None and (self.last_created_on is None or created_on > self.last_created_on):
+                        self.last_created_on = created_on
+            indexed += len(rows)
+
+        self.ready = True
+        elapsed = time.perf_counter() - started
+        self.stats["refreshes"] += 1
+        self.stats["rows_indexed"] += indexed
+        self.stats["last_refresh_seconds"] = round(elapsed, 3)
+        logger.info(f"{self.label} refreshed: {indexed} rows in {elapsed:.2f}s ({self.stats['documents']} documents).")
+        return indexed
+
+
+class TrigramIndex(IncrementalProfileIndex):
+    """
+    In-process trigram index over a snapshot of dbo.ProfileData.
+
+    For each indexed column it keeps the lower-cased text per ProfileId and a posting
+    set of ProfileIds per trigram. A substring (LIKE '%value%') filter is resolved by
+    intersecting the posting sets of the value's trigrams and then confirming the
+    substring against the stored text, giving the exact set of matching ProfileIds.
+
+    The index is built and refreshed incrementally (see IncrementalProfileIndex).
+    """
+    label = "Search index"
+
+    def __init__(self, columns: list = None):
+        super().__init__(columns or INDEXED_COLUMNS)
+        self._texts = {col: {} for col in self.columns}
+        self._postings = {col: defaultdict(set) for col in self.columns}
+        self.stats = {"documents": 0, "refreshes": 0, "rows_indexed": 0, "lookups": 0, "last_refresh_seconds": 0.0}
+
+    # --- Indexing ---
+    def _add_locked(self, profile_id: int, values: dict):
+        is_new = not any(profile_id in self._texts[col] for col in self.columns)
+        for col in self.columns:
+            old_text = self._texts[col].pop(profile_id, None)
+            if old_text is not None:
+                for gram in _trigrams(old_text):
+                    posting = self._postings[col].get(gram)
+                    if posting is not None:
+                        posting.discard(profile_id)
+            text = values.get(col)
+            if text:
+                text = str(text).lower()
+                self._texts[col][profile_id] = text
+                for gram in _trigrams(text):
+                    self._postings[col][gram].add(profile_id)
+        if is_new:
+            self.stats["documents"] += 1
+
+    # --- Lookups ---
+    def _needle(self, column: str, value):
+        """
+        Lower-cased search text for a filter, or None when the index cannot answer it:
+        unindexed column, value shorter than a trigram, or a value carrying its own
+        LIKE wildcards.
+        """
+        if column not in self._texts or value is None:
+            return None
+        needle = str(value).lower()
+        if len(needle) < 3 or "%" in needle or "_" in needle or "[" in needle:
+            return None
+        return needle
+
+    def indexable(self, column: str, operator: str, value) -> bool:
+        """Whether `resolve` can answer this filter from the index."""
+        return operator == "LIKE" and self._needle(column, value) is not None
+
+    def candidates(self, column: str, value: str):
+        """ProfileIds whose `column` contains `value` (case-insensitive), or None if not indexable."""
+        return self.resolve([(column, "LIKE", value)])
+
+    def resolve(self, validated_filters: list, max_candidates: int = None):
+        """
+        Exact set of ProfileIds matching every indexable LIKE filter, or None when no
+        filter could be answered from the index. Posting sets from all filters are
+        intersected smallest-first, so the running set shrinks as fast as possible,
+        and only the survivors are checked against the stored text.
+
+        With `max_candidates`, also None as soon as the intersected postings are larger
+        than that, before the text check: the filters aren't selective enough to narrow
+        the query.
+        """
+        if not self.ready:
+            return None
+        needles = []
+        for column, operator, value in validated_filters:
+            needle = self._needle(column, value) if operator == "LIKE" else None
+            if needle is not None:
+                needles.append((column, needle))
+        if not needles:
+            return None
+
+        with self._lock:
+            self.stats["lookups"] += 1
+            postings = sorted(
+                (self._postings[column].get(gram, ()) for column, needle in needles for gram in _trigrams(needle)),
+                key=len,
+            )
+            if not postings[0]:
+                return set()
+            ids = set(postings[0])
+            for posting in postings[1:]:
+                ids &= posting
+                if not ids:
+                    return ids
+            if max_candidates is not None and len(ids) > max_candidates:
+                return None
+            # Sharing every trigram is not a substring match ("abc bcd" vs "abcd"); confirm against the text.
+            for column, needle in needles:
+                texts = self._texts[column]
+                ids = {pid for pid in ids if needle in texts.get(pid, "")}
+            return ids
+
+
+class SearchIndexService:
+    """
+    Builds an index in the background on startup and refreshes it periodically.
+    Works with any index exposing `refresh(connector, chunk_size)`.
+    """
+    def __init__(self, index: IncrementalProfileIndex, connector, refresh_interval: float = 300, chunk_size: int = 5000, name: str = "search-index-refresh"):
+        self.index = index
+        self.connector = connector
+        self.refresh_interval = refresh_interval
+        self.chunk_size = chunk_size
+        self.name = name
+        self._task = None
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name=self.name)
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                # The refresh holds its own pooled connection; run it on a worker thread.
+                await asyncio.to_thread(self.index.refresh, self.connector, self.chunk_size)
+            except Exception as e:
+                logger.error(f"Index refresh ({self.name}) failed: {e}", exc_info=True)
+            await asyncio.sleep(self.refresh_interval)
+
+
+SEARCH_INDEX_MAX_CANDIDATES = int(os.getenv("SEARCH_INDEX_MAX_CANDIDATES", 1000))
+
+# Optional subsystem: off unless SEARCH_INDEX_ENABLED=1. Started by the FastAPI lifespan in app/main.py.
+search_index, search_index_service = None, None
+if os.getenv("SEARCH_INDEX_ENABLED", "0") == "1":
+    search_index = TrigramIndex()
+    search_index_service = SearchIndexService(
+        search_index,
+        db_connector,
+        refresh_interval=float(os.getenv("SEARCH_INDEX_REFRESH_SECONDS", 300)),
+        chunk_size=int(os.getenv("SEARCH_INDEX_CHUNK_SIZE", 5000)),
+    )
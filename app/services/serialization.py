@@ -0,0 +1,33 @@
+# app/services/serialization.py
+
+import json
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError: # Optional speed-up; the stdlib encoder is used without it
+    orjson = None
+
+
+def dumps(obj) -> str:
+    """Serializes to a compact JSON string, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=str).decode("utf-8")
+    return json.dumps(obj, default=str, separators=(",", ":"))
+
+
+def dumps_bytes(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj, default=str)
+    return json.dumps(obj, default=str, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson when available (falls back to the stdlib encoder)."""
+    def render(self, content) -> bytes:
+        return dumps_bytes(content)
+
+
+def to_records(columns: list, rows: list) -> list:
+    """Converts the columnar {"columns", "rows"} shape into a list of row dicts."""
+    return [dict(zip(columns, row)) for row in rows]
@@ -0,0 +1,140 @@
+# app/services/session_store.py
+
+import time
+import logging
+from collections import OrderedDict
+import redis.asyncio as aioredis
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+
+class InMemorySessionStore:
+    """
+    Process-local stand-in for Redis, used when Redis is unreachable.
+    Holds at most `max_keys` keys (least recently used are evicted) and honours TTLs.
+    """
+    def __init__(self, max_keys: int = 10000):
+        self.max_keys = max_keys
+        self._data = OrderedDict()  # key -> (expires_at, value)
+
+    def _load(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return entry[1]
+
+    def _store(self, key, value, ttl: int):
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_keys:
+            self._data.popitem(last=False)
+
+    async def tail(self, key: str, k: int) -> list:
+        items = self._load(key) or []
+        return items[-k:] if k > 0 else []
+
+    async def append(self, key: str, items: list, cap: int, ttl: int) -> list:
+        combined = (self._load(key) or []) + list(items)
+        self._store(key, combined[-cap:], ttl)
+        return combined[:-cap]
+
+    async def get(self, key: str):
+        return self._load(key)
+
+    async def set(self, key: str, value: str, ttl: int):
+        self._store(key, value, ttl)
+
+    async def ping(self):
+        return True
+
+
+class RedisSessionStore:
+    """Session storage on an async Redis connection pool."""
+    def __init__(self, client: aioredis.Redis):
+        self.client = client
+
+    async def tail(self, key: str, k: int) -> list:
+        if k <= 0:
+            return []
+        # Negative indexes fetch only the last k entries instead of the whole list.
+        return await self.client.lrange(key, -k, -1)
+
+    async def append(self, key: str, items: list, cap: int, ttl: int) -> list:
+        # One MULTI/EXEC round trip: push, read what falls outside the cap, trim, refresh the expiry.
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.rpush(key, *items)
+            pipe.lrange(key, 0, -(cap + 1))
+            pipe.ltrim(key, -cap, -1)
+            pipe.expire(key, ttl)
+            results = await pipe.execute()
+        return results[1]
+
+    async def get(self, key: str):
+        return await self.client.get(key)
+
+    async def set(self, key: str, value: str, ttl: int):
+        await self.client.set(key, value, ex=ttl)
+
+    async def ping(self):
+        return await self.client.ping()
+
+
+class FallbackSessionStore:
+    """
+    Routes session reads and writes to Redis, switching to a local store while Redis
+    is unreachable. After a failure Redis is retried every `retry_after` seconds.
+    Sessions written during an outage live only in this worker's local store.
+    """
+    def __init__(self, primary: RedisSessionStore, fallback: InMemorySessionStore, retry_after: float = 30):
+        self.primary = primary
+        self.fallback = fallback
+        self.retry_after = retry_after
+        self._down_until = 0.0
+        self._stats = {"primary_errors": 0, "fallback_ops": 0}
+
+    @property
+    def using_fallback(self) -> bool:
+        return time.monotonic() < self._down_until
+
+    async def _call(self, method: str, *args):
+        if not self.using_fallback:
+            try:
+                return await getattr(self.primary, method)(*args)
+            except (RedisError, OSError) as e:
+                self._stats["primary_errors"] += 1
+                self._down_until = time.monotonic() + self.retry_after
+                logger.error(f"Redis session store unavailable ({e}); using local fallback for {self.retry_after}s.")
+        self._stats["fallback_ops"] += 1
+        return await getattr(self.fallback, method)(*args)
+
+    async def tail(self, key: str, k: int) -> list:
+        return await self._call("tail", key, k)
+
+    async def append(self, key: str, items: list, cap: int, ttl: int) -> list:
+        """Appends items, trims the list to `cap` and returns the items trimmed off."""
+        return await self._call("append", key, items, cap, ttl)
+
+    async def get(self, key: str):
+        return await self._call("get", key)
+
+    async def set(self, key: str, value: str, ttl: int):
+        return await self._call("set", key, value, ttl)
+
+    async def ping(self) -> bool:
+        try:
+            await self.primary.ping()
+            self._down_until = 0.0
+            return True
+        except (RedisError, OSError) as e:
+            logger.warning(f"Redis ping failed: {e}")
+            return False
+
+    def stats(self) -> dict:
+        snapshot = dict(self._stats)
+        snapshot["using_fallback"] = self.using_fallback
+        return snapshot
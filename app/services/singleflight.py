@@ -0,0 +1,148 @@
+# app/services/singleflight.py
+
+import os
+import json
+import uuid
+import asyncio
+import logging
+import redis.asyncio as aioredis
+from app.services.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+COALESCED_CALLS = registry.counter("search_coalesced_total", "Searches served by another caller's in-flight execution.", ("scope",))
+
+_MISSING = object()
+
+
+def _is_success(result) -> bool:
+    """Results worth publishing to other workers: anything but an {"error": ...} dict."""
+    return not (isinstance(result, dict) and "error" in result)
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key into one execution whose result
+    every caller receives.
+
+    Within a worker, the first caller for a key starts the execution as a task and
+    later callers await the same task; a caller that is cancelled does not cancel it
+    for the others. With `redis_url`, the executing worker also takes a short Redis
+    lock for the key and publishes the result under it, so identical calls in other
+    workers wait for that result instead of running their own. Results must be
+    JSON-serializable. Only results passing `shareable` are published; for any other
+    (by default an {"error": ...} result) the other workers find the lock released
+    without a result and run the call themselves. Redis failures are counted and
+    logged, and the call simply runs locally.
+    """
+    def __init__(self, redis_url: str = None, namespace: str = "singleflight", lock_ttl: float = 30, wait_timeout: float = 10, result_ttl: float = 5, shareable=_is_success):
+        self.namespace = namespace
+        self.shareable = shareable
+        self.lock_ttl = lock_ttl
+        self.wait_timeout = wait_timeout
+        self.result_ttl = result_ttl
+        self.shared = aioredis.from_url(redis_url, decode_responses=True) if redis_url else None
+        self._inflight = {}
+        self._stats = {"executions": 0, "local_coalesced": 0, "shared_coalesced": 0, "shared_wait_timeouts": 0, "shared_errors": 0, "unshared_results": 0}
+
+    async def do(self, key: str, fn):
+        """Returns the result of `fn()` (a zero-argument coroutine function), shared by all concurrent callers of `key`."""
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._run(key, fn))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+        else:
+            self._stats["local_coalesced"] += 1
+            COALESCED_CALLS.inc(scope="local")
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # Marks the exception retrieved even if every caller went away
+
+    async def _run(self, key: str, fn):
+        if self.shared is None:
+            return await self._execute(fn)
+
+        lock_key, result_key = f"{self.namespace}:lock:{key}", f"{self.namespace}:result:{key}"
+        token = uuid.uuid4().hex
+        try:
+            acquired = await self.shared.set(lock_key, token, nx=True, px=int(self.lock_ttl * 1000))
+        except Exception as e:
+            self._shared_error("lock", e)
+            return await self._execute(fn)
+
+        if not acquired:
+            result = await self._wait_for_result(lock_key, result_key)
+            if result is not _MISSING:
+                self._stats["shared_coalesced"] += 1
+                COALESCED_CALLS.inc(scope="shared")
+                return result
+            return await self._execute(fn)
+
+        try:
+            result = await self._execute(fn)
+            if self.shareable(result):
+                try:
+                    await self.shared.set(result_key, json.dumps(result, default=str), px=int(self.result_ttl * 1000))
+                except Exception as e:
+                    self._shared_error("publish", e)
+            else:
+                self._stats["unshared_results"] += 1
+            return result
+        finally:
+            try:
+                if await self.shared.get(lock_key) == token:
+                    await self.shared.delete(lock_key)
+            except Exception as e:
+                self._shared_error("unlock", e)
+
+    async def _execute(self, fn):
+        self._stats["executions"] += 1
+        return await fn()
+
+    async def _wait_for_result(self, lock_key: str, result_key: str):
+        """Polls for the other worker's result until it appears, its lock disappears or the wait times out."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.wait_timeout
+        delay = 0.01
+        while loop.time() < deadline:
+            try:
+                raw = await self.shared.get(result_key)
+                if raw is not None:
+                    return json.loads(raw)
+                if not await self.shared.exists(lock_key):
+                    raw = await self.shared.get(result_key)  # The result may have landed just before the unlock
+                    return json.loads(raw) if raw is not None else _MISSING
+            except Exception as e:
+                self._shared_error("wait", e)
+                return _MISSING
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.1)
+        self._stats["shared_wait_timeouts"] += 1
+        logger.warning(f"Gave up waiting {self.wait_timeout}s for another worker's result for {result_key}.")
+        return _MISSING
+
+    def _shared_error(self, operation: str, error: Exception):
+        self._stats["shared_errors"] += 1
+        logger.warning(f"Shared single-flight {operation} failed: {error}")
+
+    def stats(self) -> dict:
+        snapshot = dict(self._stats)
+        snapshot["in_flight"] = len(self._inflight)
+        return snapshot
+
+
+# Shared instance used by the search tool. SEARCH_COALESCE_ENABLED=0 disables it entirely;
+# SEARCH_COALESCE_REDIS_URL extends coalescing across workers.
+search_single_flight = None
+if os.getenv("SEARCH_COALESCE_ENABLED", "1") == "1":
+    search_single_flight = SingleFlight(
+        redis_url=os.getenv("SEARCH_COALESCE_REDIS_URL") or None,
+        namespace="search_singleflight",
+        lock_ttl=float(os.getenv("SEARCH_COALESCE_LOCK_TTL_SECONDS", 30)),
+        wait_timeout=float(os.getenv("SEARCH_COALESCE_WAIT_SECONDS", 10)),
+    )
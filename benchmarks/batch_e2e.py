@@ -0,0 +1,104 @@
+# benchmarks/batch_e2e.py
+"""
+End-to-end check of batch mode (python -m app.batch) against the local stand-ins:
+SQLite ProfileData and the fake OpenAI server. Redis is left unreachable, so
+sessions use the in-memory fallback.
+
+Writes a jobs file that repeats the fake server's scripted prompts, runs the
+batch CLI with --max-jobs to stop it part way, resumes it, and checks that every
+job has exactly one successful result. With --compare it also runs the same jobs
+at concurrency 1 without deduplication, like the old one-request-at-a-time script.
+
+Usage: python -m benchmarks.batch_e2e [--jobs 200] [--concurrency 16] [--rows 100000] [--compare]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+from benchmarks.loadtest import prepare_database, start_fake_openai
+from benchmarks.fake_openai import load_script
+
+
+def write_jobs(path: str, n_jobs: int, prompts: list):
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(n_jobs):
+            f.write(json.dumps({"id": f"job-{i + 1}", "user_id": f"ops-{i % 3}", "message": prompts[i % len(prompts)]}) + "\n")
+
+
+def run_cli(env: dict, *args) -> tuple:
+    started = time.perf_counter()
+    completed = subprocess.run([sys.executable, "-m", "app.batch", *args], env=env, capture_output=True, text=True)
+    elapsed = time.perf_counter() - started
+    start = completed.stdout.find("{")
+    if start < 0:
+        raise SystemExit(f"Batch run failed (exit code {completed.returncode}):\n{completed.stderr[-3000:]}")
+    return json.loads(completed.stdout[start:]), elapsed
+
+
+def check_results(path: str, n_jobs: int) -> dict:
+    records = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            records.setdefault(record["job_id"], []).append(record)
+    missing = n_jobs - len(records)
+    repeated = sum(1 for rs in records.values() if len(rs) > 1)
+    failed = sum(1 for rs in records.values() if rs[-1]["status"] != "ok")
+    return {"jobs_with_results": len(records), "missing": missing, "repeated": repeated, "failed": failed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jobs", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--db", default="bench_profiles.sqlite", help="SQLite file holding the ProfileData copy")
+    parser.add_argument("--latency-ms", type=float, default=300, help="Fake LLM time to first byte")
+    parser.add_argument("--compare", action="store_true", help="Also run sequentially without deduplication")
+    args = parser.parse_args()
+
+    prepare_database(args.db, args.rows)
+    script = load_script(None)
+    base_url, fake, _ = start_fake_openai(script, args.latency_ms, args.latency_ms / 4, 1, 42)
+    env = dict(os.environ)
+    env.update({
+        "OPENAI_BASE_URL": base_url,
+        "OPENAI_API_KEY": "bench",
+        "DB_CONNECT_FACTORY": "benchmarks.standins:sqlite_connect_from_env",
+        "BENCH_SQLITE_PATH": os.path.abspath(args.db),
+        "REDIS_PORT": env.get("BENCH_REDIS_PORT", "1"), # Unreachable: in-memory session fallback
+        "LOG_LEVEL": "WARNING",
+        "LOG_FILE": "",
+        "BATCH_MAX_CONCURRENCY": str(max(args.concurrency, 1)),
+    })
+
+    with tempfile.TemporaryDirectory() as workdir:
+        jobs_path, output_path = os.path.join(workdir, "jobs.ndjson"), os.path.join(workdir, "results.ndjson")
+        write_jobs(jobs_path, args.jobs, [entry["prompt"] for entry in script])
+
+        first, first_s = run_cli(env, jobs_path, "-o", output_path, "-c", str(args.concurrency), "--max-jobs", str(args.jobs // 2))
+        second, second_s = run_cli(env, jobs_path, "-o", output_path, "-c", str(args.concurrency))
+        check = check_results(output_path, args.jobs)
+        print(f"interrupted run: {first['succeeded']} jobs in {first_s:.1f}s; resumed run: {second['succeeded']} jobs "
+              f"({second['skipped']} skipped) in {second_s:.1f}s")
+        print(f"deduplicated messages: {first['deduplicated'] + second['deduplicated']}, "
+              f"search memo hits: {first['search_memo']['hits'] + second['search_memo']['hits']}")
+        print(f"results: {json.dumps(check)}")
+        print(f"fake OpenAI: {json.dumps(dict(fake.state.stats))}")
+
+        if args.compare:
+            sequential_path = os.path.join(workdir, "sequential.ndjson")
+            sequential, sequential_s = run_cli(env, jobs_path, "-o", sequential_path, "-c", "1", "--no-dedupe")
+            print(f"sequential without dedupe: {sequential['succeeded']} jobs in {sequential_s:.1f}s "
+                  f"vs {first_s + second_s:.1f}s batched")
+
+    ok = check["missing"] == 0 and check["repeated"] == 0 and check["failed"] == 0
+    print("OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
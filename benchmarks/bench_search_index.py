@@ -0,0 +1,84 @@
+# benchmarks/bench_search_index.py
+"""
+Compares the LIKE '%value%' scan path against the trigram index path
+(index lookup + primary-key IN fetch) on a SQLite copy of ProfileData.
+
+Usage: python -m benchmarks.bench_search_index [--rows 200000] [--repeat 20]
+"""
+import time
+import argparse
+from app.services.database import DatabaseConnector
+from app.services.search_index import TrigramIndex
+from benchmarks.synthetic import sqlite_connect_factory, create_tables, seed_profiles
+
+SEARCHES = [
+    [("job_title", "LIKE", "software engineer"), ("person_location_country", "LIKE", "united states")],
+    [("organization_industries", "LIKE", "hospital & health care"), ("person_location_country", "LIKE", "india")],
+    [("job_title", "LIKE", "cto"), ("organization_industries", "LIKE", "fintech")],
+    [("person_skills", "LIKE", "kubernetes"), ("job_title", "LIKE", "devops")],
+    # Selective combinations force the scan to walk most of the table before filling a page.
+    [("job_title", "LIKE", "physician"), ("organization_industries", "LIKE", "fintech"), ("person_location_country", "LIKE", "singapore")],
+    [("person_skills", "LIKE", "nursing"), ("job_title", "LIKE", "head of growth"), ("person_location_country", "LIKE", "brazil")],
+]
+SELECT_COLUMNS = "[person_full_name], [job_title], [organization_name], [person_location_country], [ProfileId]"
+
+
+def _where(filters):
+    return " AND ".join(f"[{col}] LIKE ?" for col, _, _ in filters), [f"%{value}%" for _, _, value in filters]
+
+
+def _scan(connector, filters, page_size):
+    where, params = _where(filters)
+    query = f"SELECT {SELECT_COLUMNS} FROM dbo.ProfileData WHERE {where} ORDER BY person_full_name, ProfileId LIMIT {page_size + 1}"
+    return connector.execute_query(query, tuple(params), columnar=True)
+
+
+def _indexed(connector, index, filters, page_size):
+    ids = index.resolve(filters)
+    where, params = _where(filters)
+    if ids is not None and len(ids) <= 900: # SQLite's default bound-parameter limit is 999
+        where += f" AND [ProfileId] IN ({', '.join('?' for _ in ids)})"
+        params += sorted(ids)
+    query = f"SELECT {SELECT_COLUMNS} FROM dbo.ProfileData WHERE {where} ORDER BY person_full_name, ProfileId LIMIT {page_size + 1}"
+    return connector.execute_query(query, tuple(params), columnar=True)
+
+
+def _time(fn, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - started) / repeat * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--page-size", type=int, default=10)
+    args = parser.parse_args()
+
+    connect = sqlite_connect_factory("file:bench_search_index?mode=memory&cache=shared")
+    keeper = connect() # Keeps the shared in-memory database alive
+    create_tables(keeper)
+    started = time.perf_counter()
+    seed_profiles(keeper, args.rows)
+    print(f"Seeded {args.rows} rows in {time.perf_counter() - started:.1f}s")
+
+    connector = DatabaseConnector(connect=connect)
+    index = TrigramIndex()
+    started = time.perf_counter()
+    index.refresh(connector)
+    print(f"Built trigram index in {time.perf_counter() - started:.1f}s")
+
+    print(f"{'filters':<70}{'scan ms':>10}{'index ms':>10}{'candidates':>12}")
+    for filters in SEARCHES:
+        scan_ms, scan_result = _time(lambda: _scan(connector, filters, args.page_size), args.repeat)
+        index_ms, index_result = _time(lambda: _indexed(connector, index, filters, args.page_size), args.repeat)
+        assert scan_result["rows"] == index_result["rows"], "index path returned different rows"
+        label = " & ".join(f"{col}~{value}" for col, _, value in filters)
+        print(f"{label[:68]:<70}{scan_ms:>10.2f}{index_ms:>10.2f}{len(index.resolve(filters)):>12}")
+    connector.close()
+
+
+if __name__ == "__main__":
+    main()
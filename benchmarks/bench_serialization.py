@@ -0,0 +1,67 @@
+# benchmarks/bench_serialization.py
+"""
+Micro-benchmark for the data_response payload: the current records shape
+(a dict per row) encoded with the stdlib vs. the columnar shape encoded with
+the app's fast encoder. Reports encode time and bytes on the wire.
+
+Usage: python -m benchmarks.bench_serialization [--rows 100] [--columns 12] [--repeat 2000]
+"""
+import json
+import time
+import random
+import string
+import argparse
+from app.services.serialization import dumps_bytes, orjson
+
+COLUMN_NAMES = [
+    "person_full_name", "job_title", "organization_name", "person_location_country",
+    "organization_email", "person_email", "person_mobile", "person_phone",
+    "person_linkedin_url", "person_skills", "organization_industries", "person_linkedin_connections",
+]
+
+
+def _synthetic_rows(n_rows: int, columns: list) -> list:
+    rng = random.Random(42)
+    def value(col):
+        if col == "person_linkedin_connections":
+            return rng.randint(0, 500)
+        return "".join(rng.choices(string.ascii_lowercase + " ", k=rng.randint(8, 40)))
+    return [[value(col) for col in columns] for _ in range(n_rows)]
+
+
+def _time(fn, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat * 1e6 # microseconds per call
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100)
+    parser.add_argument("--columns", type=int, default=len(COLUMN_NAMES))
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    columns = COLUMN_NAMES[:args.columns]
+    rows = _synthetic_rows(args.rows, columns)
+
+    def records_stdlib():
+        data = [dict(zip(columns, row)) for row in rows]
+        return json.dumps({"type": "data_response", "content": {"summary": "", "data": data}}).encode("utf-8")
+
+    def records_fast():
+        data = [dict(zip(columns, row)) for row in rows]
+        return dumps_bytes({"type": "data_response", "content": {"summary": "", "data": data}})
+
+    def columnar_fast():
+        return dumps_bytes({"type": "data_response", "content": {"summary": "", "data": {"columns": columns, "rows": rows}}})
+
+    print(f"{args.rows} rows x {len(columns)} columns, encoder: {'orjson' if orjson else 'stdlib json (orjson not installed)'}")
+    print(f"{'shape':<28}{'us/call':>12}{'bytes':>12}")
+    for name, fn in [("records + stdlib json", records_stdlib), ("records + fast encoder", records_fast), ("columnar + fast encoder", columnar_fast)]:
+        print(f"{name:<28}{_time(fn, args.repeat):>12.1f}{len(fn()):>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+# benchmarks/bench_startup.py
+"""
+Measures import-to-ready time of the app: `import app.main`, then the FastAPI
+lifespan startup, then the first successful readiness probe. Each run is a fresh
+interpreter, as a new uvicorn/gunicorn worker would be.
+
+The database is the SQLite stand-in (benchmarks/standins.py); Redis and OpenAI
+are whatever the environment points at, so an unreachable Redis shows up as a
+slow or failed dependency rather than hanging startup.
+
+Usage: python -m benchmarks.bench_startup [--runs 5] [--db bench_profiles.sqlite]
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import statistics
+import subprocess
+
+
+def _child():
+    """Runs inside a fresh interpreter and prints one JSON line of timings."""
+    started = time.perf_counter()
+    import app.main as main
+    imported = time.perf_counter()
+    import httpx
+
+    async def start_and_probe():
+        async with main.app.router.lifespan_context(main.app):
+            lifespan_done = time.perf_counter()
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://app") as http:
+                response = await http.get("/health/ready")
+                if response.status_code == 404: # Trees without a readiness endpoint
+                    response = await http.get("/")
+                ready = time.perf_counter()
+                return lifespan_done, ready, response.status_code, response.json()
+
+    lifespan_done, ready, status, body = asyncio.run(start_and_probe())
+    print(json.dumps({
+        "import_s": imported - started,
+        "lifespan_s": lifespan_done - imported,
+        "probe_s": ready - lifespan_done,
+        "import_to_ready_s": ready - started,
+        "status": status,
+        "body": body,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--db", default="bench_profiles.sqlite", help="SQLite file holding the ProfileData copy")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return _child()
+
+    env = dict(os.environ)
+    env.setdefault("DB_CONNECT_FACTORY", "benchmarks.standins:sqlite_connect_from_env")
+    env.setdefault("BENCH_SQLITE_PATH", os.path.abspath(args.db))
+    env.setdefault("OPENAI_API_KEY", "bench")
+    env.setdefault("LOG_LEVEL", "WARNING")
+    env.setdefault("LOG_FILE", "")
+
+    runs = []
+    for _ in range(args.runs):
+        completed = subprocess.run([sys.executable, "-m", "benchmarks.bench_startup", "--child"], env=env, capture_output=True, text=True)
+        lines = [line for line in completed.stdout.splitlines() if line.startswith("{")]
+        if completed.returncode != 0 or not lines:
+            print(f"Startup failed (exit code {completed.returncode}):\n{completed.stderr[-2000:]}")
+            return
+        runs.append(json.loads(lines[-1]))
+
+    for key in ("import_s", "lifespan_s", "probe_s", "import_to_ready_s"):
+        values = [run[key] for run in runs]
+        print(f"{key:<20} median {statistics.median(values) * 1000:8.1f} ms   max {max(values) * 1000:8.1f} ms")
+    print(f"last probe: HTTP {runs[-1]['status']} {json.dumps(runs[-1]['body'])}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+# benchmarks/fake_openai.py
+"""
+A minimal OpenAI-compatible server for load tests. Chat completions answer a user
+turn with the scripted tool calls for that prompt and answer a tool turn with a
+short text reply, after a configurable latency. Both plain and streamed (SSE)
+responses are supported, as are embeddings.
+
+Usage: python -m benchmarks.fake_openai [--port 8100] [--latency-ms 400] [--script script.json]
+Then run the app with OPENAI_BASE_URL=http://127.0.0.1:8100/v1 OPENAI_API_KEY=bench.
+"""
+import json
+import time
+import uuid
+import random
+import asyncio
+import hashlib
+import argparse
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# Prompts the load generator sends, each with the tool calls the model "decides" on.
+DEFAULT_SCRIPT = [
+    {"prompt": "Find software engineers in the United States",
+     "tool_calls": [{"name": "run_dynamic_query", "arguments": {"filters": [
+         {"column": "job_title", "operator": "LIKE", "value": "software engineer"},
+         {"column": "person_location_country", "operator": "LIKE", "value": "united states"}]}}]},
+    {"prompt": "Show me CTOs at fintech companies",
+     "tool_calls": [{"name": "run_dynamic_query", "arguments": {"filters": [
+         {"column": "job_title", "operator": "LIKE", "value": "cto"},
+         {"column": "organization_industries", "operator": "LIKE", "value": "fintech"}]}}]},
+    {"prompt": "Nurses in hospital & health care in India with their emails",
+     "tool_calls": [{"name": "run_dynamic_query", "arguments": {"filters": [
+         {"column": "job_title", "operator": "LIKE", "value": "registered nurse"},
+         {"column": "organization_industries", "operator": "LIKE", "value": "hospital & health care"},
+         {"column": "person_location_country", "operator": "LIKE", "value": "india"}],
+         "columns_to_select": ["person_full_name", "person_email", "organization_name"]}}]},
+    {"prompt": "DevOps engineers who know kubernetes",
+     "tool_calls": [{"name": "run_dynamic_query", "arguments": {"filters": [
+         {"column": "job_title", "operator": "LIKE", "value": "devops"},
+         {"column": "person_skills", "operator": "LIKE", "value": "kubernetes"}]}}]},
+    {"prompt": "Physicians in fintech in Singapore",
+     "tool_calls": [{"name": "run_dynamic_query", "arguments": {"filters": [
+         {"column": "job_title", "operator": "LIKE", "value": "physician"},
+         {"column": "organization_industries", "operator": "LIKE", "value": "fintech"},
+         {"column": "person_location_country", "operator": "LIKE", "value": "singapore"}]}}]},
+    {"prompt": "Compare sales leaders in Germany and France",
+     "tool_calls": [
+         {"name": "run_dynamic_query", "arguments": {"filters": [
+             {"column": "job_title", "operator": "LIKE", "value": "vp of sales"},
+             {"column": "person_location_country", "operator": "LIKE", "value": "germany"}]}},
+         {"name": "run_dynamic_query", "arguments": {"filters": [
+             {"column": "job_title", "operator": "LIKE", "value": "vp of sales"},
+             {"column": "person_location_country", "operator": "LIKE", "value": "france"}]}}]},
+    {"prompt": "What can you help me with?", "tool_calls": []},
+]
+
+REPLY_TEXT = "Here is what I found for your search."
+EMBEDDING_DIMENSIONS = 256
+
+
+def load_script(path: str = None) -> list:
+    if not path:
+        return DEFAULT_SCRIPT
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _embedding(text: str) -> list:
+    """Hashed character-trigram vector, so similar texts get similar embeddings."""
+    vector = [0.0] * EMBEDDING_DIMENSIONS
+    text = f"  {text.lower()} "
+    for i in range(len(text) - 2):
+        digest = hashlib.blake2b(text[i:i + 3].encode("utf-8"), digest_size=4).digest()
+        vector[int.from_bytes(digest, "little") % EMBEDDING_DIMENSIONS] += 1.0
+    return vector
+
+
+def create_app(script: list = None, latency_ms: float = 400, jitter_ms: float = 100, token_delay_ms: float = 5, seed: int = None) -> FastAPI:
+    """
+    `latency_ms` ± `jitter_ms` is the time to the first byte of each completion;
+    streamed responses then wait `token_delay_ms` between chunks.
+    """
+    script = {entry["prompt"].strip().lower(): entry["tool_calls"] for entry in (script or DEFAULT_SCRIPT)}
+    rng = random.Random(seed)
+    stats = {"chat_completions": 0, "embeddings": 0}
+    app = FastAPI(title="Fake OpenAI")
+    app.state.stats = stats
+
+    async def think():
+        await asyncio.sleep(max(0.0, latency_ms + rng.uniform(-jitter_ms, jitter_ms)) / 1000)
+
+    def decide(messages: list) -> list:
+        if not messages or messages[-1].get("role") != "user":
+            return []
+        prompt = str(messages[-1].get("content") or "").strip().lower()
+        tool_calls = script.get(prompt)
+        if tool_calls is None: # Unknown prompts get the first scripted search
+            tool_calls = next(iter(script.values()))
+        return [
+            {"id": f"call_{uuid.uuid4().hex[:24]}", "type": "function",
+             "function": {"name": tc["name"], "arguments": json.dumps(tc["arguments"])}}
+            for tc in tool_calls
+        ]
+
+    def usage(messages: list, completion: str) -> dict:
+        prompt_tokens = len(json.dumps(messages)) // 4
+        completion_tokens = max(1, len(completion) // 4)
+        return {
+            "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": 0},
+        }
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok", **stats}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        stats["chat_completions"] += 1
+        messages = body.get("messages", [])
+        tool_calls = decide(messages)
+        content = None if tool_calls else REPLY_TEXT
+        completion_id, created, model = f"chatcmpl-{uuid.uuid4().hex[:24]}", int(time.time()), body.get("model", "gpt-4o")
+        finish_reason = "tool_calls" if tool_calls else "stop"
+        token_usage = usage(messages, json.dumps(tool_calls) if tool_calls else content)
+
+        if not body.get("stream"):
+            await think()
+            message = {"role": "assistant", "content": content}
+            if tool_calls:
+                message["tool_calls"] = tool_calls
+            return JSONResponse({
+                "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+                "usage": token_usage,
+            })
+
+        def chunk(delta: dict = None, finish: str = None, include_usage: bool = False) -> str:
+            payload = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                       "choices": [] if delta is None else [{"index": 0, "delta": delta, "finish_reason": finish}]}
+            if include_usage:
+                payload["usage"] = token_usage
+            return f"data: {json.dumps(payload)}\n\n"
+
+        async def events():
+            await think()
+            yield chunk({"role": "assistant", "content": "" if content else None})
+            if content:
+                for word in content.split(" "):
+                    await asyncio.sleep(token_delay_ms / 1000)
+                    yield chunk({"content": word + " "})
+            for index, tc in enumerate(tool_calls):
+                await asyncio.sleep(token_delay_ms / 1000)
+                yield chunk({"tool_calls": [{"index": index, "id": tc["id"], "type": "function", "function": tc["function"]}]})
+            yield chunk({}, finish_reason)
+            if (body.get("stream_options") or {}).get("include_usage"):
+                yield chunk(include_usage=True)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        stats["embeddings"] += 1
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        await think()
+        return JSONResponse({
+            "object": "list", "model": body.get("model"),
+            "data": [{"object": "embedding", "index": i, "embedding": _embedding(text)} for i, text in enumerate(inputs)],
+            "usage": {"prompt_tokens": sum(len(t) // 4 for t in inputs), "total_tokens": sum(len(t) // 4 for t in inputs)},
+        })
+
+    return app
+
+
+def main():
+    import uvicorn
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency-ms", type=float, default=400)
+    parser.add_argument("--jitter-ms", type=float, default=100)
+    parser.add_argument("--token-delay-ms", type=float, default=5)
+    parser.add_argument("--script", help="JSON list of {prompt, tool_calls: [{name, arguments}]}")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+    app = create_app(load_script(args.script), args.latency_ms, args.jitter_ms, args.token_delay_ms, args.seed)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
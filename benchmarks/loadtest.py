@@ -0,0 +1,299 @@
+# benchmarks/loadtest.py
+"""
+Offline load test: runs the app in-process against local stand-ins (SQLite
+ProfileData, fakeredis, fake OpenAI server), drives POST /chat concurrently and
+reports throughput plus p50/p95/p99 latency for the whole request and for each
+stage (session memory, LLM, tool calls, SQL). Results are written as JSON so
+runs can be compared over time.
+
+Usage: python -m benchmarks.loadtest [--rows 1000000] [--sessions 500] [--turns 1]
+                                     [--concurrency 32] [--latency-ms 400]
+                                     [--output results.json] [--baseline earlier.json]
+
+App settings are read from the environment as usual (e.g. SEARCH_INDEX_ENABLED=1,
+DECISION_CACHE_ENABLED=0), so the same workload can be run with features toggled.
+"""
+import os
+import json
+import time
+import socket
+import asyncio
+import argparse
+import logging
+import importlib
+import threading
+import subprocess
+from datetime import datetime, timezone
+from functools import wraps
+from benchmarks.synthetic import sqlite_connect_factory, create_tables, seed_profiles
+from benchmarks.fake_openai import create_app as create_fake_openai, load_script
+from benchmarks.standins import install_redis_standin
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+# --- SETUP ---
+def prepare_database(path: str, n_rows: int):
+    """Creates the SQLite ProfileData at `path` and tops it up to `n_rows` rows."""
+    conn = sqlite_connect_factory(path)()
+    conn.execute("PRAGMA dbo.journal_mode=WAL") # Readers don't block the activity-log writer
+    create_tables(conn)
+    existing = conn.execute("SELECT COUNT(*) FROM dbo.ProfileData").fetchone()[0]
+    if existing < n_rows:
+        started = time.perf_counter()
+        seed_profiles(conn, n_rows - existing, start_id=existing + 1)
+        print(f"Seeded {n_rows - existing} rows into {path} in {time.perf_counter() - started:.1f}s")
+    conn.close()
+    return max(existing, n_rows)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_fake_openai(script: list, latency_ms: float, jitter_ms: float, token_delay_ms: float, seed: int):
+    """Serves the fake OpenAI API on a background thread. Returns (base_url, app, server)."""
+    import uvicorn
+    port = _free_port()
+    fake = create_fake_openai(script, latency_ms, jitter_ms, token_delay_ms, seed)
+    server = uvicorn.Server(uvicorn.Config(fake, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, name="fake-openai", daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}/v1", fake, server
+
+
+# --- STAGE TIMING ---
+class StageRecorder:
+    """Collects per-call durations (ms) by stage name."""
+    def __init__(self):
+        self.samples = {}
+
+    def add(self, stage: str, ms: float):
+        self.samples.setdefault(stage, []).append(ms)
+
+    def reset(self):
+        self.samples = {}
+
+    def timed_async(self, stage: str, fn):
+        @wraps(fn)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                self.add(stage, (time.perf_counter() - started) * 1000)
+        return wrapper
+
+    def timed_sync(self, stage: str, fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.add(stage, (time.perf_counter() - started) * 1000)
+        return wrapper
+
+    def timed_events(self, stage: str, fn):
+        """For async generators: measures from the call until the final event."""
+        @wraps(fn)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                async for event in fn(*args, **kwargs):
+                    yield event
+            finally:
+                self.add(stage, (time.perf_counter() - started) * 1000)
+        return wrapper
+
+
+def instrument(recorder: StageRecorder, core, db_connector):
+    """Wraps the agent's stage boundaries in place; the app code itself is unchanged."""
+    core.get_short_term_memory = recorder.timed_async("memory_read", core.get_short_term_memory)
+    core.get_session_summary = recorder.timed_async("memory_read", core.get_session_summary)
+    core.update_short_term_memory = recorder.timed_async("memory_write", core.update_short_term_memory)
+    core._llm_events = recorder.timed_events("llm", core._llm_events)
+    core._execute_tool_call = recorder.timed_async("tool_call", core._execute_tool_call)
+    db_connector.execute_query = recorder.timed_sync("sql", db_connector.execute_query)
+
+
+# --- REPORTING ---
+def percentile(sorted_values: list, pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+def summarize(values: list) -> dict:
+    ordered = sorted(values)
+    return {
+        "count": len(ordered),
+        "mean_ms": round(sum(ordered) / len(ordered), 3) if ordered else 0.0,
+        "p50_ms": round(percentile(ordered, 50), 3),
+        "p95_ms": round(percentile(ordered, 95), 3),
+        "p99_ms": round(percentile(ordered, 99), 3),
+        "max_ms": round(ordered[-1], 3) if ordered else 0.0,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(results: dict, baseline: dict = None):
+    print(f"\n{results['requests']} requests in {results['duration_seconds']:.1f}s "
+          f"-> {results['throughput_rps']:.1f} req/s, {results['errors']} errors")
+    header = f"{'stage':<14}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}"
+    print(header + ("   vs baseline p50/p95/p99" if baseline else ""))
+    for stage, s in results["stages"].items():
+        line = f"{stage:<14}{s['count']:>8}{s['p50_ms']:>10.1f}{s['p95_ms']:>10.1f}{s['p99_ms']:>10.1f}{s['max_ms']:>10.1f}"
+        previous = (baseline or {}).get("stages", {}).get(stage)
+        if previous:
+            deltas = [
+                f"{(s[k] - previous[k]) / previous[k] * 100:+.0f}%" if previous[k] else "n/a"
+                for k in ("p50_ms", "p95_ms", "p99_ms")
+            ]
+            line += "   " + " / ".join(deltas)
+        print(line)
+    if baseline:
+        print(f"throughput: {results['throughput_rps']:.1f} req/s (baseline {baseline['throughput_rps']:.1f} req/s)")
+
+
+# --- LOAD GENERATION ---
+async def _run_session(http, recorder: StageRecorder, prompts: list, session_id: str, turns: int, offset: int, outcomes: list):
+    for turn in range(turns):
+        prompt = prompts[(offset + turn) % len(prompts)]
+        started = time.perf_counter()
+        try:
+            response = await http.post("/chat", json={"message": prompt}, headers={"X-Session-ID": session_id, "X-User-ID": f"loadtest-{session_id}"})
+            status = response.status_code
+            kind = response.json().get("type") if status == 200 else None
+        except Exception as e:
+            status, kind = None, type(e).__name__
+        recorder.add("request", (time.perf_counter() - started) * 1000)
+        outcomes.append((status, kind))
+
+
+async def drive(app, recorder: StageRecorder, prompts: list, sessions: int, turns: int, concurrency: int, label: str):
+    """Runs `sessions` sessions of `turns` sequential messages with at most `concurrency` in flight."""
+    import httpx
+    outcomes, semaphore = [], asyncio.Semaphore(concurrency)
+
+    async def one(index: int):
+        async with semaphore:
+            await _run_session(http, recorder, prompts, f"{label}-{index}", turns, index, outcomes)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://app", timeout=120) as http:
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(sessions)))
+        return outcomes, time.perf_counter() - started
+
+
+async def run(args, fake_app):
+    # The app binds to its services at import time, so it is imported only once the
+    # environment points at the stand-ins.
+    main = importlib.import_module("app.main")
+    core = importlib.import_module("app.agent.core")
+    memory = importlib.import_module("app.services.memory")
+    from app.services.database import db_connector
+    from app.services.cache import search_result_cache
+    logging.getLogger().setLevel(args.log_level)
+
+    redis_standin = install_redis_standin(memory.session_store)
+    recorder = StageRecorder()
+    instrument(recorder, core, db_connector)
+    prompts = [entry["prompt"] for entry in load_script(args.script)]
+
+    async with main.app.router.lifespan_context(main.app):
+        if args.warmup:
+            await drive(main.app, recorder, prompts, args.warmup, 1, args.concurrency, "warmup")
+            recorder.reset()
+        outcomes, elapsed = await drive(main.app, recorder, prompts, args.sessions, args.turns, args.concurrency, f"run{int(time.time())}")
+
+    status_codes, response_types = {}, {}
+    for status, kind in outcomes:
+        status_codes[str(status)] = status_codes.get(str(status), 0) + 1
+        response_types[str(kind)] = response_types.get(str(kind), 0) + 1
+    errors = sum(n for code, n in status_codes.items() if code != "200") + response_types.get("error_response", 0)
+
+    stage_order = ["request", "memory_read", "llm", "tool_call", "sql", "memory_write"]
+    return {
+        "benchmark": "loadtest",
+        "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_commit": _git_commit(),
+        "config": {
+            **{k: v for k, v in vars(args).items() if k not in ("output", "baseline")},
+            "redis_standin": redis_standin,
+            "env": {k: v for k, v in os.environ.items() if k.startswith(("SEARCH_", "DECISION_CACHE_", "AGENT_", "DB_POOL_", "DB_EXECUTOR_", "PROMPT_", "ACTIVITY_LOG_"))},
+        },
+        "requests": len(outcomes),
+        "errors": errors,
+        "duration_seconds": round(elapsed, 3),
+        "throughput_rps": round(len(outcomes) / elapsed, 3) if elapsed else 0.0,
+        "status_codes": status_codes,
+        "response_types": response_types,
+        "stages": {stage: summarize(recorder.samples[stage]) for stage in stage_order if stage in recorder.samples},
+        "fake_openai": dict(fake_app.state.stats),
+        "db_pool": db_connector.pool_stats(),
+        "search_cache": search_result_cache.stats() if search_result_cache is not None else None,
+        "decision_cache": core.decision_cache.stats(top=0),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000000, help="ProfileData rows to seed (an existing database is topped up)")
+    parser.add_argument("--db", default="bench_profiles.sqlite", help="SQLite file holding the ProfileData copy")
+    parser.add_argument("--sessions", type=int, default=500)
+    parser.add_argument("--turns", type=int, default=1, help="Sequential messages per session")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--warmup", type=int, default=10, help="Sessions run before measuring")
+    parser.add_argument("--latency-ms", type=float, default=400, help="Fake LLM time to first byte")
+    parser.add_argument("--jitter-ms", type=float, default=100)
+    parser.add_argument("--token-delay-ms", type=float, default=5)
+    parser.add_argument("--script", help="JSON list of {prompt, tool_calls}; defaults to fake_openai.DEFAULT_SCRIPT")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--output", help="Results file (default: benchmarks/results/loadtest-<timestamp>.json)")
+    parser.add_argument("--baseline", help="Earlier results file to compare against")
+    args = parser.parse_args()
+
+    args.rows = prepare_database(args.db, args.rows)
+    base_url, fake_app, fake_server = start_fake_openai(load_script(args.script), args.latency_ms, args.jitter_ms, args.token_delay_ms, args.seed)
+    os.environ.update({
+        "OPENAI_BASE_URL": base_url,
+        "OPENAI_API_KEY": "bench",
+        "DB_CONNECT_FACTORY": "benchmarks.standins:sqlite_connect_from_env",
+        "BENCH_SQLITE_PATH": os.path.abspath(args.db),
+    })
+    os.environ.setdefault("LOG_LEVEL", args.log_level)
+    # The harness measures throughput, not the per-user limit; set it explicitly to include it.
+    os.environ.setdefault("USER_RATE_LIMIT_PER_MINUTE", "0")
+    try:
+        results = asyncio.run(run(args, fake_app))
+    finally:
+        fake_server.should_exit = True
+
+    output = args.output or os.path.join(RESULTS_DIR, f"loadtest-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(results, baseline)
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
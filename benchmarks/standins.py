@@ -0,0 +1,78 @@
+# benchmarks/standins.py
+"""
+Local stand-ins for the services the app binds to at import time, so it can run
+and be measured without SQL Server, Redis or OpenAI:
+
+- SQL Server: a SQLite copy of ProfileData (see synthetic.py), selected with
+  DB_CONNECT_FACTORY="benchmarks.standins:sqlite_connect_from_env".
+- Redis: fakeredis when installed, otherwise the app's own in-memory session store.
+- OpenAI: benchmarks/fake_openai.py, selected with OPENAI_BASE_URL.
+"""
+import os
+import re
+import logging
+from benchmarks.synthetic import sqlite_connect_factory
+
+logger = logging.getLogger(__name__)
+
+# SQL Server's "SELECT TOP n ..." becomes SQLite's "SELECT ... LIMIT n".
+_TOP_RE = re.compile(r"^\s*SELECT\s+TOP\s+(\d+)\s+", re.IGNORECASE)
+
+
+def translate_sql(query: str) -> str:
+    match = _TOP_RE.match(query)
+    if match is None:
+        return query
+    return f"SELECT {query[match.end():].rstrip().rstrip(';')} LIMIT {match.group(1)}"
+
+
+class _TranslatingCursor:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, query, params=()):
+        return self._cursor.execute(translate_sql(query), params)
+
+    def executemany(self, query, rows):
+        return self._cursor.executemany(translate_sql(query), rows)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class _TranslatingConnection:
+    """Wraps a sqlite3 connection so the app's T-SQL runs unchanged."""
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self):
+        return _TranslatingCursor(self._conn.cursor())
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+def sqlite_connect(path: str):
+    """Zero-argument connect callable for a SQLite ProfileData at `path`."""
+    connect = sqlite_connect_factory(path)
+    return lambda: _TranslatingConnection(connect())
+
+
+def sqlite_connect_from_env():
+    """DB_CONNECT_FACTORY entry point; the database file comes from BENCH_SQLITE_PATH."""
+    return sqlite_connect(os.getenv("BENCH_SQLITE_PATH", "bench_profiles.sqlite"))
+
+
+def install_redis_standin(session_store) -> str:
+    """
+    Points the app's FallbackSessionStore at an in-process Redis. Returns the name of
+    the stand-in used.
+    """
+    from app.services.session_store import InMemorySessionStore, RedisSessionStore
+    try:
+        from fakeredis import FakeAsyncRedis
+    except ImportError:
+        session_store.primary = InMemorySessionStore()
+        return "memory"
+    session_store.primary = RedisSessionStore(FakeAsyncRedis(decode_responses=True))
+    return "fakeredis"
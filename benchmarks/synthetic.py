@@ -0,0 +1,127 @@
+# benchmarks/synthetic.py
+"""
+SQLite stand-in for the SQL Server tables the app uses, seeded with synthetic
+ProfileData rows. The database file is attached under the schema name "dbo" so
+the app's `dbo.ProfileData` / `dbo.AgentActivityLog` queries run unchanged.
+"""
+import random
+import sqlite3
+from datetime import datetime, timedelta
+
+PROFILE_DATA_DDL = """
+CREATE TABLE IF NOT EXISTS dbo.ProfileData (
+    ProfileId INTEGER PRIMARY KEY,
+    created_on TEXT,
+    job_title TEXT,
+    job_title_role TEXT,
+    organization_name TEXT,
+    organization_email TEXT,
+    organization_email_status TEXT,
+    organization_industries TEXT,
+    organization_linkedin_url TEXT,
+    organization_size TEXT,
+    person_email TEXT,
+    person_full_name TEXT,
+    person_github_url TEXT,
+    person_linkedin_url TEXT,
+    person_linkedin_connections INTEGER,
+    person_location_city TEXT,
+    person_location_country TEXT,
+    person_location_state TEXT,
+    person_mobile TEXT,
+    person_phone TEXT,
+    person_skills TEXT,
+    person_twitter_url TEXT
+)
+"""
+
+ACTIVITY_LOG_DDL = """
+CREATE TABLE IF NOT EXISTS dbo.AgentActivityLog (
+    LogId INTEGER PRIMARY KEY,
+    UserID TEXT, SessionID TEXT, ActionType TEXT, UserQuery TEXT,
+    GeneratedSQL TEXT, ToolOutputSummary TEXT, AgentResponse TEXT
+)
+"""
+
+INDEXES_DDL = [
+    "CREATE INDEX IF NOT EXISTS dbo.IX_ProfileData_Name ON ProfileData (person_full_name, ProfileId)",
+    "CREATE INDEX IF NOT EXISTS dbo.IX_ProfileData_CreatedOn ON ProfileData (created_on)",
+]
+
+FIRST_NAMES = ["james", "mary", "wei", "priya", "carlos", "fatima", "olga", "kenji", "amara", "liam", "sofia", "noah"]
+LAST_NAMES = ["smith", "garcia", "chen", "patel", "kim", "nguyen", "ivanova", "okafor", "muller", "rossi", "silva"]
+JOB_TITLES = [
+    "software engineer", "senior software engineer", "cto", "chief technology officer", "vp of sales",
+    "marketing manager", "data scientist", "product manager", "registered nurse", "financial analyst",
+    "account executive", "devops engineer", "head of growth", "hr business partner", "physician",
+]
+INDUSTRIES = [
+    "computer software", "information technology & services", "hospital & health care", "mental health care",
+    "pharmaceuticals", "health, wellness and fitness", "medical devices", "financial services", "banking",
+    "marketing & advertising", "retail", "real estate", "education management", "fintech",
+]
+COUNTRIES = ["united states", "united kingdom", "india", "germany", "canada", "france", "brazil", "australia", "singapore"]
+STATES = ["texas", "california", "new york", "florida", "washington", "illinois", None]
+SKILLS = ["python", "sql", "sales", "marketing", "java", "kubernetes", "leadership", "excel", "salesforce", "react", "nursing"]
+EMAIL_STATUSES = ["verified", "unverified", "catch_all", None]
+
+
+def sqlite_connect_factory(path: str):
+    """
+    Returns a zero-argument connect callable for DatabaseConnector(connect=...).
+    `path` may be a file or a shared in-memory URI such as "file:bench?mode=memory&cache=shared".
+    """
+    def connect():
+        conn = sqlite3.connect(":memory:", check_same_thread=False, isolation_level=None, uri=True)
+        conn.execute("ATTACH DATABASE ? AS dbo", (path,))
+        return conn
+    return connect
+
+
+def create_tables(conn):
+    conn.execute(PROFILE_DATA_DDL)
+    conn.execute(ACTIVITY_LOG_DDL)
+    for ddl in INDEXES_DDL:
+        conn.execute(ddl)
+
+
+def _synthetic_profile(rng: random.Random, profile_id: int, base_date: datetime) -> tuple:
+    first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+    company = f"{rng.choice(LAST_NAMES)} {rng.choice(['labs', 'inc', 'group', 'health', 'capital', 'systems'])}"
+    domain = company.replace(" ", "") + ".com"
+    industries = ", ".join(rng.sample(INDUSTRIES, rng.randint(1, 3)))
+    return (
+        profile_id,
+        (base_date + timedelta(minutes=profile_id)).strftime("%Y-%m-%d %H:%M:%S"),
+        rng.choice(JOB_TITLES),
+        rng.choice(["engineering", "sales", "marketing", "operations", "finance", None]),
+        company,
+        f"info@{domain}",
+        rng.choice(EMAIL_STATUSES),
+        industries,
+        f"https://linkedin.com/company/{domain}",
+        rng.choice(["1-10", "11-50", "51-200", "201-500", "501-1000", "1001+"]),
+        f"{first}.{last}{profile_id}@{domain}",
+        f"{first} {last}" if rng.random() > 0.01 else None,
+        None,
+        f"https://linkedin.com/in/{first}{last}{profile_id}",
+        rng.randint(0, 500),
+        rng.choice(["austin", "london", "bangalore", "berlin", "toronto", "paris", "sao paulo"]),
+        rng.choice(COUNTRIES),
+        rng.choice(STATES),
+        f"+1555{profile_id:07d}",
+        None,
+        ", ".join(rng.sample(SKILLS, rng.randint(1, 4))),
+        None,
+    )
+
+
+def seed_profiles(conn, n_rows: int, start_id: int = 1, seed: int = 42, batch_size: int = 10000):
+    """Inserts `n_rows` synthetic profiles with consecutive ProfileIds."""
+    rng = random.Random(seed + start_id)
+    base_date = datetime(2024, 1, 1)
+    placeholders = ", ".join("?" for _ in range(22))
+    sql = f"INSERT INTO dbo.ProfileData VALUES ({placeholders})"
+    for offset in range(0, n_rows, batch_size):
+        ids = range(start_id + offset, start_id + min(offset + batch_size, n_rows))
+        conn.executemany(sql, [_synthetic_profile(rng, pid, base_date) for pid in ids])